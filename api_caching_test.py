@@ -92,6 +92,45 @@ def test_endpoint_caching(endpoint, iterations=10, params=None):
         "cache_headers": cache_headers
     }
 
+def test_conditional_get(endpoint, params=None):
+    """Test that a repeated request with the returned validators gets a 304"""
+    print(f"\n=== Testing Conditional GET for {endpoint} ===")
+    url = f"{API_BASE_URL}{endpoint}"
+    
+    response, response_time = measure_response_time(url, params=params)
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    print(f"Initial request: {response_time:.2f} ms (Status: {response.status_code})")
+    print(f"  ETag: {etag}")
+    print(f"  Last-Modified: {last_modified}")
+    print(f"  Cache-Control: {response.headers.get('Cache-Control')}")
+    
+    if not etag:
+        print("❌ No ETag returned")
+        return {"endpoint": endpoint, "etag": False, "not_modified": False}
+    
+    conditional, conditional_time = measure_response_time(url, params=params, headers={"If-None-Match": etag})
+    print(f"If-None-Match request: {conditional_time:.2f} ms (Status: {conditional.status_code}, {len(conditional.content)} bytes)")
+    not_modified = conditional.status_code == 304 and not conditional.content
+    
+    if last_modified:
+        since, since_time = measure_response_time(url, params=params, headers={"If-Modified-Since": last_modified})
+        print(f"If-Modified-Since request: {since_time:.2f} ms (Status: {since.status_code})")
+        not_modified = not_modified and since.status_code == 304
+    
+    if not_modified:
+        print(f"✅ Conditional GET returns 304 for {endpoint}")
+    else:
+        print(f"❌ Conditional GET did not return 304 for {endpoint}")
+    
+    return {
+        "endpoint": endpoint,
+        "etag": True,
+        "not_modified": not_modified,
+        "full_time": response_time,
+        "conditional_time": conditional_time
+    }
+
 def test_query_performance(endpoint, query_params_list, description=""):
     """Test API performance with different query parameters"""
     print(f"\n=== Testing Query Performance for {endpoint} ({description}) ===")
@@ -141,6 +180,11 @@ def run_caching_tests():
     if products_response.status_code == 200 and products_response.json():
         product_id = products_response.json()[0]["id"]
         results["product_detail"] = test_endpoint_caching(f"/products/{product_id}", iterations=10)
+        results["product_detail_conditional"] = test_conditional_get(f"/products/{product_id}")
+    
+    # Test ETag/Last-Modified revalidation
+    results["products_conditional"] = test_conditional_get("/products")
+    results["categories_conditional"] = test_conditional_get("/categories")
     
     # Test query parameter caching
     query_params_list = [
@@ -156,7 +200,10 @@ def run_caching_tests():
     print("\n======= API CACHING TEST SUMMARY =======")
     
     for endpoint, result in results.items():
-        if endpoint != "query_performance" and "improvement" in result:
+        if endpoint.endswith("_conditional"):
+            status = "✅" if result["not_modified"] else "❌"
+            print(f"{status} {endpoint}: {'304 Not Modified' if result['not_modified'] else 'no 304'}")
+        elif endpoint != "query_performance" and "improvement" in result:
             status = "✅" if result["improvement"] > 5 else "⚠️"
             print(f"{status} {endpoint}: {result['improvement']:.2f}% improvement")
     
@@ -0,0 +1,99 @@
+"""Benchmark per-request auth overhead on an authenticated endpoint.
+
+Mounts ``GET /api/cart`` twice on throwaway apps, with a body that does no
+work: once behind the previous dependency (a plain ``def`` that FastAPI runs
+in its threadpool, re-decoding the JWT every time) and once behind the
+async, cached ``server.verify_token``. The difference in latency is the auth
+overhead per request. Runs in-process, no server or database needed.
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+import httpx  # noqa: E402
+import jwt  # noqa: E402
+from fastapi import Depends, FastAPI, HTTPException  # noqa: E402
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+import server  # noqa: E402
+
+# server.py logs at INFO; one line per request would dominate the timing
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+REQUESTS = 5000
+CONCURRENCY = 50
+USERS = 100
+
+
+def previous_verify_token(credentials: HTTPAuthorizationCredentials = Depends(server.security)):
+    try:
+        payload = jwt.decode(credentials.credentials, server.SECRET_KEY, algorithms=[server.ALGORITHM])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    return payload["sub"]
+
+
+def make_app(dependency):
+    app = FastAPI()
+
+    @app.get("/api/cart")
+    async def get_cart(current_user_id: str = Depends(dependency)):
+        return {"user_id": current_user_id, "items": []}
+
+    return app
+
+
+async def measure(name, app, tokens):
+    """CONCURRENCY clients send REQUESTS requests, cycling through tokens"""
+    print(f"\n=== {name}: {REQUESTS} requests, {CONCURRENCY} concurrent ===")
+    times = []
+    remaining = REQUESTS
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                headers = {"Authorization": f"Bearer {tokens[remaining % len(tokens)]}"}
+                start = time.perf_counter()
+                response = await client.get("/api/cart", headers=headers)
+                times.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - start
+
+    times.sort()
+    result = {"throughput": REQUESTS / elapsed, "avg": statistics.mean(times), "p99": times[int(len(times) * 0.99)]}
+    print(f"  Throughput: {result['throughput']:.0f} requests/s")
+    print(f"  Latency: avg {result['avg']:.3f} ms, p99 {result['p99']:.3f} ms")
+    return result
+
+
+async def run_benchmarks():
+    print("\n======= STARTING AUTH OVERHEAD BENCHMARK =======")
+    tokens = [server.create_access_token({"sub": f"user-{i}"}, timedelta(minutes=30)) for i in range(USERS)]
+    before = await measure("previous: sync dependency, decode per request", make_app(previous_verify_token), tokens)
+    after = await measure("async dependency with verified-token cache", make_app(server.verify_token), tokens)
+
+    print("\n======= AUTH OVERHEAD BENCHMARK SUMMARY =======")
+    print(f"Throughput: {before['throughput']:.0f} -> {after['throughput']:.0f} requests/s "
+          f"({after['throughput'] / before['throughput']:.2f}x)")
+    print(f"Avg latency: {before['avg']:.3f} -> {after['avg']:.3f} ms, p99 {before['p99']:.3f} -> {after['p99']:.3f} ms")
+    print(f"Token cache: {server.token_verifier.stats()}")
+    faster = after["throughput"] > before["throughput"]
+    print(f"{'✅' if faster else '❌'} Cached async auth serves more requests per second")
+    return faster
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run_benchmarks()) else 1)
@@ -0,0 +1,101 @@
+"""Verified-token and current-user caches behind the auth dependencies.
+
+Every authenticated request used to re-run the JWT HMAC check in a
+threadpool. :class:`TokenVerifier` checks a token once, then keeps its
+claims in a bounded LRU keyed by the exact token string. Later requests
+bearing that token are served from the cache, until the token's ``exp``
+passes or it is evicted. A cached token is byte-for-byte the one whose
+signature was checked, so a hit is as trustworthy as a decode.
+
+The verifier also caches user documents (without the password hash) for
+``user_ttl`` seconds, so ``/auth/me`` needs no MongoDB read. Writes to a user
+call :meth:`TokenVerifier.forget_user`. As with the response cache, other
+worker processes converge within the TTL.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import jwt
+
+USER_PROJECTION = {"_id": 0, "hashed_password": 0}
+
+
+class TokenVerifier:
+    def __init__(self, secret: str, algorithm: str, max_tokens: int = 10000,
+                 max_users: int = 10000, user_ttl: float = 30.0):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.max_tokens = max_tokens
+        self.max_users = max_users
+        self.user_ttl = user_ttl
+        # token -> (claims, exp as a Unix timestamp)
+        self._tokens: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        # user id -> (document, monotonic expiry)
+        self._users: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.expired = 0
+        self.user_hits = 0
+        self.user_misses = 0
+
+    def claims(self, token: str) -> Optional[dict]:
+        """The claims of a valid, unexpired ``token``; None otherwise."""
+        cached = self._tokens.get(token)
+        if cached is not None:
+            claims, exp = cached
+            if exp > time.time():
+                self._tokens.move_to_end(token)
+                self.hits += 1
+                return claims
+            del self._tokens[token]
+            self.expired += 1
+        self.misses += 1
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except jwt.PyJWTError:
+            # Invalid tokens are not cached, so garbage cannot evict real sessions
+            self.rejected += 1
+            return None
+        exp = claims.get("exp")
+        if exp is not None:
+            self._tokens[token] = (claims, float(exp))
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+        return claims
+
+    async def user(self, users, user_id: str) -> Optional[dict]:
+        """The user document for ``user_id`` from ``users``, cached for ``user_ttl`` seconds."""
+        cached = self._users.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            self._users.move_to_end(user_id)
+            self.user_hits += 1
+            return cached[0]
+        self.user_misses += 1
+        user = await users.find_one({"id": user_id}, USER_PROJECTION)
+        if user is None:
+            self._users.pop(user_id, None)
+            return None
+        self._users[user_id] = (user, time.monotonic() + self.user_ttl)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return user
+
+    def forget_user(self, user_id: str):
+        self._users.pop(user_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "tokens": len(self._tokens),
+            "users": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "user_hits": self.user_hits,
+            "user_misses": self.user_misses,
+        }
@@ -0,0 +1,53 @@
+"""A Bloom filter for fast "definitely not present" answers.
+
+The filter answers :meth:`BloomFilter.might_contain` with no false negatives
+and a false-positive rate near ``error_rate`` while it holds at most
+``capacity`` items. Positions come from double hashing of one BLAKE2b
+digest. Items cannot be removed, and the filter grows past ``capacity``
+only by getting less accurate. Rebuild it from the source of truth when
+:meth:`BloomFilter.saturated` says so.
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        added = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                added = True
+        # Re-adding an item changes nothing, so it does not count twice
+        if added:
+            self.count += 1
+
+    def might_contain(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def saturated(self) -> bool:
+        return self.count > self.capacity
+
+    def stats(self) -> dict:
+        return {
+            "items": self.count,
+            "capacity": self.capacity,
+            "bytes": len(self._bits),
+            "hashes": self.hashes,
+            # Expected rate for the current fill
+            "false_positive_rate": round((1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes, 6),
+        }
@@ -0,0 +1,240 @@
+"""In-process response cache for read-heavy catalog endpoints.
+
+Entries hold the serialized JSON body, so a hit skips both MongoDB and
+pydantic. Each entry carries surrogate-key tags (``catalog``,
+``product:<id>``) and write endpoints purge by tag, so only the entries a
+write can affect are dropped. Entries also expire after a TTL, and the total
+body size is bounded with least-recently-used eviction.
+
+The cache lives in each worker process; with several workers a write purges
+only the worker that served it and the others converge within the TTL.
+
+Cached endpoints also answer conditional requests: each entry carries a
+strong ETag (a hash of the body), so a matching ``If-None-Match`` gets a 304
+straight from the entry. Single documents also carry a Last-Modified taken
+from their ``updated_at`` and honour ``If-Modified-Since``. Lists do not: an
+insert or delete changes a list without changing its newest ``updated_at``.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Union
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+# Headers set by an endpoint that must be replayed on a cache hit
+_REPLAYED_HEADERS = ("x-next-cursor",)
+
+
+class CacheEntry:
+    __slots__ = ("body", "headers", "tags", "expires_at", "etag", "last_modified")
+
+    def __init__(self, body: bytes, headers: Dict[str, str], tags: Set[str], expires_at: float,
+                 last_modified: Optional[datetime] = None):
+        self.body = body
+        self.headers = headers
+        self.tags = tags
+        self.expires_at = expires_at
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.last_modified = last_modified
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, default_ttl: float = 60.0):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._size = 0
+        # Bumped by every purge so a response computed before the purge is
+        # not stored after it
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                self._delete(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: str, body: bytes, tags: Iterable[str] = (),
+            headers: Optional[Dict[str, str]] = None, ttl: Optional[float] = None,
+            generation: Optional[int] = None, last_modified: Optional[datetime] = None) -> CacheEntry:
+        entry = CacheEntry(body, headers or {}, set(tags), time.monotonic() + (ttl or self.default_ttl),
+                           last_modified=last_modified)
+        if len(body) > self.max_bytes or (generation is not None and generation != self.generation):
+            return entry
+        if key in self._entries:
+            self._delete(key)
+        self._entries[key] = entry
+        self._size += len(body)
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._delete(oldest)
+            self.evictions += 1
+        return entry
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop every entry carrying any of ``tags``; returns how many."""
+        self.generation += 1
+        keys = set()
+        for tag in tags:
+            keys |= self._tags.get(tag, set())
+        for key in keys:
+            self._delete(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+        self._tags.clear()
+        self._size = 0
+
+    def _delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+TagsArg = Union[Iterable[str], Callable[[dict], List[str]]]
+ResultTags = Callable[[list], Iterable[str]]
+
+
+def _last_modified(result) -> Optional[datetime]:
+    """Newest ``updated_at`` of a model or list of models, if they carry one."""
+    items = result if isinstance(result, list) else [result]
+    stamps = [getattr(item, "updated_at", None) for item in items]
+    stamps = [stamp for stamp in stamps if isinstance(stamp, datetime)]
+    if not stamps:
+        return None
+    # Stored datetimes are naive UTC; HTTP dates have one-second resolution
+    return max(stamps).replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_not_modified(request: Request, entry: CacheEntry) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in candidates or entry.etag in candidates
+    if_modified_since = _parse_http_date(request.headers.get("if-modified-since"))
+    if if_modified_since is not None and entry.last_modified is not None:
+        return entry.last_modified <= if_modified_since
+    return False
+
+
+def _entry_response(request: Request, entry: CacheEntry, cache_control: str, outcome: str) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": cache_control, "X-Cache": outcome}
+    if entry.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(entry.last_modified, usegmt=True)
+    if _is_not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers={**entry.headers, **headers})
+
+
+def cached_response(cache: ResponseCache, tags: TagsArg, ttl: Optional[float] = None,
+                    max_age: int = 30, stale_while_revalidate: int = 300,
+                    item_tags: Optional[ResultTags] = None):
+    """Cache a GET endpoint's JSON body, keyed by its normalized parameters.
+
+    ``tags`` is a list of tags or a callable receiving the endpoint kwargs.
+    For list endpoints, ``item_tags`` receives the decoded list and adds tags
+    for what it contains, so a write purges only the pages showing it.
+    Responses carry ``X-Cache: HIT`` or ``MISS``, validators (ETag,
+    Last-Modified) and a ``Cache-Control`` built from ``max_age`` and
+    ``stale_while_revalidate``; conditional requests that match get a 304.
+    """
+    cache_control = f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, _cache_request: Request, **kwargs):
+            params = sorted(
+                (name, value) for name, value in kwargs.items()
+                if value is not None and not isinstance(value, Response)
+            )
+            key = f"{func.__name__}:{json.dumps(params, default=str, ensure_ascii=False)}"
+
+            entry = cache.get(key)
+            if entry is not None:
+                return _entry_response(_cache_request, entry, cache_control, "HIT")
+
+            generation = cache.generation
+            result = await func(*args, **kwargs)
+            if isinstance(result, Response):
+                # Streamed bodies are never buffered, so they are not cached
+                if result.status_code != 200 or isinstance(result, StreamingResponse):
+                    return result
+                body, source_headers = result.body, result.headers
+                last_modified = _parse_http_date(result.headers.get("last-modified"))
+            else:
+                body = json.dumps(jsonable_encoder(result), ensure_ascii=False, separators=(",", ":")).encode()
+                # Headers the endpoint set on its injected Response parameter
+                injected = next((v for v in kwargs.values() if isinstance(v, Response)), None)
+                source_headers = injected.headers if injected is not None else {}
+                last_modified = _last_modified(result)
+            headers = {name: source_headers[name] for name in _REPLAYED_HEADERS if name in source_headers}
+
+            entry_tags = list(tags(kwargs) if callable(tags) else tags)
+            if body[:1] == b"[":
+                # Only the ETag tells whether a list changed
+                last_modified = None
+                if item_tags is not None:
+                    entry_tags.extend(item_tags(json.loads(body)))
+            entry = cache.set(key, body, tags=entry_tags, headers=headers,
+                              ttl=ttl, generation=generation, last_modified=last_modified)
+            return _entry_response(_cache_request, entry, cache_control, "MISS")
+
+        # Ask FastAPI for the Request alongside the endpoint's own parameters
+        signature = inspect.signature(func)
+        request_param = inspect.Parameter("_cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), request_param])
+        return wrapper
+    return decorator
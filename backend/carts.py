@@ -0,0 +1,64 @@
+"""Atomic cart mutations as MongoDB update pipelines.
+
+Every cart change is a single ``find_one_and_update`` on the user's cart.
+The pipeline edits ``items`` and then recomputes ``total_amount`` from the
+resulting array on the server, so concurrent mutations from several tabs
+cannot overwrite each other and the total never drifts from the items.
+Pipeline updates need MongoDB 4.2+.
+"""
+from datetime import datetime
+from typing import List
+
+_ITEMS = {"$ifNull": ["$items", []]}
+
+
+def add_item(item: dict) -> dict:
+    """Increase the quantity of ``item["product_id"]``, or append ``item``."""
+    product_id = item["product_id"]
+    return {"$set": {"items": {"$cond": [
+        {"$in": [product_id, {"$ifNull": ["$items.product_id", []]}]},
+        {"$map": {"input": _ITEMS, "as": "item", "in": {"$cond": [
+            {"$eq": ["$$item.product_id", product_id]},
+            {"$mergeObjects": ["$$item", {"quantity": {"$add": ["$$item.quantity", item["quantity"]]}}]},
+            "$$item",
+        ]}}},
+        {"$concatArrays": [_ITEMS, [item]]},
+    ]}}}
+
+
+def set_quantity(product_id: str, quantity: int) -> dict:
+    """Set an item's quantity; zero or less removes it."""
+    if quantity <= 0:
+        return remove_item(product_id)
+    return {"$set": {"items": {"$map": {"input": _ITEMS, "as": "item", "in": {"$cond": [
+        {"$eq": ["$$item.product_id", product_id]},
+        {"$mergeObjects": ["$$item", {"quantity": quantity}]},
+        "$$item",
+    ]}}}}}
+
+
+def remove_item(product_id: str) -> dict:
+    return {"$set": {"items": {"$filter": {
+        "input": _ITEMS, "as": "item", "cond": {"$ne": ["$$item.product_id", product_id]},
+    }}}}
+
+
+def cart_pipeline(user_id: str, steps: List[dict], new_cart_id: str, now: datetime = None) -> List[dict]:
+    """Wrap item ``steps`` into a full update that also maintains totals.
+
+    ``new_cart_id`` and ``created_at`` only take effect when the update
+    upserts a new cart.
+    """
+    now = now or datetime.utcnow()
+    return [
+        *steps,
+        {"$set": {
+            "user_id": user_id,
+            "id": {"$ifNull": ["$id", new_cart_id]},
+            "created_at": {"$ifNull": ["$created_at", now]},
+            "updated_at": now,
+            "total_amount": {"$sum": {"$map": {
+                "input": _ITEMS, "as": "item", "in": {"$multiply": ["$$item.price", "$$item.quantity"]},
+            }}},
+        }},
+    ]
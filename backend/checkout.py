@@ -0,0 +1,269 @@
+"""Server-authoritative checkout: pricing and stock decrements.
+
+Prices, names and images come from the products collection, loaded with a
+single ``$in`` query, never from the client. Stock is taken with one
+conditional ``$inc`` per product, all sent in one ``bulk_write``: the filter
+requires enough product stock and enough stock in every ordered variation,
+so a decrement either applies whole or matches nothing, and concurrent
+checkouts can never drive stock below zero.
+
+Products in sharded-counter mode (see :mod:`stock_shards`) take their
+stock from the counters instead of the product document.
+
+Stock is tracked per product: a product whose ``stock_quantity`` is null
+or missing is not tracked and can always be ordered. Its lines take no
+stock, including those for its variations.
+
+Our deployment runs a standalone mongod, which has no multi-document
+transactions, so a partially applied checkout is undone with compensating
+updates instead. Every decrement also pushes a marker with the order id and
+the quantities taken onto the product's ``pending_orders``; when some
+product is short, the products that carry the marker are exactly the ones
+to restore. Once the order is stored the markers are pulled again. If the
+process dies in between, :func:`release_abandoned` later finds the stale
+markers and restores their stock unless the order was stored after all.
+Counter shards carry the same kind of marker (see :mod:`stock_shards`),
+and the sweep resolves them the same way.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+import stock_shards
+
+# Fields read from the products collection to price an order
+PRICING_PROJECTION = {"_id": 0, "id": 1, "name": 1, "price": 1, "image_url": 1, "variations": 1,
+                      "stock_quantity": 1, "stock_shards": 1}
+
+# (product_id, size) -> quantity; size is None for products ordered without a variation
+StockLines = Dict[Tuple[str, Optional[str]], int]
+
+
+def stock_lines(items: Iterable[dict]) -> StockLines:
+    """Merge order items into one quantity per product and variation."""
+    lines: StockLines = defaultdict(int)
+    for item in items:
+        lines[(item["product_id"], item.get("size"))] += item["quantity"]
+    return dict(lines)
+
+
+def price_items(products: Dict[str, dict], items: Iterable[dict]) -> List[dict]:
+    """Build order items priced from ``products`` (keyed by id).
+
+    An item with a ``size`` is priced from that variation. Raises 404 for
+    unknown products and 400 for unknown sizes.
+    """
+    priced = []
+    for item in items:
+        product = products.get(item["product_id"])
+        if product is None:
+            raise HTTPException(status_code=404, detail=f"Product not found: {item['product_id']}")
+        price = product["price"]
+        size = item.get("size")
+        if size is not None:
+            variation = next((v for v in product.get("variations") or [] if v["size"] == size), None)
+            if variation is None:
+                raise HTTPException(status_code=400, detail=f"Size {size} is not available for {product['name']}")
+            price = variation["price"]
+        priced.append({
+            "product_id": product["id"],
+            "size": size,
+            "quantity": item["quantity"],
+            "price": price,
+            "name": product["name"],
+            "image_url": product["image_url"],
+            "subtotal": price * item["quantity"],
+        })
+    return priced
+
+
+def _by_product(lines: StockLines) -> Dict[str, Dict[Optional[str], int]]:
+    products: Dict[str, Dict[Optional[str], int]] = defaultdict(dict)
+    for (product_id, size), quantity in lines.items():
+        products[product_id][size] = quantity
+    return products
+
+
+def tracks_stock(product: dict) -> bool:
+    return product.get("stock_quantity") is not None
+
+
+def decrement_ops(order_id: str, lines: StockLines, now: datetime = None) -> List[UpdateOne]:
+    """One conditional decrement per product, marked with ``order_id``."""
+    now = now or datetime.utcnow()
+    ops = []
+    for product_id, sizes in _by_product(lines).items():
+        total = sum(sizes.values())
+        marker = {"order_id": order_id, "at": now, "sizes": [[size, quantity] for size, quantity in sizes.items()]}
+        # Never while stock is sharded, or being moved to or from the counters
+        conditions = [{"id": product_id, "stock_quantity": {"$gte": total}, "stock_shards": None,
+                       "pending_orders.order_id": {"$ne": order_id}}]
+        inc = {"stock_quantity": -total}
+        array_filters = []
+        for n, (size, quantity) in enumerate(sorted((s, q) for s, q in sizes.items() if s is not None)):
+            conditions.append({"variations": {"$elemMatch": {"size": size, "stock_quantity": {"$gte": quantity}}}})
+            inc[f"variations.$[v{n}].stock_quantity"] = -quantity
+            array_filters.append({f"v{n}.size": size})
+        ops.append(UpdateOne(
+            {"$and": conditions},
+            {"$inc": inc, "$push": {"pending_orders": marker}},
+            array_filters=array_filters or None,
+        ))
+    return ops
+
+
+def _increments(sizes: Dict[Optional[str], int]) -> Tuple[dict, List[dict]]:
+    """``$inc`` and array filters adding ``sizes`` back to a product and its variations."""
+    inc = {"stock_quantity": sum(sizes.values())}
+    array_filters = []
+    for n, (size, quantity) in enumerate(sorted((s, q) for s, q in sizes.items() if s is not None)):
+        inc[f"variations.$[v{n}].stock_quantity"] = quantity
+        array_filters.append({f"v{n}.size": size})
+    return inc, array_filters
+
+
+def restore_ops(order_id: str, lines: StockLines) -> List[UpdateOne]:
+    """Undo :func:`decrement_ops` on the products that carry the marker."""
+    ops = []
+    for product_id, sizes in _by_product(lines).items():
+        inc, array_filters = _increments(sizes)
+        ops.append(UpdateOne(
+            {"id": product_id, "pending_orders.order_id": order_id},
+            {"$inc": inc, "$pull": {"pending_orders": {"order_id": order_id}}},
+            array_filters=array_filters or None,
+        ))
+    return ops
+
+
+async def take_stock(collection, order_id: str, lines: StockLines, counters=None,
+                     sharded: Dict[str, int] = None, untracked: Iterable[str] = ()) -> stock_shards.Takes:
+    """Decrement stock for every line, or for none of them.
+
+    ``sharded`` maps products in sharded-counter mode to their shard count;
+    their lines are taken from ``counters``. Lines of ``untracked`` products
+    take nothing. Returns the counter takes, to pass to
+    :func:`release_stock`. Raises 409 when any product or variation is short.
+    """
+    sharded = sharded or {}
+    untracked = set(untracked)
+    shard_lines = {key: quantity for key, quantity in lines.items() if key[0] in sharded}
+    document_lines = {key: quantity for key, quantity in lines.items()
+                      if key[0] not in sharded and key[0] not in untracked}
+
+    takes: stock_shards.Takes = []
+    if shard_lines:
+        takes = await stock_shards.take(counters, order_id, shard_lines, sharded)
+        if takes is None:
+            raise HTTPException(status_code=409, detail="Not enough stock for one or more items")
+    if document_lines:
+        ops = decrement_ops(order_id, document_lines)
+        result = await collection.bulk_write(ops, ordered=False)
+        if result.matched_count < len(ops):
+            await release_stock(collection, order_id, document_lines, counters, takes)
+            raise HTTPException(status_code=409, detail="Not enough stock for one or more items")
+    return takes
+
+
+async def release_stock(collection, order_id: str, lines: StockLines, counters=None,
+                        takes: stock_shards.Takes = ()):
+    """Give back stock taken by :func:`take_stock` for ``order_id``."""
+    # Marker-guarded, so lines that were never taken are left alone
+    await collection.bulk_write(restore_ops(order_id, lines), ordered=False)
+    await stock_shards.give_back(counters, takes, order_id)
+
+
+async def confirm_stock(collection, order_id: str, product_ids: Iterable[str], counters=None):
+    """Drop the order's markers and refresh ``in_stock`` once it is stored."""
+    product_ids = list(product_ids)
+    if counters is not None:
+        await stock_shards.confirm(counters, order_id, product_ids)
+    await collection.update_many(
+        {"id": {"$in": list(product_ids)}, "pending_orders.order_id": order_id},
+        [{"$set": {
+            "pending_orders": {"$filter": {
+                "input": "$pending_orders", "as": "pending", "cond": {"$ne": ["$$pending.order_id", order_id]},
+            }},
+            "in_stock": {"$gt": ["$stock_quantity", 0]},
+        }}],
+    )
+
+
+async def release_abandoned(collection, orders, older_than: timedelta, counters=None) -> Set[str]:
+    """Resolve markers left by checkouts that died before confirming.
+
+    A marker older than ``older_than``, on a product or on one of the
+    ``counters`` shards, is pulled if its order was stored, and otherwise
+    its stock is given back. Returns the ids of products whose stock was
+    restored.
+    """
+    cutoff = datetime.utcnow() - older_than
+    stale: Dict[str, StockLines] = defaultdict(dict)
+    async for product in collection.find({"pending_orders.at": {"$lt": cutoff}},
+                                         {"_id": 0, "id": 1, "pending_orders": 1}):
+        for marker in product["pending_orders"]:
+            if marker["at"] < cutoff:
+                for size, quantity in marker["sizes"]:
+                    stale[marker["order_id"]][(product["id"], size)] = quantity
+    stale_takes: Dict[str, stock_shards.Takes] = defaultdict(list)
+    if counters is not None:
+        async for counter in counters.find({"pending.at": {"$lt": cutoff}},
+                                           {"_id": 0, "product_id": 1, "size": 1, "shard": 1, "pending": 1}):
+            for marker in counter["pending"]:
+                if marker["at"] < cutoff:
+                    stale_takes[marker["order_id"]].append(
+                        (counter["product_id"], counter["size"], counter["shard"], marker["units"]))
+    order_ids = set(stale) | set(stale_takes)
+    if not order_ids:
+        return set()
+
+    stored = set(await orders.distinct("id", {"id": {"$in": list(order_ids)}}))
+    restored: Set[str] = set()
+    for order_id in order_ids:
+        lines, takes = stale.get(order_id, {}), stale_takes.get(order_id, [])
+        product_ids = {product_id for product_id, _ in lines} | {take[0] for take in takes}
+        if order_id in stored:
+            await confirm_stock(collection, order_id, product_ids, counters)
+        else:
+            if lines:
+                await collection.bulk_write(restore_ops(order_id, lines), ordered=False)
+            await stock_shards.give_back(counters, takes, order_id)
+            restored |= product_ids
+    return restored
+
+
+async def return_stock(collection, counters, items: Iterable[dict]) -> Set[str]:
+    """Put the stock of a cancelled order's ``items`` back on sale.
+
+    Sharded products get their units back on counter shard 0, the others
+    on the product document. Products whose stock is not tracked, or that
+    are being switched to or from shards, are left alone. Returns the ids
+    of products whose stock was restored.
+    """
+    by_product = _by_product(stock_lines(items))
+    products = await collection.find({"id": {"$in": list(by_product)}},
+                                     {"_id": 0, "id": 1, "stock_quantity": 1, "stock_shards": 1}).to_list(None)
+    ops = []
+    takes: stock_shards.Takes = []
+    restored: Set[str] = set()
+    for product in products:
+        sizes = by_product[product["id"]]
+        if product.get("stock_shards"):
+            takes.append((product["id"], None, 0, sum(sizes.values())))
+            takes.extend((product["id"], size, 0, quantity) for size, quantity in sizes.items() if size is not None)
+        elif tracks_stock(product) and product.get("stock_shards") is None:
+            inc, array_filters = _increments(sizes)
+            ops.append(UpdateOne(
+                {"id": product["id"], "stock_quantity": {"$ne": None}, "stock_shards": None},
+                {"$inc": inc, "$set": {"in_stock": True}},
+                array_filters=array_filters or None,
+            ))
+        else:
+            continue
+        restored.add(product["id"])
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+    await stock_shards.give_back(counters, takes)
+    return restored
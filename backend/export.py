@@ -0,0 +1,306 @@
+"""Streaming CSV and Parquet exports of orders and the catalog for analytics.
+
+Documents are read from a Mongo cursor ``batch_size`` at a time, flattened
+into rows and handed to a writer, so memory stays bounded by one batch no
+matter how many rows are exported. Nested arrays become tables of their own:
+
+* ``orders`` -> ``orders`` (one row per order) and ``order_items`` (one row
+  per line item, keyed by ``order_id``)
+* ``products`` -> ``products`` and ``product_variations``
+
+Parquet files get one row group per batch and need ``pyarrow``. CSV uses the
+standard library. From the command line, each source is written to
+``<output>/<table>.<format>`` in a single pass over the collection:
+
+    python export.py orders --format parquet --since 2024-01-01 --output exports
+    python export.py products --format csv
+
+The admin API streams a single table: ``GET /api/admin/export/order_items?format=csv``,
+with the server's ``ADMIN_TOKEN`` in an ``X-Admin-Token`` header.
+"""
+import asyncio
+import csv
+import io
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# (column, type); types map to Parquet types and are ignored for CSV
+Columns = Sequence[Tuple[str, str]]
+
+
+class Table(NamedTuple):
+    source: str
+    columns: Columns
+    rows: Callable[[dict], List[dict]]
+
+
+def _order_rows(order: dict) -> List[dict]:
+    customer = order.get("customer_info") or {}
+    address = order.get("shipping_address") or {}
+    items = order.get("items") or []
+    return [{
+        "id": order["id"],
+        "order_number": order.get("order_number"),
+        "user_id": order.get("user_id"),
+        "status": order.get("status"),
+        "payment_method": order.get("payment_method"),
+        "created_at": order.get("created_at"),
+        "updated_at": order.get("updated_at"),
+        "subtotal": order.get("subtotal"),
+        "shipping_fee": order.get("shipping_fee"),
+        "total_amount": order.get("total_amount"),
+        "line_count": len(items),
+        "item_count": sum(item.get("quantity", 0) for item in items),
+        "customer_name": customer.get("full_name"),
+        "customer_email": customer.get("email"),
+        "customer_phone": customer.get("phone"),
+        "city": address.get("city"),
+        "district": address.get("district"),
+        "notes": order.get("notes"),
+    }]
+
+
+def _order_item_rows(order: dict) -> List[dict]:
+    return [{
+        "order_id": order["id"],
+        "order_number": order.get("order_number"),
+        "created_at": order.get("created_at"),
+        "status": order.get("status"),
+        "line": line,
+        "product_id": item.get("product_id"),
+        "size": item.get("size"),
+        "name": item.get("name"),
+        "quantity": item.get("quantity"),
+        "price": item.get("price"),
+        "subtotal": item.get("subtotal"),
+    } for line, item in enumerate(order.get("items") or [])]
+
+
+def _product_rows(product: dict) -> List[dict]:
+    return [{
+        "id": product["id"],
+        "name": product.get("name"),
+        "category": product.get("category"),
+        "price": product.get("price"),
+        "original_price": product.get("original_price"),
+        "stock_quantity": product.get("stock_quantity"),
+        "in_stock": product.get("in_stock"),
+        "featured": product.get("featured"),
+        "rating": product.get("rating"),
+        "reviews_count": product.get("reviews_count"),
+        "variation_count": len(product.get("variations") or []),
+        "tags": ",".join(product.get("tags") or []),
+        "created_at": product.get("created_at"),
+        "updated_at": product.get("updated_at"),
+    }]
+
+
+def _product_variation_rows(product: dict) -> List[dict]:
+    return [{
+        "product_id": product["id"],
+        "size": variation.get("size"),
+        "price": variation.get("price"),
+        "original_price": variation.get("original_price"),
+        "stock_quantity": variation.get("stock_quantity"),
+    } for variation in product.get("variations") or []]
+
+
+# Source collection -> projection of the fields its tables use
+SOURCES: Dict[str, dict] = {
+    "orders": {"_id": 0, "shipping_address.address": 0, "shipping_address.ward": 0, "items.image_url": 0},
+    "products": {"_id": 0, "description": 0, "image_url": 0, "images": 0},
+}
+
+TABLES: Dict[str, Table] = {
+    "orders": Table("orders", [
+        ("id", "string"), ("order_number", "string"), ("user_id", "string"), ("status", "string"),
+        ("payment_method", "string"), ("created_at", "timestamp"), ("updated_at", "timestamp"),
+        ("subtotal", "float"), ("shipping_fee", "float"), ("total_amount", "float"),
+        ("line_count", "int"), ("item_count", "int"), ("customer_name", "string"),
+        ("customer_email", "string"), ("customer_phone", "string"), ("city", "string"),
+        ("district", "string"), ("notes", "string"),
+    ], _order_rows),
+    "order_items": Table("orders", [
+        ("order_id", "string"), ("order_number", "string"), ("created_at", "timestamp"), ("status", "string"),
+        ("line", "int"), ("product_id", "string"), ("size", "string"), ("name", "string"),
+        ("quantity", "int"), ("price", "float"), ("subtotal", "float"),
+    ], _order_item_rows),
+    "products": Table("products", [
+        ("id", "string"), ("name", "string"), ("category", "string"), ("price", "float"),
+        ("original_price", "float"), ("stock_quantity", "int"), ("in_stock", "bool"), ("featured", "bool"),
+        ("rating", "float"), ("reviews_count", "int"), ("variation_count", "int"), ("tags", "string"),
+        ("created_at", "timestamp"), ("updated_at", "timestamp"),
+    ], _product_rows),
+    "product_variations": Table("products", [
+        ("product_id", "string"), ("size", "string"), ("price", "float"),
+        ("original_price", "float"), ("stock_quantity", "int"),
+    ], _product_variation_rows),
+}
+
+
+class Chunks:
+    """Binary sink that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+class CsvWriter:
+    def __init__(self, sink, columns: Columns):
+        self.sink = sink
+        self.names = [name for name, _ in columns]
+        self._write([self.names])
+
+    def _write(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        self.sink.write(buffer.getvalue().encode())
+
+    def write(self, rows: List[dict]):
+        self._write([
+            [value.isoformat() if isinstance(value, datetime) else value for value in map(row.get, self.names)]
+            for row in rows
+        ])
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    def __init__(self, sink, columns: Columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        types = {"string": pa.string(), "float": pa.float64(), "int": pa.int64(), "bool": pa.bool_(),
+                 "timestamp": pa.timestamp("ms")}
+        self._table = pa.Table.from_pylist
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pq.ParquetWriter(sink, self.schema, compression="zstd")
+
+    def write(self, rows: List[dict]):
+        if rows:
+            self.writer.write_table(self._table(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(fmt: str, sink, table: str):
+    writer = {"csv": CsvWriter, "parquet": ParquetWriter}[fmt]
+    return writer(sink, TABLES[table].columns)
+
+
+def created_between(since: Optional[datetime], until: Optional[datetime]) -> dict:
+    created_at = {}
+    if since:
+        created_at["$gte"] = since
+    if until:
+        created_at["$lt"] = until
+    return {"created_at": created_at} if created_at else {}
+
+
+async def export_batches(db, source: str, writers: Dict[str, object], query: Optional[dict] = None,
+                         batch_size: int = BATCH_SIZE) -> AsyncIterator[Dict[str, int]]:
+    """Feed every document of ``source`` to ``writers`` (table -> writer), one batch at a time.
+
+    Yields the rows written per table after each batch. Closing the writers
+    is up to the caller.
+    """
+    cursor = db[source].find(query or {}, SOURCES[source]).batch_size(batch_size)
+    while True:
+        # Motor's to_list resumes the same cursor, fetching one batch per call
+        batch = await cursor.to_list(batch_size)
+        if not batch:
+            break
+        counts = {}
+        for table, writer in writers.items():
+            rows = [row for document in batch for row in TABLES[table].rows(document)]
+            writer.write(rows)
+            counts[table] = len(rows)
+        yield counts
+
+
+def main():
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    cli = typer.Typer(help="Export orders or products to CSV or Parquet files.")
+
+    @cli.command()
+    def run(
+        source: str = typer.Argument(..., help=f"One of: {', '.join(SOURCES)}"),
+        format: str = typer.Option("parquet", "--format", "-f", help=f"One of: {', '.join(FORMATS)}"),
+        output: Path = typer.Option(Path("exports"), help="Directory for the <table>.<format> files"),
+        since: Optional[datetime] = typer.Option(None, help="Only documents created at or after this time"),
+        until: Optional[datetime] = typer.Option(None, help="Only documents created before this time"),
+        batch_size: int = typer.Option(BATCH_SIZE, help="Documents read and written per batch"),
+    ):
+        """Write every table of SOURCE to OUTPUT and report throughput."""
+        if source not in SOURCES:
+            raise typer.BadParameter(f"Unknown source {source!r}")
+        if format not in FORMATS:
+            raise typer.BadParameter(f"Unknown format {format!r}")
+        tables = [table for table, spec in TABLES.items() if spec.source == source]
+        output.mkdir(parents=True, exist_ok=True)
+
+        async def export():
+            db = AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+            files = {table: open(output / f"{table}.{format}", "wb") for table in tables}
+            totals = dict.fromkeys(tables, 0)
+            start = time.perf_counter()
+            try:
+                writers = {table: open_writer(format, files[table], table) for table in tables}
+                async for counts in export_batches(db, source, writers, created_between(since, until), batch_size):
+                    for table, count in counts.items():
+                        totals[table] += count
+                    elapsed = time.perf_counter() - start
+                    typer.echo(f"  {totals[tables[0]]:,} {tables[0]} rows, {totals[tables[0]] / elapsed:,.0f} rows/s")
+                for writer in writers.values():
+                    writer.close()
+            finally:
+                for file in files.values():
+                    file.close()
+            elapsed = time.perf_counter() - start
+            for table in tables:
+                path = output / f"{table}.{format}"
+                typer.echo(f"{path}: {totals[table]:,} rows, {path.stat().st_size / 1024 / 1024:.1f} MiB, "
+                           f"{totals[table] / elapsed:,.0f} rows/s")
+            typer.echo(f"Exported in {elapsed:.2f}s")
+
+        try:
+            asyncio.run(export())
+        except RuntimeError as e:
+            raise typer.BadParameter(str(e))
+
+    cli()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,213 @@
+"""``Idempotency-Key`` support for non-idempotent endpoints.
+
+A client that sends the same ``Idempotency-Key`` again (typically a retry
+after a timeout) gets the first request's response replayed instead of a
+second order. Keys are scoped to the endpoint and the signed-in user, so
+two users cannot collide. A key sent with a different request body is
+rejected with 422.
+
+The first request for a key inserts an ``in_progress`` record into the
+``idempotency_keys`` collection, keyed by the 32-byte SHA-256 of the scope.
+The unique ``_id`` makes that insert the lock across workers. When the endpoint succeeds, the response is stored
+on the record, which a TTL index removes after ``ttl`` seconds.
+
+Duplicates are coalesced. In the same process they await the in-flight
+request's future. In another process they poll the record until it
+completes. An in-progress record whose owner died is taken over once its
+lease runs out.
+
+Only 2xx responses are kept. If the endpoint raises, the key is released
+so that a retry runs again. Coalesced duplicates waiting on it get the
+same error, or a 409 asking them to retry if the first request was
+cancelled.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+IN_PROGRESS = "in_progress"
+DONE = "done"
+
+
+class StoredResponse:
+    __slots__ = ("status_code", "body", "media_type")
+
+    def __init__(self, status_code: int, body: bytes, media_type: str):
+        self.status_code = status_code
+        self.body = body
+        self.media_type = media_type
+
+    def response(self, replayed: bool) -> Response:
+        headers = {"Idempotent-Replayed": "true"} if replayed else None
+        return Response(self.body, status_code=self.status_code, media_type=self.media_type, headers=headers)
+
+
+class IdempotencyStore:
+    def __init__(self, collection, ttl: float = 24 * 3600, lease: float = 60.0, poll_interval: float = 0.05):
+        self.collection = collection
+        self.ttl = timedelta(seconds=ttl)
+        self.lease = timedelta(seconds=lease)
+        self.poll_interval = poll_interval
+        self._in_flight: Dict[bytes, asyncio.Future] = {}
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.conflicts = 0
+
+    async def _acquire(self, key: bytes, fingerprint: str) -> Optional[StoredResponse]:
+        """Take the key, or return the response it already has.
+
+        Waits while another process holds the key; takes it over if that
+        process's lease expired.
+        """
+        deadline = time.monotonic() + self.lease.total_seconds()
+        while True:
+            now = datetime.utcnow()
+            try:
+                await self.collection.insert_one({
+                    "_id": key, "fingerprint": fingerprint, "status": IN_PROGRESS,
+                    "created_at": now, "locked_until": now + self.lease, "expires_at": now + self.ttl,
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+
+            record = await self.collection.find_one({"_id": key})
+            if record is None:
+                continue  # released or expired in between; try again
+            self._check(record["fingerprint"], fingerprint)
+            if record["status"] == DONE:
+                return StoredResponse(record["status_code"], record["body"], record["media_type"])
+            if record["locked_until"] <= now:
+                taken = await self.collection.update_one(
+                    {"_id": key, "status": IN_PROGRESS, "locked_until": record["locked_until"]},
+                    {"$set": {"locked_until": now + self.lease}},
+                )
+                if taken.modified_count:
+                    return None
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail=f"A request with this {HEADER} is still in progress")
+            await asyncio.sleep(self.poll_interval)
+
+    def _check(self, expected: str, fingerprint: str):
+        if expected != fingerprint:
+            self.conflicts += 1
+            raise HTTPException(status_code=422, detail=f"{HEADER} was already used with a different request")
+
+    async def run(self, key: bytes, fingerprint: str, call) -> Response:
+        """Run ``call`` once per key and return its (possibly replayed) response."""
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+            first_fingerprint, stored = await asyncio.shield(in_flight)
+            self._check(first_fingerprint, fingerprint)
+            return stored.response(replayed=True)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            stored = await self._acquire(key, fingerprint)
+            replayed = stored is not None
+            if replayed:
+                self.replayed += 1
+            else:
+                self.executed += 1
+                stored = await self._execute(key, call)
+            future.set_result((fingerprint, stored))
+            return stored.response(replayed)
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                # The duplicates' own requests were not cancelled; give them
+                # an answer to send instead of the leader's cancellation
+                exc = HTTPException(status_code=409, detail=f"The first request with this {HEADER} was "
+                                                            f"interrupted, please retry")
+            future.set_exception(exc)
+            future.exception()  # mark retrieved in case nobody was waiting
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _execute(self, key: bytes, call) -> StoredResponse:
+        try:
+            response = _to_response(await call())
+        except BaseException:
+            await self.collection.delete_one({"_id": key, "status": IN_PROGRESS})
+            raise
+        stored = StoredResponse(response.status_code, bytes(response.body), response.media_type or "application/json")
+        if 200 <= stored.status_code < 300:
+            await self.collection.update_one({"_id": key}, {"$set": {
+                "status": DONE, "status_code": stored.status_code, "body": stored.body,
+                "media_type": stored.media_type, "expires_at": datetime.utcnow() + self.ttl,
+            }})
+        else:
+            await self.collection.delete_one({"_id": key, "status": IN_PROGRESS})
+        return stored
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced,
+            "conflicts": self.conflicts,
+        }
+
+
+def _to_response(result) -> Response:
+    if isinstance(result, Response):
+        if not hasattr(result, "body"):
+            raise TypeError("Streaming responses cannot be made idempotent")
+        return result
+    body = json.dumps(jsonable_encoder(result), ensure_ascii=False, separators=(",", ":")).encode()
+    return Response(body, media_type="application/json")
+
+
+# Owner of keys sent without signing in
+GUEST = "guest"
+
+
+def idempotent(store: IdempotencyStore, owner: str = "current_user_id"):
+    """Honour an ``Idempotency-Key`` header on a POST/PUT/PATCH/DELETE endpoint.
+
+    Requests without the header run as before. The endpoint's return value
+    is rendered to JSON here, as :func:`cache.cached_response` does, so the
+    response body is identical for the first call and every replay.
+
+    Keys are scoped to the verified user id in the endpoint parameter named
+    ``owner`` (None for guests), not to the access token. A client that
+    refreshes its token and retries still gets the first response replayed.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, _idempotency_request: Request, **kwargs):
+            key = _idempotency_request.headers.get(HEADER)
+            if key is None:
+                return await func(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                raise HTTPException(status_code=400, detail=f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+
+            request = _idempotency_request
+            scope = hashlib.sha256("\n".join([
+                request.method, request.url.path, kwargs.get(owner) or GUEST, key,
+            ]).encode()).digest()
+            fingerprint = hashlib.sha256(await request.body()).hexdigest()
+            return await store.run(scope, fingerprint, lambda: func(*args, **kwargs))
+
+        # Ask FastAPI for the Request alongside the endpoint's own parameters
+        signature = inspect.signature(func)
+        request_param = inspect.Parameter("_idempotency_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+        wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), request_param])
+        return wrapper
+    return decorator
@@ -0,0 +1,310 @@
+"""Time-ordered identifiers for new documents, plus a migration for old ones.
+
+Random UUID4 ids scatter inserts across the whole ``id`` B-tree, so every
+insert touches a cold page. UUIDv7 and ULID ids start with a millisecond
+timestamp, so new ids land at the right edge of the index like an
+auto-increment key, and sorting by id is sorting by creation time.
+
+The scheme is picked with ``ID_SCHEME`` (read by the server at startup):
+
+* ``uuid7`` (default): RFC 9562 UUIDv7 in the usual 36-character form, so
+  it is accepted anywhere a UUID4 string was.
+* ``ulid``: 26-character Crockford base32 ULID, a smaller index key.
+* ``uuid4``: the old random ids.
+
+Ids stay strings in documents. They appear in URLs, JWT subjects, carts
+kept in the browser and references between collections, and MongoDB keeps
+strings and binary apart in an index, so old and new ids could not share
+one. :func:`to_binary` gives the 16-byte form for measurement and for
+collections that start out binary.
+
+Existing documents can be re-keyed with ids derived from their
+``created_at``, rewriting every reference to them:
+
+    python ids.py plan                         # count documents to migrate
+    python ids.py migrate orders carts         # dry run
+    python ids.py migrate orders carts --apply
+
+Migrated documents keep their old id in ``legacy_id``. Migrating ``users``
+signs everyone out, since tokens carry the old id, and migrating
+``products`` breaks saved product links. Stop the server and let the outbox
+drain before migrating either.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bson import Binary, UUID_SUBTYPE
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_CROCKFORD_VALUES = {char: value for value, char in enumerate(CROCKFORD)}
+
+
+def _ms(at: Optional[datetime]) -> int:
+    if at is None:
+        return time.time_ns() // 1_000_000
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)  # stored datetimes are naive UTC
+    return int(at.timestamp() * 1000)
+
+
+def uuid7(at: Optional[datetime] = None, entropy: Optional[int] = None) -> uuid.UUID:
+    """UUIDv7: 48-bit Unix milliseconds, version, variant, 74 random bits."""
+    entropy = secrets.randbits(80) if entropy is None else entropy
+    value = (_ms(at) & (2 ** 48 - 1)) << 80 | entropy
+    value = value & ~(0xF << 76) | 0x7 << 76  # version 7
+    value = value & ~(0x3 << 62) | 0x2 << 62  # RFC 4122 variant
+    return uuid.UUID(int=value)
+
+
+def _base32(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def ulid(at: Optional[datetime] = None, entropy: Optional[int] = None) -> str:
+    """ULID: 48-bit Unix milliseconds and 80 random bits, Crockford base32."""
+    entropy = secrets.randbits(80) if entropy is None else entropy
+    return _base32((_ms(at) & (2 ** 48 - 1)) << 80 | entropy, 26)
+
+
+# Scheme -> generator(at, entropy); None for either means now / random
+GENERATORS: Dict[str, Callable[[Optional[datetime], Optional[int]], str]] = {
+    "uuid7": lambda at, entropy: str(uuid7(at, entropy)),
+    "ulid": ulid,
+    "uuid4": lambda at, entropy: str(uuid.uuid4()),
+}
+
+_scheme = "uuid7"
+_generator = GENERATORS[_scheme]
+
+
+def configure(scheme: str):
+    """Select the id scheme used by :func:`new_id` from now on."""
+    global _generator, _scheme
+    if scheme not in GENERATORS:
+        raise ValueError(f"Unknown ID_SCHEME {scheme!r}; expected one of {', '.join(GENERATORS)}")
+    _generator = GENERATORS[scheme]
+    _scheme = scheme
+
+
+def new_id() -> str:
+    return _generator(None, None)
+
+
+def migrated_id(old: str, at: datetime) -> str:
+    """The time-ordered id that replaces ``old``: time part ``at``, random part hashed from ``old``.
+
+    Deterministic, so a repeated migration run picks the same replacement.
+    """
+    if _scheme == "uuid4":
+        raise ValueError("Migrating ids needs a time-ordered ID_SCHEME (uuid7 or ulid)")
+    return _generator(at, int.from_bytes(hashlib.sha256(old.encode()).digest()[:10], "big"))
+
+
+def to_binary(value: str) -> Binary:
+    """The 16-byte form of a UUID or ULID string."""
+    if len(value) == 26:
+        number = 0
+        for char in value.upper():
+            number = number << 5 | _CROCKFORD_VALUES[char]
+        if number >> 128:
+            raise ValueError(f"Not a ULID: {value!r}")
+        return Binary(number.to_bytes(16, "big"))
+    return Binary(uuid.UUID(value).bytes, UUID_SUBTYPE)
+
+
+def timestamp(value: str) -> Optional[datetime]:
+    """Creation time embedded in a UUIDv7 or ULID; None for other ids."""
+    try:
+        if len(value) == 26:
+            ms = int.from_bytes(to_binary(value), "big") >> 80
+        else:
+            parsed = uuid.UUID(value)
+            if parsed.version != 7:
+                return None
+            ms = parsed.int >> 80
+    except (KeyError, ValueError):
+        return None
+    return datetime.utcfromtimestamp(ms / 1000)
+
+
+def time_code(at: Optional[datetime] = None) -> str:
+    """Twelve base32 characters that sort by time of day: ms since midnight UTC plus 33 random bits.
+
+    Used as the order number suffix, so order numbers of the same day sort in
+    the order they were placed. Orders placed in the same millisecond only
+    differ in the random bits, so there are enough of them to make a
+    collision unlikely even at peak load.
+    """
+    ms = _ms(at) % 86_400_000  # fits in 27 bits
+    return _base32(ms << 33 | secrets.randbits(33), 12)
+
+
+# Collection -> (collection, field) pairs that hold its ids. A field inside
+# an array is written as "array.$[].field"; other dotted fields are embedded.
+REFERENCES: Dict[str, List[Tuple[str, str]]] = {
+    "products": [
+        ("carts", "items.$[].product_id"),
+        ("orders", "items.$[].product_id"),
+        ("reservations", "items.$[].product_id"),
+        ("stock_counters", "product_id"),
+        ("sales_by_product", "product_id"),
+    ],
+    "users": [
+        ("carts", "user_id"),
+        ("orders", "user_id"),
+        ("reservations", "user_id"),
+        ("sessions", "user_id"),
+        ("outbox", "payload.user_id"),
+    ],
+    "orders": [
+        ("outbox", "payload.order_id"),
+    ],
+    "carts": [],
+    "contacts": [],
+    "status_checks": [],
+}
+
+
+def _reference_update(document: dict, field: str, renames: Dict[str, str]) -> Optional[UpdateOne]:
+    """The update pointing ``document``'s references in ``field`` at their new ids, if it has any."""
+    array, _, name = field.partition(".$[].")
+    if name:
+        found = sorted({item.get(name) for item in document.get(array) or []} & renames.keys())
+        if not found:
+            return None
+        return UpdateOne({"_id": document["_id"]},
+                         {"$set": {f"{array}.$[ref{i}].{name}": renames[old] for i, old in enumerate(found)}},
+                         array_filters=[{f"ref{i}.{name}": old} for i, old in enumerate(found)])
+    value = document
+    for part in field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    if value not in renames:
+        return None
+    return UpdateOne({"_id": document["_id"], field: value}, {"$set": {field: renames[value]}})
+
+
+async def _rewrite_references(db, collection_name: str, renames: Dict[str, str]):
+    """Point every reference to the old ids in ``renames`` at the new ones.
+
+    One ``$in`` query per referencing field finds the documents to change,
+    so a field without an index is scanned once per batch, not once per id,
+    and each document is then updated by ``_id``.
+    """
+    old_ids = list(renames)
+    for referencing, field in REFERENCES[collection_name]:
+        path = field.replace(".$[]", "")
+        updates = []
+        async for document in db[referencing].find({path: {"$in": old_ids}}, {"_id": 1, path: 1}):
+            update = _reference_update(document, field, renames)
+            if update is not None:
+                updates.append(update)
+        if updates:
+            await db[referencing].bulk_write(updates, ordered=False)
+
+
+async def plan(db) -> Dict[str, int]:
+    """Documents per collection whose id is not time-ordered."""
+    counts = {}
+    for collection_name in REFERENCES:
+        count = 0
+        async for document in db[collection_name].find({}, {"_id": 0, "id": 1}):
+            if timestamp(document.get("id") or "") is None:
+                count += 1
+        counts[collection_name] = count
+    return counts
+
+
+async def migrate(db, collection_name: str, apply: bool = False, batch_size: int = 500) -> int:
+    """Give every document in ``collection_name`` without a time-ordered id a new one.
+
+    The new id carries the document's ``created_at`` (or ``timestamp``), so
+    migrated ids sort in creation order. Each batch rewrites references
+    before the documents themselves, and replacement ids are deterministic,
+    so an interrupted run can simply be repeated.
+    """
+    collection = db[collection_name]
+    migrated = 0
+    renames: Dict[str, str] = {}
+    documents: List[UpdateOne] = []
+
+    async def flush():
+        if renames:
+            await _rewrite_references(db, collection_name, renames)
+            renames.clear()
+        if documents:
+            await collection.bulk_write(documents, ordered=False)
+            documents.clear()
+
+    async for document in collection.find({}, {"_id": 1, "id": 1, "created_at": 1, "timestamp": 1}):
+        old = document.get("id")
+        if not old or timestamp(old) is not None:
+            continue
+        new = migrated_id(old, document.get("created_at") or document.get("timestamp") or datetime.utcnow())
+        migrated += 1
+        if not apply:
+            continue
+        renames[old] = new
+        documents.append(UpdateOne({"_id": document["_id"], "id": old}, {"$set": {"id": new, "legacy_id": old}}))
+        if len(documents) >= batch_size:
+            await flush()
+    await flush()
+    logger.info("%s %d %s ids", "Migrated" if apply else "Would migrate", migrated, collection_name)
+    return migrated
+
+
+def main():
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    configure(os.environ.get('ID_SCHEME', 'uuid7'))
+    cli = typer.Typer(help="Inspect or migrate document ids to time-ordered ids.")
+
+    def get_db():
+        return AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+
+    @cli.command(name="plan")
+    def plan_command():
+        """Count documents per collection that still have random ids."""
+        for collection_name, count in asyncio.run(plan(get_db())).items():
+            typer.echo(f"{collection_name}: {count}")
+
+    @cli.command(name="migrate")
+    def migrate_command(
+        collections: List[str] = typer.Argument(..., help=f"Any of: {', '.join(REFERENCES)}"),
+        apply: bool = typer.Option(False, help="Write the changes; without it this is a dry run"),
+    ):
+        """Re-key COLLECTIONS with time-ordered ids and rewrite references to them."""
+        unknown = [name for name in collections if name not in REFERENCES]
+        if unknown:
+            raise typer.BadParameter(f"Unknown collections: {', '.join(unknown)}")
+
+        async def run():
+            db = get_db()
+            for collection_name in collections:
+                count = await migrate(db, collection_name, apply=apply)
+                typer.echo(f"{collection_name}: {count} {'migrated' if apply else 'to migrate'}")
+        asyncio.run(run())
+
+    cli()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,207 @@
+"""MongoDB index declarations for every collection the API queries.
+
+The server applies these on startup. The module also works as a CLI so the
+same declarations can be checked or applied against any database:
+
+    python indexes.py check          # report drift, exit 1 if any
+    python indexes.py apply          # create missing indexes
+    python indexes.py apply --prune  # also drop undeclared indexes
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Collection name -> indexes the API relies on. Names are explicit so drift
+# detection can compare by name rather than by generated key strings.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Keyset pagination orders: (created_at, id) newest first and (price, id)
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("price", ASCENDING), ("id", ASCENDING)], name="price_id"),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="category_created_at_id"),
+        IndexModel([("featured", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="featured_created_at_id"),
+        # Workers poll for products written since their last search index sync
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+        # Stale checkout markers, swept when a process died mid-checkout
+        IndexModel([("pending_orders.at", ASCENDING)], name="pending_orders_at", sparse=True),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Workers poll for users registered since their last email filter sync
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+    ],
+    "carts": [
+        # One cart per user; concurrent upserts rely on this to not duplicate
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Order history pages: a user's orders newest first, id as the keyset tiebreaker
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+                   name="user_id_created_at_id"),
+    ],
+    "reservations": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Expired holds are deleted by the TTL monitor
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # Active holds per product, summed for available stock
+        IndexModel([("items.product_id", ASCENDING), ("expires_at", ASCENDING)], name="items_product_id_expires_at"),
+    ],
+    "stock_counters": [
+        # Sharded stock: one document per (product, size, shard)
+        IndexModel([("product_id", ASCENDING), ("size", ASCENDING), ("shard", ASCENDING)],
+                   name="product_id_size_shard_unique", unique=True),
+        # Stale checkout markers, swept when a process died mid-checkout
+        IndexModel([("pending.at", ASCENDING)], name="pending_at", sparse=True),
+    ],
+    "outbox": [
+        # Workers claim the oldest due task; metrics find the oldest open one
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        # Completed tasks are kept for a week
+        IndexModel([("done_at", ASCENDING)], name="done_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "idempotency_keys": [
+        # Keys are the _id, whose unique insert is the per-key lock
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "sessions": [
+        # Idle sessions expire; revoked ones once their last access token has
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # Workers poll for recent revocations
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at", sparse=True),
+    ],
+    "rate_limits": [
+        # Shared token buckets (RATE_LIMIT_BACKEND=mongo), dropped once refilled
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    # sales_daily is keyed by day in _id; per-product rows are upserted by (day, product)
+    "sales_by_product": [
+        IndexModel([("day", ASCENDING), ("product_id", ASCENDING)], name="day_product_id_unique", unique=True),
+    ],
+    "contacts": [
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+    ],
+}
+
+# Index options that change query semantics; anything else (e.g. the server
+# reported "v" version) is ignored when comparing.
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _normalize(spec: dict) -> dict:
+    # IndexModel stores keys as a SON mapping, index_information() as pairs.
+    key = spec["key"]
+    pairs = key.items() if hasattr(key, "items") else key
+    normalized = {"key": [(field, direction) for field, direction in pairs]}
+    for option in _COMPARED_OPTIONS:
+        # expireAfterSeconds=0 is a real TTL; False/absent flags are equivalent
+        if spec.get(option) or (option == "expireAfterSeconds" and spec.get(option) is not None):
+            normalized[option] = spec[option]
+    return normalized
+
+
+async def check_indexes(db) -> Dict[str, Dict[str, List[str]]]:
+    """Compare declared indexes with the database.
+
+    Returns a report keyed by collection with ``missing``, ``changed`` and
+    ``extra`` index names. Collections without drift are omitted.
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        existing = await db[collection_name].index_information()
+        existing.pop("_id_", None)
+        declared = {model.document["name"]: model.document for model in models}
+
+        missing = [name for name in declared if name not in existing]
+        changed = [
+            name for name, spec in declared.items()
+            if name in existing and _normalize(spec) != _normalize(existing[name])
+        ]
+        extra = [name for name in existing if name not in declared]
+
+        if missing or changed or extra:
+            report[collection_name] = {"missing": missing, "changed": changed, "extra": extra}
+    return report
+
+
+async def ensure_indexes(db, prune: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """Create missing indexes and return the drift that remains afterwards.
+
+    Creation is idempotent. Changed indexes are rebuilt only when ``prune`` is
+    set, since dropping an index on a large collection is not free.
+    """
+    report = await check_indexes(db)
+    for collection_name, drift in report.items():
+        collection = db[collection_name]
+        declared = {model.document["name"]: model for model in INDEXES[collection_name]}
+
+        to_drop = drift["extra"] + drift["changed"] if prune else []
+        for name in to_drop:
+            await collection.drop_index(name)
+            logger.info("Dropped index %s.%s", collection_name, name)
+
+        to_create = drift["missing"] + (drift["changed"] if prune else [])
+        for name in to_create:
+            try:
+                await collection.create_indexes([declared[name]])
+                logger.info("Created index %s.%s", collection_name, name)
+            except OperationFailure as e:
+                # Typically duplicate data blocking a unique index; keep
+                # serving and leave it in the drift report.
+                logger.error("Could not create index %s.%s: %s", collection_name, name, e)
+
+    remaining = await check_indexes(db)
+    for collection_name, drift in remaining.items():
+        logger.warning("Index drift on %s: %s", collection_name, drift)
+    return remaining
+
+
+def main():
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    cli = typer.Typer(help="Check or apply the API's MongoDB indexes.")
+
+    def get_db():
+        return AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+
+    def print_report(report):
+        if not report:
+            typer.echo("Indexes are up to date")
+        for collection_name, drift in report.items():
+            for kind, names in drift.items():
+                for name in names:
+                    typer.echo(f"{collection_name}.{name}: {kind}")
+
+    @cli.command()
+    def check():
+        """Report index drift; exits with status 1 if any is found."""
+        report = asyncio.run(check_indexes(get_db()))
+        print_report(report)
+        raise typer.Exit(code=1 if report else 0)
+
+    @cli.command()
+    def apply(prune: bool = typer.Option(False, help="Drop undeclared indexes and rebuild changed ones")):
+        """Create missing indexes."""
+        report = asyncio.run(ensure_indexes(get_db(), prune=prune))
+        print_report(report)
+        raise typer.Exit(code=1 if any(drift["missing"] for drift in report.values()) else 0)
+
+    cli()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
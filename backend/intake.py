@@ -0,0 +1,121 @@
+"""Group commit for order inserts.
+
+Under a checkout burst every request used to pay for its own ``insert_one``
+round trip and its own journal commit. With group commit, requests put
+their validated document on a bounded asyncio queue and wait. A single
+writer task drains the queue, sending up to ``max_batch`` documents in one
+``insert_many(ordered=False)``, or whatever has arrived within
+``max_delay`` seconds of the first one. Each request resumes once the
+batch containing its document has been acknowledged. With the default
+write concern that means journaled, exactly as with ``insert_one``.
+
+The bounded queue provides backpressure: when the writer falls behind,
+new submissions wait for space instead of growing memory without limit.
+"""
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitWriter:
+    def __init__(self, collection, max_batch: int = 100, max_delay: float = 0.005, max_pending: int = 5000):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._queue: "Optional[asyncio.Queue[Tuple[dict, asyncio.Future]]]" = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.documents = 0
+        self.failures = 0
+        self.largest_batch = 0
+
+    def start(self):
+        """Start batching; until then :meth:`insert` writes straight through."""
+        if self._task is None:
+            # Created here so the queue belongs to the serving event loop
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Flush everything already queued, then stop the writer."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def insert(self, document: dict):
+        """Insert ``document`` as part of the next batch; returns once it is stored.
+
+        Raises what ``insert_one`` would have raised for this document,
+        e.g. DuplicateKeyError.
+        """
+        if self._task is None:
+            await self.collection.insert_one(document)
+            return
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((document, future))
+        await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        errors = {}
+        try:
+            await self.collection.insert_many([document for document, _ in batch], ordered=False)
+        except BulkWriteError as exc:
+            # Unordered: every document without a write error was inserted
+            for error in exc.details.get("writeErrors", []):
+                error_class = DuplicateKeyError if error.get("code") == 11000 else WriteError
+                errors[error["index"]] = error_class(error.get("errmsg"), error.get("code"), error)
+        except Exception as exc:
+            logger.exception("Order batch of %d failed", len(batch))
+            errors = {index: exc for index in range(len(batch))}
+
+        self.batches += 1
+        self.documents += len(batch)
+        self.failures += len(errors)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for index, (_, future) in enumerate(batch):
+            if future.done():  # the request was cancelled while waiting
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "documents": self.documents,
+            "failures": self.failures,
+            "average_batch": self.documents / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
@@ -0,0 +1,141 @@
+"""Outgoing email, plus a local SMTP sink that stands in for a real relay.
+
+With ``SMTP_HOST`` set, messages are sent over SMTP from a worker thread so
+the event loop never blocks on the network. Without it they are only
+logged, which keeps development setups free of mail configuration.
+
+To see real messages locally, run the sink and point the server at it:
+
+    python mailer.py sink --port 1025 --directory ./mail
+    SMTP_HOST=localhost SMTP_PORT=1025 uvicorn server:app
+
+The sink accepts any message and writes it to ``<directory>/<n>.eml``.
+"""
+import asyncio
+import logging
+import os
+import smtplib
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class Mailer:
+    def __init__(self, host: Optional[str] = None, port: int = 25, user: Optional[str] = None,
+                 password: Optional[str] = None, sender: str = "no-reply@tramhuong.local"):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender
+        self.sent = 0
+
+    @classmethod
+    def from_env(cls) -> "Mailer":
+        return cls(
+            host=os.environ.get("SMTP_HOST"),
+            port=int(os.environ.get("SMTP_PORT", 25)),
+            user=os.environ.get("SMTP_USER"),
+            password=os.environ.get("SMTP_PASSWORD"),
+            sender=os.environ.get("MAIL_FROM", "no-reply@tramhuong.local"),
+        )
+
+    def build_message(self, to: str, subject: str, body: str) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = to
+        message["Subject"] = subject
+        message.set_content(body)
+        return message
+
+    def _send(self, message: EmailMessage):
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.user:
+                smtp.starttls()
+                smtp.login(self.user, self.password)
+            smtp.send_message(message)
+
+    async def send(self, to: str, subject: str, body: str):
+        message = self.build_message(to, subject, body)
+        if not self.host:
+            logger.info("Email to %s (SMTP_HOST not set, not sent): %s", to, subject)
+        else:
+            await asyncio.to_thread(self._send, message)
+        self.sent += 1
+
+
+class SmtpSink:
+    """Minimal SMTP server that stores every message it receives."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.received = len(list(self.directory.glob("*.eml")))
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 tramhuong SMTP sink ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip().upper()
+                if command.startswith(("HELO", "EHLO")):
+                    await reply("250 sink")
+                elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                    await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = bytearray()
+                    while True:
+                        chunk = await reader.readline()
+                        if chunk in (b".\r\n", b".\n", b""):
+                            break
+                        data += chunk[1:] if chunk.startswith(b"..") else chunk
+                    self.received += 1
+                    (self.directory / f"{self.received}.eml").write_bytes(bytes(data))
+                    logger.info("Stored message %d", self.received)
+                    await reply("250 OK: queued")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    import typer
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    cli = typer.Typer(help="Send a test email or run a local SMTP sink.")
+
+    @cli.command()
+    def sink(host: str = "localhost", port: int = 1025, directory: Path = Path("mail")):
+        """Run an SMTP sink that writes every received message to DIRECTORY."""
+        typer.echo(f"SMTP sink on {host}:{port}, writing to {directory.resolve()}")
+        asyncio.run(SmtpSink(directory).serve(host, port))
+
+    @cli.command()
+    def send(to: str, subject: str = "Test email", body: str = "Hello from the shop backend."):
+        """Send one message through the configured SMTP_HOST."""
+        asyncio.run(Mailer.from_env().send(to, subject, body))
+
+    cli()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
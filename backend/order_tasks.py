@@ -0,0 +1,81 @@
+"""Side effects of a placed order, run by the outbox workers.
+
+Every handler is idempotent, since the outbox may run a task more than once:
+
+* ``backfill_profile`` only fills the user's address when it is still empty.
+* ``clear_cart`` only deletes a cart not touched since the order was placed,
+  so a late retry cannot wipe a cart the customer has started since.
+* ``order_confirmation`` records ``confirmation_sent_at`` on the order and
+  skips orders that already have it. A crash between sending and
+  recording can still send the email twice; that is accepted.
+"""
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from mailer import Mailer
+from outbox import Handler
+
+ADDRESS_FIELDS = ("address", "city", "district", "ward", "zip_code")
+
+
+def order_placed_tasks(order: dict) -> List[Tuple[str, dict]]:
+    """Outbox tasks for a newly stored order."""
+    tasks = []
+    user_id = order.get("user_id")
+    if user_id:
+        address = {field: order["shipping_address"][field]
+                   for field in ADDRESS_FIELDS if order["shipping_address"].get(field)}
+        if address:
+            tasks.append(("backfill_profile", {"user_id": user_id, "address": address}))
+        tasks.append(("clear_cart", {"user_id": user_id, "ordered_at": order["created_at"]}))
+    tasks.append(("order_confirmation", {"order_id": order["id"]}))
+    return tasks
+
+
+def format_vnd(amount: float) -> str:
+    return f"{amount:,.0f}".replace(",", ".") + " ₫"
+
+
+def confirmation_email(order: dict) -> Tuple[str, str]:
+    lines = [
+        f"Cảm ơn bạn đã đặt hàng! Mã đơn hàng: {order['order_number']}",
+        "",
+        *(f"- {item['name']}{' (' + item['size'] + ')' if item.get('size') else ''} "
+          f"x{item['quantity']}: {format_vnd(item['subtotal'])}" for item in order["items"]),
+        "",
+        f"Tạm tính: {format_vnd(order['subtotal'])}",
+        f"Phí vận chuyển: {format_vnd(order['shipping_fee'])}",
+        f"Tổng cộng: {format_vnd(order['total_amount'])}",
+    ]
+    return f"Xác nhận đơn hàng {order['order_number']}", "\n".join(lines)
+
+
+def build_handlers(db, mailer: Mailer) -> Dict[str, Handler]:
+    async def backfill_profile(payload: dict):
+        # Same rule as before: fill in the address while the profile lacks one
+        await db.users.update_one(
+            {"id": payload["user_id"], "$or": [{"address": {"$in": [None, ""]}}, {"city": {"$in": [None, ""]}}]},
+            {"$set": {**payload["address"], "updated_at": datetime.utcnow()}},
+        )
+
+    async def clear_cart(payload: dict):
+        await db.carts.delete_one({"user_id": payload["user_id"], "updated_at": {"$lte": payload["ordered_at"]}})
+
+    async def order_confirmation(payload: dict):
+        order = await db.orders.find_one({"id": payload["order_id"]}, {"_id": 0})
+        if order is None or order.get("confirmation_sent_at"):
+            return
+        recipient = order["customer_info"].get("email")
+        if not recipient and order.get("user_id"):
+            user = await db.users.find_one({"id": order["user_id"]}, {"_id": 0, "email": 1})
+            recipient = user and user.get("email")
+        if recipient:
+            subject, body = confirmation_email(order)
+            await mailer.send(recipient, subject, body)
+        await db.orders.update_one({"id": order["id"]}, {"$set": {"confirmation_sent_at": datetime.utcnow()}})
+
+    return {
+        "backfill_profile": backfill_profile,
+        "clear_cart": clear_cart,
+        "order_confirmation": order_confirmation,
+    }
@@ -0,0 +1,166 @@
+"""Durable outbox for work that should happen after a request, not during it.
+
+Side effects that do not affect the response (profile backfill, cart
+clearing, confirmation email) are stored as documents in the ``outbox``
+collection and the request returns at once. An in-process pool of async
+workers claims due tasks with ``find_one_and_update``. A claim is a lease:
+a task whose worker died becomes claimable again once ``locked_until``
+passes. Because of that, and because of retries, a task can run more than
+once, so every handler must be idempotent.
+
+A failed task is retried with exponential backoff until ``max_attempts``,
+then parked as ``failed`` for inspection. Completed tasks are kept for a
+week, then removed by a TTL index on ``done_at``. Tasks are keyed by their
+ObjectId ``_id``, which is already small and time-ordered.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+
+def task(kind: str, payload: dict, now: datetime = None) -> dict:
+    """An outbox document for ``kind``, due immediately."""
+    now = now or datetime.utcnow()
+    return {
+        "kind": kind,
+        "payload": payload,
+        "status": PENDING,
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+    }
+
+
+class Outbox:
+    def __init__(self, collection, handlers: Dict[str, Handler], workers: int = 4, max_attempts: int = 5,
+                 retry_delay: float = 2.0, lease: float = 60.0, poll_interval: float = 1.0):
+        self.collection = collection
+        self.handlers = handlers
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = timedelta(seconds=lease)
+        self.poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def enqueue(self, tasks: Iterable[Tuple[str, dict]]):
+        """Store ``(kind, payload)`` tasks durably and wake the workers."""
+        now = datetime.utcnow()
+        documents = [task(kind, payload, now) for kind, payload in tasks]
+        if documents:
+            await self.collection.insert_many(documents, ordered=False)
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def start(self):
+        if not self._tasks:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._tasks = [asyncio.get_running_loop().create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        self._stopping = True
+        for worker in self._tasks:
+            worker.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "available_at": {"$lte": now}},
+                # Lease expired: the worker holding it is gone
+                {"status": PROCESSING, "locked_until": {"$lte": now}},
+            ]},
+            {"$set": {"status": PROCESSING, "locked_until": now + self.lease}, "$inc": {"attempts": 1}},
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _work(self):
+        # The flag backs up cancel(): on Python 3.11 wait_for drops a
+        # cancellation that arrives just as the wakeup event is set
+        while not self._stopping:
+            # Cleared before claiming so an enqueue during the claim still wakes us
+            self._wakeup.clear()
+            try:
+                claimed = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox claim failed")
+                claimed = None
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(claimed)
+
+    async def _run(self, claimed: dict):
+        handler = self.handlers.get(claimed["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No outbox handler for {claimed['kind']!r}")
+            await handler(claimed["payload"])
+        except asyncio.CancelledError:
+            # Shutting down: the lease lapses and another worker retries it
+            raise
+        except Exception as exc:
+            await self._failed(claimed, exc)
+            return
+        self.processed += 1
+        await self.collection.update_one(
+            {"_id": claimed["_id"]},
+            {"$set": {"status": DONE, "done_at": datetime.utcnow()}, "$unset": {"locked_until": ""}},
+        )
+
+    async def _failed(self, claimed: dict, exc: Exception):
+        attempts = claimed["attempts"]
+        update = {"last_error": f"{type(exc).__name__}: {exc}"}
+        if attempts >= self.max_attempts:
+            logger.error("Outbox task %s (%s) failed after %d attempts: %s", claimed["_id"], claimed["kind"],
+                         attempts, exc)
+            self.failed += 1
+            update["status"] = FAILED
+        else:
+            self.retried += 1
+            update["status"] = PENDING
+            update["available_at"] = datetime.utcnow() + timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+        await self.collection.update_one({"_id": claimed["_id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+
+    async def stats(self) -> dict:
+        """Queue depth and lag read from the collection, plus this process's counters."""
+        depth = await self.collection.count_documents({"status": {"$in": [PENDING, PROCESSING]}})
+        failed = await self.collection.count_documents({"status": FAILED})
+        oldest = await self.collection.find_one(
+            {"status": {"$in": [PENDING, PROCESSING]}}, {"_id": 0, "created_at": 1}, sort=[("created_at", 1)])
+        lag = (datetime.utcnow() - oldest["created_at"]).total_seconds() if oldest else 0.0
+        return {
+            "queue_depth": depth,
+            "failed_tasks": failed,
+            "lag_seconds": lag,
+            "workers": len(self._tasks),
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
@@ -0,0 +1,91 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor records the sort key of the last item on a page. The next page is
+then a range query on an index rather than a skip over every earlier
+document, so deep pages cost the same as the first one.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Sequence, Tuple, Union
+
+from fastapi import HTTPException
+
+SortSpec = Sequence[Tuple[str, int]]
+# Field -> type(s) its sort key may have in a cursor
+KeyTypes = Mapping[str, Union[type, Tuple[type, ...]]]
+
+
+def _invalid() -> HTTPException:
+    return HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+
+def _from_json(value: Any) -> Any:
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    payload = {key: [_to_json(v) for v in value] if isinstance(value, list) else _to_json(value)
+               for key, value in data.items()}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        return {key: [_from_json(v) for v in value] if isinstance(value, list) else _from_json(value)
+                for key, value in payload.items()}
+    except (ValueError, TypeError, AttributeError):
+        raise _invalid()
+
+
+def cursor_offset(position: Dict[str, Any]) -> int:
+    """The ``o`` offset of a cursor into a ranked list."""
+    offset = position.get("o", 0)
+    if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+        raise _invalid()
+    return offset
+
+
+def cursor_keys(position: Dict[str, Any], sort: SortSpec, types: KeyTypes) -> List[Any]:
+    """The ``k`` sort key of a cursor, checked against ``types``.
+
+    Cursors come from clients, so anything but a plain value of the sort
+    field's type (or None, for a document missing the field) is refused
+    rather than passed into a query where a dict would act as an operator.
+    """
+    values = position.get("k")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise _invalid()
+    for (field, _), value in zip(sort, values):
+        if value is not None and (isinstance(value, bool) or not isinstance(value, types[field])):
+            raise _invalid()
+    return values
+
+
+def sort_values(document: dict, sort: SortSpec) -> List[Any]:
+    return [document.get(field) for field, _ in sort]
+
+
+def keyset_filter(sort: SortSpec, values: Sequence[Any]) -> dict:
+    """Filter matching documents strictly after ``values`` in ``sort`` order.
+
+    ``sort`` is a primary key plus a unique tiebreaker, both in the same
+    direction, so a compound index on them serves the query.
+    """
+    (field, direction), (tie_field, _) = sort
+    op = "$lt" if direction < 0 else "$gt"
+    return {"$or": [
+        {field: {op: values[0]}},
+        {field: values[0], tie_field: {op: values[1]}},
+    ]}
@@ -0,0 +1,131 @@
+"""Password hashing off the event loop, with upgrade-on-login for old hashes.
+
+Argon2 (the default) and bcrypt are deliberately slow: tens to hundreds of
+milliseconds of CPU per hash. Run inline, a handful of concurrent sign-ins
+would stall every other request on the event loop. Here each hash or verify
+runs in a small dedicated thread pool. Both libraries release the GIL while
+hashing, so the loop keeps serving the catalog from its own thread. A
+semaphore sized to the pool caps the work in progress. Past ``max_waiting``
+queued callers, new sign-ins get 503 with ``Retry-After`` instead of a
+growing queue.
+
+Older accounts store an unsalted hex SHA-256 (passlib's ``hex_sha256``).
+Such hashes, and hashes made with another scheme or a lower cost than the
+current settings, still verify. :meth:`PasswordHasher.verify` then returns a
+replacement hash, which the login endpoint stores. Each account moves to the
+current scheme the next time its owner signs in.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+SCHEMES = ("argon2", "bcrypt")
+LEGACY = "hex_sha256"
+
+
+class PasswordHasher:
+    def __init__(self, scheme: str = "argon2", workers: int = 2, max_waiting: int = 256,
+                 argon2_time_cost: int = 3, argon2_memory_cost: int = 64 * 1024, argon2_parallelism: int = 1,
+                 bcrypt_rounds: int = 12):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown PASSWORD_SCHEME {scheme!r}; expected one of {', '.join(SCHEMES)}")
+        # Every scheme but the default is deprecated, and a hash below the
+        # configured cost counts as outdated, so both get replaced on login
+        self.context = CryptContext(
+            schemes=[scheme, *(other for other in SCHEMES if other != scheme), LEGACY],
+            default=scheme,
+            deprecated="auto",
+            argon2__rounds=argon2_time_cost,
+            argon2__min_rounds=argon2_time_cost,
+            argon2__memory_cost=argon2_memory_cost,
+            argon2__parallelism=argon2_parallelism,
+            bcrypt__rounds=bcrypt_rounds,
+            bcrypt__min_rounds=bcrypt_rounds,
+        )
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+        self.in_flight = 0
+        self.hashed = 0
+        self.verified = 0
+        self.failed = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self._operations = 0
+        self._wait_seconds = 0.0
+        self._work_seconds = 0.0
+        self._max_work_seconds = 0.0
+
+    async def _run(self, function, *args):
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many sign-ins in progress, please retry",
+                                headers={"Retry-After": "1"})
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self._wait_seconds += started - queued
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            elapsed = time.perf_counter() - started
+            self._operations += 1
+            self._work_seconds += elapsed
+            self._max_work_seconds = max(self._max_work_seconds, elapsed)
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(self.context.hash, password)
+        self.hashed += 1
+        return hashed
+
+    async def verify(self, password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Check ``password``; returns (matches, replacement hash or None).
+
+        Pass None for an unknown account. A dummy verify then takes about as
+        long as a real one, so response times do not reveal which emails
+        are registered.
+        """
+        if hashed is None:
+            await self._run(self.context.dummy_verify)
+            self.failed += 1
+            return False, None
+        matches, replacement = await self._run(self.context.verify_and_update, password, hashed)
+        self.verified += 1
+        if not matches:
+            self.failed += 1
+        elif replacement is not None:
+            self.rehashed += 1
+        return matches, replacement
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        operations = self._operations
+        return {
+            "scheme": self.context.default_scheme(),
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "failed": self.failed,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self._wait_seconds / operations * 1000, 2) if operations else 0.0,
+            "avg_hash_ms": round(self._work_seconds / operations * 1000, 2) if operations else 0.0,
+            "max_hash_ms": round(self._max_work_seconds * 1000, 2),
+        }
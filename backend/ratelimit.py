@@ -0,0 +1,228 @@
+"""Token-bucket rate limiting for expensive endpoints.
+
+Each limited route has a :class:`Limit` with an optional bucket per client
+IP and one per signed-in user. A bucket holds up to ``Rate.limit`` tokens
+and refills at ``limit / period`` tokens per second. Every request takes one
+token from each bucket that applies. A request that finds a bucket empty
+gets 429 with ``Retry-After`` set to the seconds until a token is back, and
+never reaches the endpoint, so a single client cannot saturate MongoDB.
+
+Buckets live in a backend with one method, ``take(key, rate)``, which
+returns 0 when a token was taken and the seconds to wait otherwise:
+
+* :class:`MemoryBackend` (default) keeps buckets in the worker process. With
+  N workers a client effectively gets N times the limit.
+* :class:`MongoBackend` keeps them in a shared collection, one atomic
+  pipeline update per check, so all workers enforce one limit.
+
+If the backend fails, requests are let through and counted as ``errors``.
+The client address is the ASGI ``client``; behind a proxy, run uvicorn with
+``--proxy-headers`` so that it is the real client's.
+"""
+import json
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Rate(NamedTuple):
+    limit: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        """``"10/minute"``: a burst of 10, refilled over a minute."""
+        count, _, unit = value.partition("/")
+        if unit not in PERIODS or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid rate {value!r}; expected e.g. '10/minute'")
+        return cls(int(count), PERIODS[unit])
+
+    @property
+    def per_second(self) -> float:
+        return self.limit / self.period
+
+
+class Limit(NamedTuple):
+    ip: Optional[Rate] = None
+    user: Optional[Rate] = None
+    # Only requests carrying this query parameter are limited
+    only_with: Optional[str] = None
+
+
+def parse_limits(config: str) -> Dict[str, Limit]:
+    """Limits from JSON like ``{"POST /api/auth/login": {"ip": "10/minute"}}``."""
+    limits = {}
+    for route, spec in json.loads(config).items():
+        limits[route] = Limit(
+            ip=Rate.parse(spec["ip"]) if spec.get("ip") else None,
+            user=Rate.parse(spec["user"]) if spec.get("user") else None,
+            only_with=spec.get("only_with"),
+        )
+    return limits
+
+
+class MemoryBackend:
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> (tokens, monotonic time of the last update, time the bucket is full again)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    async def take(self, key: str, rate: Rate) -> float:
+        now = time.monotonic()
+        tokens, updated, _ = self._buckets.get(key, (rate.limit, now, now))
+        tokens = min(rate.limit, tokens + (now - updated) * rate.per_second)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate.per_second
+        self._buckets[key] = (tokens, now, now + (rate.limit - tokens) / rate.per_second)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return wait
+
+    def _prune(self, now: float):
+        # A full bucket is the same as no bucket
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        # Still too many active clients: forget the oldest, giving them a fresh bucket
+        excess = len(self._buckets) - self.max_keys
+        for key in list(self._buckets)[:max(excess, 0)]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class MongoBackend:
+    """Buckets shared by every worker, one document per key, expired by a TTL index."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, rate: Rate) -> float:
+        now = time.time()
+        refilled = {"$min": [rate.limit, {"$add": [
+            {"$ifNull": ["$tokens", rate.limit]},
+            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, rate.per_second]},
+        ]}]}
+        bucket = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "updated": now,
+                    # Once the bucket has refilled, the document carries no information
+                    "expires_at": datetime.utcnow() + timedelta(seconds=rate.period),
+                }},
+            ],
+            projection={"_id": 0, "allowed": 1, "tokens": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if bucket["allowed"]:
+            return 0.0
+        return (1 - bucket["tokens"]) / rate.per_second
+
+    def __len__(self):
+        return 0
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, Limit], backend=None,
+                 identify: Optional[Callable[[str], Optional[str]]] = None):
+        """``identify`` maps a bearer token to a user id, or None when it is not valid."""
+        self.limits = limits
+        self.backend = backend or MemoryBackend()
+        self.identify = identify
+        self.allowed: Dict[str, int] = {route: 0 for route in limits}
+        self.limited: Dict[str, int] = {route: 0 for route in limits}
+        self.errors = 0
+
+    async def check(self, scope) -> float:
+        """Seconds the request must wait, or 0 to let it through."""
+        route = f"{scope['method']} {scope['path']}"
+        limit = self.limits.get(route)
+        if limit is None:
+            return 0.0
+        if limit.only_with and limit.only_with not in parse_qs(scope.get("query_string", b"").decode()):
+            return 0.0
+
+        buckets = []
+        if limit.ip is not None:
+            client = scope.get("client")
+            buckets.append((f"{route}:ip:{client[0] if client else 'unknown'}", limit.ip))
+        if limit.user is not None and self.identify is not None:
+            user_id = self._user_id(scope)
+            if user_id is not None:
+                buckets.append((f"{route}:user:{user_id}", limit.user))
+
+        for key, rate in buckets:
+            try:
+                wait = await self.backend.take(key, rate)
+            except Exception:
+                logger.exception("Rate limit backend failed; letting %s through", route)
+                self.errors += 1
+                return 0.0
+            if wait > 0:
+                self.limited[route] += 1
+                return wait
+        self.allowed[route] += 1
+        return 0.0
+
+    def _user_id(self, scope) -> Optional[str]:
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    return self.identify(token)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "buckets": len(self.backend),
+            "errors": self.errors,
+            "routes": {
+                route: {"allowed": self.allowed[route], "limited": self.limited[route]}
+                for route in self.limits
+            },
+        }
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with ``Retry-After`` when :class:`RateLimiter` says so."""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            wait = await self.limiter.check(scope)
+            if wait > 0:
+                retry_after = max(1, math.ceil(wait))
+                body = json.dumps({"detail": f"Too many requests, retry in {retry_after} s"}).encode()
+                await send({
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        (b"retry-after", str(retry_after).encode()),
+                    ],
+                })
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,130 @@
+"""Short-lived stock holds taken when a customer starts checkout.
+
+A reservation document lists per-variation quantities and an
+``expires_at``; a TTL index deletes it once it lapses, and queries also
+filter on ``expires_at`` because the TTL monitor only runs once a minute.
+Holds never touch the product documents. Available stock is derived as
+physical stock minus the active holds, summed by one aggregation over the
+``items.product_id, expires_at`` index.
+
+Holds and orders use insert-then-verify instead of locking:
+
+* A new hold is inserted first, then checked against the stock read after
+  the insert and the holds placed no later than it. If they do not fit it
+  is deleted again, so the earlier of two competing holds wins.
+* An order decrements stock first (see :mod:`checkout`), then checks that
+  the remaining stock still covers every other active hold, and gives the
+  stock back if it does not. An order converts its own hold by excluding
+  it from that check and deleting it once the order is stored.
+
+Whichever side checks second sees the other's write, so a held unit can
+never be sold to someone else while the hold is active.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import stock_shards
+
+# (product_id, size) -> quantity held; size None holds product-level stock
+Reserved = Dict[Tuple[str, Optional[str]], int]
+
+STOCK_PROJECTION = {"_id": 0, "id": 1, "name": 1, "stock_quantity": 1, "variations.size": 1,
+                    "variations.stock_quantity": 1, "stock_shards": 1}
+
+
+async def load_stock(db, product_ids: Iterable[str]) -> List[dict]:
+    """Products with live stock, summing counters for sharded products."""
+    product_ids = list(product_ids)
+    products = await db.products.find({"id": {"$in": product_ids}}, STOCK_PROJECTION).to_list(len(product_ids))
+    sharded = [product["id"] for product in products if product.get("stock_shards")]
+    if not sharded:
+        return products
+    sku_totals = await stock_shards.totals(db.stock_counters, sharded)
+    return [stock_shards.apply_totals(product, sku_totals) if product.get("stock_shards") else product
+            for product in products]
+
+
+async def reserved_quantities(collection, product_ids: Iterable[str], now: datetime = None,
+                              exclude_id: str = None, placed_until: datetime = None) -> Reserved:
+    """Sum active holds on ``product_ids`` by product and size.
+
+    ``exclude_id`` leaves one reservation out; ``placed_until`` only counts
+    holds created at or before that time.
+    """
+    product_ids = list(product_ids)
+    match = {"items.product_id": {"$in": product_ids}, "expires_at": {"$gt": now or datetime.utcnow()}}
+    if exclude_id is not None:
+        match["id"] = {"$ne": exclude_id}
+    if placed_until is not None:
+        match["created_at"] = {"$lte": placed_until}
+    pipeline = [
+        {"$match": match},
+        {"$unwind": "$items"},
+        {"$match": {"items.product_id": {"$in": product_ids}}},
+        {"$group": {
+            "_id": {"product_id": "$items.product_id", "size": "$items.size"},
+            "quantity": {"$sum": "$items.quantity"},
+        }},
+    ]
+    reserved: Reserved = {}
+    async for row in collection.aggregate(pipeline):
+        reserved[(row["_id"]["product_id"], row["_id"].get("size"))] = row["quantity"]
+    return reserved
+
+
+def availability(product: dict, reserved: Reserved) -> dict:
+    """Stock, held and available quantities for a product and its variations.
+
+    Stock and available quantities are None for a product whose stock is
+    not tracked.
+    """
+    held = defaultdict(int)
+    for (product_id, size), quantity in reserved.items():
+        if product_id == product["id"]:
+            held[size] += quantity
+    total_held = sum(held.values())
+    tracked = product.get("stock_quantity") is not None
+
+    def available(stock: int, quantity_held: int) -> Optional[int]:
+        return max(stock - quantity_held, 0) if tracked else None
+
+    return {
+        "product_id": product["id"],
+        "stock_quantity": product.get("stock_quantity"),
+        "reserved": total_held,
+        "available": available(product.get("stock_quantity"), total_held),
+        "variations": [
+            {
+                "size": variation["size"],
+                "stock_quantity": variation.get("stock_quantity", 0) if tracked else None,
+                "reserved": held[variation["size"]],
+                "available": available(variation.get("stock_quantity", 0), held[variation["size"]]),
+            }
+            for variation in product.get("variations") or []
+        ],
+    }
+
+
+def oversubscribed(products: Iterable[dict], reserved: Reserved) -> List[str]:
+    """Names of products whose holds exceed product or variation stock."""
+    short = []
+    for product in products:
+        if product.get("stock_quantity") is None:
+            # Untracked stock cannot run out
+            continue
+        counts = availability(product, reserved)
+        if counts["reserved"] > counts["stock_quantity"] or any(
+                variation["reserved"] > variation["stock_quantity"] for variation in counts["variations"]):
+            short.append(product["name"])
+    return short
+
+
+async def check_holds(db, product_ids: Iterable[str], exclude_id: str = None,
+                      placed_until: datetime = None) -> List[str]:
+    """Read current stock and active holds; return the oversubscribed products."""
+    product_ids = list(product_ids)
+    products = await load_stock(db, product_ids)
+    reserved = await reserved_quantities(db.reservations, product_ids, exclude_id=exclude_id,
+                                         placed_until=placed_until)
+    return oversubscribed(products, reserved)
@@ -0,0 +1,229 @@
+"""Sales rollups kept current with ``$inc``, so dashboards never scan orders.
+
+Two collections hold pre-aggregated sales, bucketed by the UTC day the order
+was placed:
+
+* ``sales_daily``: one document per day (``_id`` is midnight UTC) with
+  ``orders``, ``revenue`` and ``units`` for orders that are not cancelled,
+  plus ``statuses``, the count of that day's orders in each status.
+* ``sales_by_product``: one document per (``day``, ``product_id``) with
+  ``units``, ``revenue`` and the product ``name``.
+
+:func:`record` applies the change an order makes to the rollups when it is
+created or changes status. It runs right after the order write, so a crash
+between the two leaves the rollups short by that order. :func:`rebuild`
+recomputes both collections from ``orders`` and swaps them in; run it after
+an incident or on a schedule:
+
+    python rollups.py rebuild
+
+Orders written while a rebuild runs may be missing from its result.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from indexes import INDEXES
+
+logger = logging.getLogger(__name__)
+
+DAILY = "sales_daily"
+BY_PRODUCT = "sales_by_product"
+CANCELLED = "cancelled"
+
+BUCKETS = ("day", "week", "month")
+
+# Midnight UTC of an order's created_at, as an aggregation expression
+_DAY = {"$dateFromParts": {
+    "year": {"$year": "$created_at"}, "month": {"$month": "$created_at"}, "day": {"$dayOfMonth": "$created_at"},
+}}
+
+
+def day_of(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def contribution(order: dict, status: str) -> Tuple[Dict[str, float], Dict[str, Dict[str, float]]]:
+    """What ``order`` adds to its day's and its products' rollups while in ``status``."""
+    daily = {f"statuses.{status}": 1}
+    products: Dict[str, Dict[str, float]] = {}
+    if status != CANCELLED:
+        daily.update(orders=1, revenue=order["total_amount"], units=sum(item["quantity"] for item in order["items"]))
+        for item in order["items"]:
+            totals = products.setdefault(item["product_id"], {"units": 0, "revenue": 0.0})
+            totals["units"] += item["quantity"]
+            totals["revenue"] += item["subtotal"]
+    return daily, products
+
+
+def _subtract(into: Dict[str, float], other: Dict[str, float]):
+    for field, value in other.items():
+        into[field] = into.get(field, 0) - value
+
+
+async def record(db, order: dict, old_status: Optional[str], new_status: str):
+    """Move ``order`` from ``old_status`` to ``new_status`` in the rollups; None for a new order."""
+    daily, products = contribution(order, new_status)
+    if old_status is not None:
+        old_daily, old_products = contribution(order, old_status)
+        _subtract(daily, old_daily)
+        for product_id, totals in old_products.items():
+            _subtract(products.setdefault(product_id, {}), totals)
+
+    day = day_of(order["created_at"])
+    daily = {field: value for field, value in daily.items() if value}
+    if daily:
+        await db[DAILY].update_one({"_id": day}, {"$inc": daily}, upsert=True)
+
+    names = {item["product_id"]: item["name"] for item in order["items"]}
+    updates = [
+        UpdateOne({"day": day, "product_id": product_id},
+                  {"$inc": changed, "$set": {"name": names[product_id]}}, upsert=True)
+        for product_id, totals in products.items()
+        if (changed := {field: value for field, value in totals.items() if value})
+    ]
+    if updates:
+        await db[BY_PRODUCT].bulk_write(updates, ordered=False)
+
+
+async def rebuild(db):
+    """Recompute both rollup collections from ``orders`` and swap them in."""
+    not_cancelled = {"$ne": ["$_id.status", CANCELLED]}
+    daily_pipeline = [
+        {"$group": {
+            "_id": {"day": _DAY, "status": "$status"},
+            "count": {"$sum": 1},
+            "revenue": {"$sum": "$total_amount"},
+            "units": {"$sum": {"$sum": "$items.quantity"}},
+        }},
+        {"$group": {
+            "_id": "$_id.day",
+            "orders": {"$sum": {"$cond": [not_cancelled, "$count", 0]}},
+            "revenue": {"$sum": {"$cond": [not_cancelled, "$revenue", 0]}},
+            "units": {"$sum": {"$cond": [not_cancelled, "$units", 0]}},
+            "statuses": {"$push": {"k": "$_id.status", "v": "$count"}},
+        }},
+        {"$addFields": {"statuses": {"$arrayToObject": "$statuses"}}},
+        {"$out": f"{DAILY}_rebuild"},
+    ]
+    product_pipeline = [
+        {"$match": {"status": {"$ne": CANCELLED}}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {"day": _DAY, "product_id": "$items.product_id"},
+            "units": {"$sum": "$items.quantity"},
+            "revenue": {"$sum": "$items.subtotal"},
+            "name": {"$last": "$items.name"},
+        }},
+        {"$project": {"_id": 0, "day": "$_id.day", "product_id": "$_id.product_id",
+                      "units": 1, "revenue": 1, "name": 1}},
+        {"$out": f"{BY_PRODUCT}_rebuild"},
+    ]
+    for name, pipeline in ((DAILY, daily_pipeline), (BY_PRODUCT, product_pipeline)):
+        staging = db[f"{name}_rebuild"]
+        await staging.drop()
+        await db.orders.aggregate(pipeline).to_list(None)
+        if INDEXES.get(name):
+            await staging.create_indexes(INDEXES[name])
+        if await staging.estimated_document_count():
+            await staging.rename(name, dropTarget=True)
+        else:
+            # No orders at all
+            await staging.drop()
+            await db[name].drop()
+        logger.info("Rebuilt %s", name)
+
+
+def _bucket_start(day: datetime, bucket: str) -> datetime:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())  # Monday
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+async def stats(db, start: date, end: date, bucket: str = "day", top: int = 10) -> dict:
+    """Totals, per-bucket figures and top products for orders placed from ``start`` to ``end`` inclusive."""
+    first = datetime(start.year, start.month, start.day)
+    last = datetime(end.year, end.month, end.day)
+
+    def empty():
+        return {"orders": 0, "revenue": 0.0, "units": 0, "statuses": defaultdict(int)}
+
+    totals = empty()
+    buckets: Dict[datetime, dict] = {}
+    async for day in db[DAILY].find({"_id": {"$gte": first, "$lte": last}}).sort("_id", 1):
+        bucket_totals = buckets.setdefault(_bucket_start(day["_id"], bucket), empty())
+        for target in (totals, bucket_totals):
+            for field in ("orders", "revenue", "units"):
+                target[field] += day.get(field, 0)
+            for status, count in (day.get("statuses") or {}).items():
+                target["statuses"][status] += count
+
+    top_products = await db[BY_PRODUCT].aggregate([
+        {"$match": {"day": {"$gte": first, "$lte": last}}},
+        {"$group": {"_id": "$product_id", "name": {"$last": "$name"},
+                    "units": {"$sum": "$units"}, "revenue": {"$sum": "$revenue"}}},
+        {"$match": {"units": {"$gt": 0}}},  # rows left at zero by cancellations
+        {"$sort": {"revenue": -1, "_id": 1}},
+        {"$limit": top},
+        {"$project": {"_id": 0, "product_id": "$_id", "name": 1, "units": 1, "revenue": 1}},
+    ]).to_list(top)
+
+    def summary(figures: dict) -> dict:
+        return {
+            "orders": figures["orders"],
+            "revenue": figures["revenue"],
+            "units": figures["units"],
+            "average_order_value": figures["revenue"] / figures["orders"] if figures["orders"] else 0.0,
+            "statuses": {status: count for status, count in figures["statuses"].items() if count},
+        }
+
+    return {
+        "start": start,
+        "end": end,
+        "bucket": bucket,
+        "totals": summary(totals),
+        "buckets": [{"start": bucket_start.date(), **summary(figures)} for bucket_start, figures in buckets.items()],
+        "top_products": top_products,
+    }
+
+
+def main():
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    cli = typer.Typer(help="Maintain the sales rollups behind /api/admin/stats.")
+
+    def get_db():
+        return AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+
+    @cli.command(name="rebuild")
+    def rebuild_command():
+        """Recompute the rollups from every order."""
+        asyncio.run(rebuild(get_db()))
+        typer.echo("Rollups rebuilt")
+
+    @cli.command(name="show")
+    def show_command(days: int = 30, bucket: str = "day"):
+        """Print the stats for the last DAYS days."""
+        end = datetime.utcnow().date()
+        result = asyncio.run(stats(get_db(), end - timedelta(days=days - 1), end, bucket))
+        for row in result["buckets"]:
+            typer.echo(f"{row['start']}: {row['orders']} orders, {row['revenue']:,.0f} revenue, {row['units']} units")
+        typer.echo(f"Total: {result['totals']['orders']} orders, {result['totals']['revenue']:,.0f} revenue")
+
+    cli()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,220 @@
+"""In-process full-text search over the product catalog.
+
+Products are tokenized into lowercase, diacritic-folded terms so that
+"tram huong" matches "trầm hương", and kept in an inverted index ranked with
+BM25. The index is built once at startup and kept current by the product
+write endpoints, so searches never touch MongoDB until the matching page of
+products is fetched by id. Writes made through other workers reach the index
+through :meth:`SearchIndex.sync`, polled in the background.
+"""
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Weight of each searchable field when counting term frequency; a hit in the
+# product name should outrank the same word buried in the description.
+FIELD_WEIGHTS = {"name": 3.0, "tags": 2.0, "description": 1.0}
+
+# Product fields read to build the index
+PROJECTION = {"_id": 0, "id": 1, "name": 1, "description": 1, "tags": 1, "category": 1, "featured": 1}
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics ("Trầm Hương" -> "tram huong")."""
+    # "đ" is a distinct letter rather than "d" plus a combining mark, so NFD
+    # alone does not decompose it.
+    text = text.lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+class SearchIndex:
+    """Inverted index of product terms with BM25 ranking.
+
+    Besides postings, each document keeps the attributes used as list filters
+    (``category`` and ``featured``) so a filtered search can be resolved
+    without a database round trip.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_expansions: int = 16):
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_len: Dict[str, float] = {}
+        self._doc_attrs: Dict[str, dict] = {}
+        self._total_len = 0.0
+        # Sorted vocabulary, rebuilt lazily, for prefix expansion of the last
+        # query term while the user is still typing.
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self._synced_until: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def clear(self):
+        self.__init__(self.k1, self.b, self.max_expansions)
+
+    def add(self, product: dict):
+        """Index a product document, replacing any previous version."""
+        doc_id = product["id"]
+        if doc_id in self._doc_len:
+            self.remove(doc_id)
+
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = product.get(field) or ""
+            if isinstance(value, list):
+                value = " ".join(value)
+            for token in tokenize(value):
+                terms[token] = terms.get(token, 0.0) + weight
+
+        for token, tf in terms.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                self._vocabulary_dirty = True
+            postings[doc_id] = tf
+
+        length = sum(terms.values())
+        self._doc_terms[doc_id] = terms
+        self._doc_len[doc_id] = length
+        self._doc_attrs[doc_id] = {
+            "category": product.get("category"),
+            "featured": product.get("featured", False),
+        }
+        self._total_len += length
+
+    def add_many(self, products: Iterable[dict]):
+        for product in products:
+            self.add(product)
+
+    def remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            postings = self._postings[token]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary_dirty = True
+        self._total_len -= self._doc_len.pop(doc_id)
+        self._doc_attrs.pop(doc_id, None)
+
+    async def load(self, collection):
+        """Rebuild the index from every product in ``collection``."""
+        started = datetime.utcnow()
+        self.clear()
+        async for product in collection.find({}, PROJECTION):
+            self.add(product)
+        self._synced_until = started
+
+    async def sync(self, collection, overlap: timedelta = timedelta(seconds=10)) -> int:
+        """Apply product writes made since the last load or sync; returns how many.
+
+        Products written by any worker carry a newer ``updated_at``. Deletes
+        leave no trace to poll for, so when the index holds more products
+        than the collection, ids no longer in it are dropped.
+        """
+        started = datetime.utcnow()
+        # Re-read a little before the watermark to allow for clock skew between workers
+        since = self._synced_until - overlap if self._synced_until else datetime.min
+        changed = 0
+        async for product in collection.find({"updated_at": {"$gte": since}}, PROJECTION):
+            self.add(product)
+            changed += 1
+        self._synced_until = started
+        if len(self) > await collection.count_documents({}):
+            current = {product["id"] async for product in collection.find({}, {"_id": 0, "id": 1})}
+            for doc_id in [doc_id for doc_id in self._doc_len if doc_id not in current]:
+                self.remove(doc_id)
+                changed += 1
+        return changed
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\uffff")
+        # Very short prefixes can match much of the vocabulary; the closest
+        # (shortest) completions are the ones worth scoring.
+        return sorted(self._vocabulary[start:end], key=len)[:self.max_expansions]
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        featured: Optional[bool] = None,
+        limit: int = 1000,
+    ) -> List[str]:
+        """Return ids of matching products, best match first.
+
+        Every query term must match (AND semantics, like typing more words
+        narrows the results); the last term also matches as a prefix.
+        """
+        tokens = tokenize(query)
+        if not tokens or not self._doc_len:
+            return []
+
+        # One group of alternative terms per query token; the last token
+        # expands to every indexed term it prefixes.
+        groups = [[token] if token in self._postings else [] for token in tokens[:-1]]
+        groups.append(self._expand_prefix(tokens[-1]))
+        if not all(groups):
+            return []
+        # Rarest group first so later groups only score surviving candidates
+        groups.sort(key=lambda terms: sum(len(self._postings[t]) for t in terms))
+
+        n_docs = len(self._doc_len)
+        avg_len = self._total_len / n_docs
+        scores: Optional[Dict[str, float]] = None
+
+        for terms in groups:
+            group_scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings[term]
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                if scores is None or len(postings) <= len(scores):
+                    hits = postings.items()
+                else:
+                    hits = ((doc_id, postings[doc_id]) for doc_id in scores if doc_id in postings)
+                for doc_id, tf in hits:
+                    if scores is not None and doc_id not in scores:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    score = idf * tf * (self.k1 + 1) / (tf + norm)
+                    # Several prefix expansions can hit one document; keep
+                    # the best rather than summing near-duplicates.
+                    if score > group_scores.get(doc_id, 0.0):
+                        group_scores[doc_id] = score
+
+            if scores is None:
+                scores = group_scores
+            else:
+                scores = {doc_id: scores[doc_id] + s for doc_id, s in group_scores.items()}
+            if not scores:
+                return []
+
+        if category is not None or featured is not None:
+            attrs = self._doc_attrs
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if (category is None or attrs[doc_id]["category"] == category)
+                and (featured is None or attrs[doc_id]["featured"] == featured)
+            }
+
+        return heapq.nlargest(limit, scores, key=scores.__getitem__)
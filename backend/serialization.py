@@ -0,0 +1,69 @@
+"""Fast JSON responses for documents read back from MongoDB.
+
+Read endpoints used to build ``Model(**doc)`` and then let FastAPI validate
+and serialize it a second time through ``response_model``. Everything in
+our collections was written through those same models, so here documents
+are trusted: ``model_construct`` fills defaults and drops unknown keys
+(``_id``, ``hashed_password``) without validating, and orjson serializes
+the result directly. Returning a Response also skips FastAPI's
+response_model pass, which remains only for the OpenAPI schema.
+
+Large lists are streamed instead: documents are pulled from the cursor one
+batch at a time and written out as JSON array chunks, so memory is bounded
+by the batch size rather than the result size.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import AsyncIterator, Iterable, Type, Union
+
+import orjson
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+STREAM_BATCH_SIZE = 200
+
+
+def trusted(model: Type[BaseModel], doc: dict) -> dict:
+    """Field values of ``doc`` as ``model`` would expose them, unvalidated."""
+    return model.model_construct(**doc).__dict__
+
+
+def model_response(model: Type[BaseModel], data: Union[dict, Iterable[dict]],
+                   status_code: int = 200, headers: dict = None) -> ORJSONResponse:
+    """Serialize a Mongo document, or a list of them, as ``model``.
+
+    Sets Last-Modified from the newest ``updated_at`` so HTTP caching
+    layers can still use it.
+    """
+    if isinstance(data, dict):
+        content = trusted(model, data)
+        stamps = [content.get("updated_at")]
+    else:
+        content = [trusted(model, doc) for doc in data]
+        stamps = [item.get("updated_at") for item in content]
+
+    headers = dict(headers or {})
+    stamps = [stamp for stamp in stamps if isinstance(stamp, datetime)]
+    if stamps:
+        headers["Last-Modified"] = format_datetime(max(stamps).replace(tzinfo=timezone.utc), usegmt=True)
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
+
+
+async def _json_array_chunks(cursor, model: Type[BaseModel], batch_size: int) -> AsyncIterator[bytes]:
+    opening = b"["
+    while True:
+        # Motor's to_list resumes the same cursor, fetching one batch per call
+        batch = await cursor.to_list(batch_size)
+        if not batch:
+            break
+        yield opening + b",".join(orjson.dumps(trusted(model, doc)) for doc in batch)
+        opening = b","
+    yield b"[]" if opening == b"[" else b"]"
+
+
+def stream_response(model: Type[BaseModel], cursor, batch_size: int = STREAM_BATCH_SIZE,
+                    headers: dict = None) -> StreamingResponse:
+    """Stream a Motor cursor as a JSON array of ``model`` documents."""
+    cursor = cursor.batch_size(batch_size)
+    return StreamingResponse(_json_array_chunks(cursor, model, batch_size),
+                             media_type="application/json", headers=headers)
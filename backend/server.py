@@ -1,19 +1,47 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Response, status
+from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
+import asyncio
+import hashlib
 import logging
+import secrets
+import time
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
-import uuid
-from datetime import datetime, timedelta
-import hashlib
+from datetime import date, datetime, timedelta
 import jwt
 from enum import Enum
 
+import carts
+import export
+import ids
+import checkout
+import order_tasks
+import reservations
+import rollups
+import stock_shards
+from auth import TokenVerifier
+from bloom import BloomFilter
+from cache import ResponseCache, cached_response
+from idempotency import IdempotencyStore, idempotent
+from indexes import ensure_indexes
+from intake import GroupCommitWriter
+from mailer import Mailer
+from outbox import Outbox
+from passwords import PasswordHasher
+from ratelimit import Limit, MongoBackend, Rate, RateLimiter, RateLimitMiddleware, parse_limits
+from pagination import cursor_keys, cursor_offset, decode_cursor, encode_cursor, keyset_filter, sort_values
+from search import SearchIndex
+from sessions import SessionStore
+from serialization import model_response, stream_response, trusted
+
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -23,6 +51,9 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Time-ordered document ids (uuid7 by default; see ids.py)
+ids.configure(os.environ.get('ID_SCHEME', 'uuid7'))
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -33,7 +64,106 @@ security = HTTPBearer()
 # JWT settings
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', 15))
+
+# Rotating refresh tokens; access tokens name their session in "sid"
+session_store = SessionStore(
+    db.sessions,
+    refresh_ttl=timedelta(days=int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', 30))),
+    access_ttl=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    sync_interval=float(os.environ.get('REVOCATION_SYNC_SECONDS', 5)),
+)
+
+# Verified tokens and current-user documents, cached per worker
+token_verifier = TokenVerifier(
+    SECRET_KEY, ALGORITHM,
+    max_tokens=int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000)),
+    user_ttl=float(os.environ.get('AUTH_USER_CACHE_SECONDS', 30)),
+)
+
+# In-memory product search index, built on startup and kept current by the
+# product write endpoints; other workers' writes arrive every SEARCH_SYNC_SECONDS
+product_search = SearchIndex()
+SEARCH_SYNC_SECONDS = float(os.environ.get('SEARCH_SYNC_SECONDS', 10))
+
+# Catalog response cache, purged by tag from the product write endpoints
+response_cache = ResponseCache(
+    max_bytes=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    default_ttl=float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 60)),
+)
+
+# Order inserts are group-committed in batches unless ORDER_GROUP_COMMIT=0
+order_writer = GroupCommitWriter(
+    db.orders,
+    max_batch=int(os.environ.get('ORDER_BATCH_SIZE', 100)),
+    max_delay=float(os.environ.get('ORDER_BATCH_DELAY_MS', 5)) / 1000,
+)
+
+# Post-order side effects, run by background workers from the durable outbox
+outbox = Outbox(
+    db.outbox,
+    order_tasks.build_handlers(db, Mailer.from_env()),
+    workers=int(os.environ.get('OUTBOX_WORKERS', 4)),
+    max_attempts=int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5)),
+)
+
+# Responses replayed for a repeated Idempotency-Key on orders and cart mutations
+idempotency_store = IdempotencyStore(
+    db.idempotency_keys,
+    ttl=int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600)),
+)
+
+# Password hashing runs in its own small thread pool; see passwords.py
+password_hasher = PasswordHasher(
+    scheme=os.environ.get('PASSWORD_SCHEME', 'argon2'),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2))),
+    max_waiting=int(os.environ.get('PASSWORD_HASH_MAX_WAITING', 256)),
+    argon2_time_cost=int(os.environ.get('ARGON2_TIME_COST', 3)),
+    argon2_memory_cost=int(os.environ.get('ARGON2_MEMORY_COST_KIB', 64 * 1024)),
+    bcrypt_rounds=int(os.environ.get('BCRYPT_ROUNDS', 12)),
+)
+
+# Optional Bloom filter of registered emails: /auth/email-available answers
+# "not registered" without a query when the filter has never seen the email.
+# Each worker has its own filter and adds emails registered through the
+# others every EMAIL_FILTER_SYNC_SECONDS, so a new signup can read as
+# available on another worker for up to that long
+email_filter = (
+    BloomFilter(capacity=int(os.environ.get('EMAIL_FILTER_CAPACITY', 1000000)))
+    if os.environ.get('EMAIL_BLOOM_FILTER', '0') == '1' else None
+)
+EMAIL_FILTER_SYNC_SECONDS = float(os.environ.get('EMAIL_FILTER_SYNC_SECONDS', 2))
+
+# How long a checkout hold lasts before it must be extended
+RESERVATION_TTL = timedelta(seconds=int(os.environ.get('RESERVATION_TTL_SECONDS', 900)))
+
+# How often sharded stock counters are folded back into product documents
+STOCK_SYNC_SECONDS = float(os.environ.get('STOCK_SYNC_SECONDS', 5))
+
+# Stock taken by a checkout that has not stored its order after this long
+# belongs to a dead process and is given back
+CHECKOUT_ABANDONED_AFTER = timedelta(seconds=int(os.environ.get('CHECKOUT_ABANDONED_SECONDS', 300)))
+
+# Order history: newest first, served by the user_id_created_at_id index
+ORDER_SORT = (("created_at", -1), ("id", -1))
+ORDER_SUMMARY_PROJECTION = {
+    "_id": 0, "id": 1, "order_number": 1, "status": 1, "total_amount": 1, "created_at": 1,
+    "item_count": {"$sum": "$items.quantity"},
+}
+ORDER_PAGE_MAX = 100
+
+# Product list orderings; each ends with the unique id so keyset cursors are stable
+PRODUCT_SORTS = {
+    "newest": (("created_at", -1), ("id", -1)),
+    "price_asc": (("price", 1), ("id", 1)),
+    "price_desc": (("price", -1), ("id", -1)),
+}
+
+# Types a cursor's sort key may have, per sort field
+SORT_KEY_TYPES = {"created_at": datetime, "price": (int, float), "id": str}
+
+# Product pages larger than this are streamed rather than buffered and cached
+PRODUCT_STREAM_THRESHOLD = 100
 
 # Helper functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -46,40 +176,52 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user_id
-    except jwt.PyJWTError:
+def token_user_id(token: str) -> Optional[str]:
+    """User id of a valid access token whose session has not been logged out"""
+    claims = token_verifier.claims(token)
+    if claims is None or session_store.is_revoked(claims.get("sid")):
+        return None
+    return claims.get("sub")
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    user_id = token_user_id(credentials.credentials)
+    if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return user_id
 
-def verify_token_optional(credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False))):
+async def verify_token_optional(credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False))):
     """Optional authentication - returns user_id if authenticated, None if not"""
     if credentials is None:
         return None
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        return user_id
-    except jwt.PyJWTError:
-        return None
+    return token_user_id(credentials.credentials)
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+# Admin endpoints take the shared ADMIN_TOKEN in X-Admin-Token; they are
+# closed to everyone while no token is configured
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return hash_password(plain_password) == hashed_password
+async def verify_admin(token: Optional[str] = Depends(APIKeyHeader(name="X-Admin-Token", auto_error=False))):
+    if not ADMIN_TOKEN or token is None or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+async def issue_tokens(user_id: str) -> dict:
+    """Access and refresh token for a new session of ``user_id``"""
+    session_id, refresh_token = await session_store.create(user_id)
+    return token_response(user_id, session_id, refresh_token)
+
+def token_response(user_id: str, session_id: str, refresh_token: str) -> dict:
+    access_token = create_access_token(
+        data={"sub": user_id, "sid": session_id}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
 
 
 # Define Enums
@@ -97,7 +239,7 @@ class OrderStatus(str, Enum):
 
 # Define Models
 class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=ids.new_id)
     client_name: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
@@ -106,7 +248,7 @@ class StatusCheckCreate(BaseModel):
 
 # Contact Models
 class ContactForm(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=ids.new_id)
     full_name: str
     email: EmailStr
     phone: str
@@ -123,7 +265,7 @@ class ContactFormCreate(BaseModel):
 
 # User Models
 class User(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=ids.new_id)
     email: EmailStr
     full_name: str
     phone: str = ""
@@ -160,6 +302,11 @@ class UserInDB(User):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     user_id: str = None
@@ -173,7 +320,7 @@ class CartItem(BaseModel):
     image_url: str
 
 class Cart(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=ids.new_id)
     user_id: str = None
     items: List[CartItem] = []
     total_amount: float = 0.0
@@ -187,9 +334,23 @@ class CartItemAdd(BaseModel):
 class CartItemUpdate(BaseModel):
     quantity: int
 
+class CartOperationType(str, Enum):
+    ADD = "add"
+    UPDATE = "update"
+    REMOVE = "remove"
+
+class CartOperation(BaseModel):
+    op: CartOperationType
+    product_id: str
+    quantity: int = 1
+
+class CartBatchUpdate(BaseModel):
+    operations: List[CartOperation] = Field(..., min_length=1, max_length=100)
+
 # Order Models
 class OrderItem(BaseModel):
     product_id: str
+    size: Optional[str] = None
     quantity: int
     price: float
     name: str
@@ -197,7 +358,7 @@ class OrderItem(BaseModel):
     subtotal: float
 
 class Order(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=ids.new_id)
     user_id: Optional[str] = None
     order_number: str
     items: List[OrderItem]
@@ -212,12 +373,45 @@ class Order(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class OrderSummary(BaseModel):
+    id: str
+    order_number: str
+    status: OrderStatus
+    total_amount: float
+    item_count: int
+    created_at: datetime
+
+class OrderStatusUpdate(BaseModel):
+    status: OrderStatus
+
+class OrderItemCreate(BaseModel):
+    # Price, name and image are looked up server-side; clients may still send them
+    product_id: str
+    size: Optional[str] = None
+    quantity: int = Field(..., gt=0)
+
 class OrderCreate(BaseModel):
-    items: List[CartItem]
+    items: List[OrderItemCreate] = Field(..., min_length=1, max_length=100)
     payment_method: PaymentMethod
     customer_info: Dict[str, str]
     shipping_address: Dict[str, str]
     notes: str = ""
+    reservation_id: Optional[str] = None  # Hold placed when checkout started; guests add X-Reservation-Token
+
+# Reservation Models
+class ReservationCreate(BaseModel):
+    items: List[OrderItemCreate] = Field(..., min_length=1, max_length=100)
+
+class Reservation(BaseModel):
+    id: str = Field(default_factory=ids.new_id)
+    user_id: Optional[str] = None
+    items: List[OrderItemCreate]
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime
+
+class PlacedReservation(Reservation):
+    # Guest holds only: the secret to send as X-Reservation-Token; only its hash is stored
+    owner_token: Optional[str] = None
 
 class ProductVariation(BaseModel):
     size: str  # e.g., "S", "M", "L", "XL", "6mm", "8mm", "10mm"
@@ -226,7 +420,7 @@ class ProductVariation(BaseModel):
     stock_quantity: int = 0
 
 class Product(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=ids.new_id)
     name: str
     description: str
     price: float  # Base price (lowest price among variations)
@@ -236,7 +430,7 @@ class Product(BaseModel):
     images: List[str] = []
     variations: List[ProductVariation] = []  # Size variations with different prices
     in_stock: bool = True
-    stock_quantity: int = 0
+    stock_quantity: Optional[int] = None  # None: stock not tracked, always orderable
     featured: bool = False
     rating: float = 5.0
     reviews_count: int = 0
@@ -254,12 +448,27 @@ class ProductCreate(BaseModel):
     images: List[str] = []
     variations: List[ProductVariation] = []
     in_stock: bool = True
-    stock_quantity: int = 0
+    stock_quantity: Optional[int] = None  # None: stock not tracked, always orderable
     featured: bool = False
     rating: float = 5.0
     reviews_count: int = 0
     tags: List[str] = []
 
+class ProductCard(BaseModel):
+    """The subset of Product rendered by product cards on listing pages"""
+    id: str
+    name: str
+    description: str = ""
+    price: float
+    original_price: float = None
+    category: str = ""
+    image_url: str = ""
+    in_stock: bool = True
+    stock_quantity: Optional[int] = None  # None: stock not tracked, always orderable
+    featured: bool = False
+    rating: float = 5.0
+    reviews_count: int = 0
+
 class ProductUpdate(BaseModel):
     name: str = None
     description: str = None
@@ -283,11 +492,62 @@ class ProductUpdate(BaseModel):
     reviews_count: int = None
     tags: List[str] = None
 
+class StockShardsUpdate(BaseModel):
+    shards: int = Field(..., ge=1, le=stock_shards.MAX_SHARDS)
+
+# Named profiles accepted by ?fields= on product lists
+PRODUCT_FIELD_PROFILES = {
+    "card": list(ProductCard.__fields__),
+}
+
+def parse_product_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Resolve ?fields= (a profile name or comma-separated field names)"""
+    if not fields:
+        return None
+    if fields in PRODUCT_FIELD_PROFILES:
+        return PRODUCT_FIELD_PROFILES[fields]
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in Product.__fields__]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in requested if f != "id"]
+
+def product_projection(fields: Optional[List[str]], extra: List[str] = ()) -> Optional[dict]:
+    if fields is None:
+        return None
+    return {"_id": 0, **{f: 1 for f in fields}, **{f: 1 for f in extra}}
+
+def product_list_response(products: List[dict], fields: Optional[List[str]], response: Response):
+    """Build a product list, trimmed to ``fields`` when a sparse fieldset was requested"""
+    # Returned directly, so headers set on the injected response are copied over
+    headers = {"X-Next-Cursor": response.headers["X-Next-Cursor"]} if "X-Next-Cursor" in response.headers else None
+    if fields is None:
+        return model_response(Product, products, headers=headers)
+    if fields == PRODUCT_FIELD_PROFILES["card"]:
+        return model_response(ProductCard, products, headers=headers)
+    items = [{f: product[f] for f in fields if f in product} for product in products]
+    return ORJSONResponse(items, headers=headers)
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
     return {"message": "Hello World"}
 
+@api_router.get("/metrics", dependencies=[Depends(verify_admin)])
+async def get_metrics():
+    """In-process counters for the server's caches and background machinery"""
+    return {
+        "response_cache": response_cache.stats(),
+        "order_intake": order_writer.stats(),
+        "outbox": await outbox.stats(),
+        "idempotency": idempotency_store.stats(),
+        "password_hashing": password_hasher.stats(),
+        "auth": token_verifier.stats(),
+        "sessions": session_store.stats(),
+        "email_filter": email_filter.stats() if email_filter is not None else None,
+        "rate_limits": rate_limiter.stats(),
+    }
+
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
@@ -297,42 +557,103 @@ async def create_status_check(input: StatusCheckCreate):
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    return stream_response(StatusCheck, db.status_checks.find({}, {"_id": 0}).limit(1000))
 
 # Product endpoints
 @api_router.get("/products", response_model=List[Product])
+@cached_response(response_cache, tags=["catalog"],
+                 item_tags=lambda products: [f"product:{product['id']}" for product in products])
 async def get_products(
+    response: Response,
     category: str = None,
     featured: bool = None,
     search: str = None,
+    sort: str = "newest",
+    cursor: str = None,
+    fields: str = None,
     skip: int = 0,
     limit: int = 20
 ):
-    """Get products with optional filtering and pagination"""
+    """Get products with optional filtering and pagination.
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` to fetch the
+    next page; ``skip`` is still honoured when no cursor is given. ``fields``
+    takes a profile name (``card``) or comma-separated field names and returns
+    only those fields. Full pages above ``PRODUCT_STREAM_THRESHOLD`` items are
+    streamed and carry no cursor.
+    """
+    if sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort, expected one of {list(PRODUCT_SORTS)}")
+    position = decode_cursor(cursor) if cursor else None
+    field_list = parse_product_fields(fields)
+
+    if search:
+        # Rank in memory, then fetch only the requested page by id
+        offset = cursor_offset(position) if position else skip
+        # One extra hit tells whether there is a next page
+        ranked_ids = product_search.search(search, category=category or None, featured=featured,
+                                           limit=offset + limit + 1)
+        page_ids = ranked_ids[offset:offset + limit]
+        if offset + limit < len(ranked_ids):
+            response.headers["X-Next-Cursor"] = encode_cursor({"o": offset + limit})
+        if not page_ids:
+            return product_list_response([], field_list, response)
+        products = await db.products.find(
+            {"id": {"$in": page_ids}}, product_projection(field_list)
+        ).to_list(len(page_ids))
+        rank = {product_id: i for i, product_id in enumerate(page_ids)}
+        products.sort(key=lambda product: rank[product["id"]])
+        return product_list_response(products, field_list, response)
+
     query = {}
     
     if category:
         query["category"] = category
     if featured is not None:
         query["featured"] = featured
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-            {"tags": {"$regex": search, "$options": "i"}}
-        ]
+
+    sort_spec = PRODUCT_SORTS[sort]
+    if position:
+        if position.get("s") != sort:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query.update(keyset_filter(sort_spec, cursor_keys(position, sort_spec, SORT_KEY_TYPES)))
+        skip = 0
     
-    products = await db.products.find(query).skip(skip).limit(limit).to_list(limit)
-    return [Product(**product) for product in products]
+    if limit > PRODUCT_STREAM_THRESHOLD and field_list is None:
+        # Bulk pulls: stream in batches; no next cursor since the last
+        # document is only known once the body has been sent
+        cursor = db.products.find(query, {"_id": 0}).sort(list(sort_spec)).skip(skip).limit(limit)
+        return stream_response(Product, cursor)
+
+    # Sort keys are always projected so the next cursor can be built
+    projection = product_projection(field_list, extra=[field for field, _ in sort_spec])
+    products = await db.products.find(query, projection).sort(list(sort_spec)).skip(skip).limit(limit).to_list(limit)
+    if len(products) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor({"s": sort, "k": sort_values(products[-1], sort_spec)})
+    return product_list_response(products, field_list, response)
 
 @api_router.get("/products/{product_id}", response_model=Product)
+@cached_response(response_cache, tags=lambda params: [f"product:{params['product_id']}"], ttl=300,
+                 max_age=60, stale_while_revalidate=600)
 async def get_product(product_id: str):
     """Get a specific product by ID"""
     product = await db.products.find_one({"id": product_id})
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+    return model_response(Product, product)
+
+@api_router.get("/products/{product_id}/availability")
+@cached_response(response_cache, tags=lambda params: [f"product:{params['product_id']}",
+                                                      f"availability:{params['product_id']}"],
+                 ttl=5, max_age=0, stale_while_revalidate=0)
+async def get_product_availability(product_id: str):
+    """Live stock for a product and its variations, net of active checkout holds"""
+    products = await reservations.load_stock(db, [product_id])
+    if not products:
+        raise HTTPException(status_code=404, detail="Product not found")
+    product = products[0]
+    reserved = await reservations.reserved_quantities(db.reservations, [product_id])
+    return reservations.availability(product, reserved)
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product_data: ProductCreate):
@@ -340,6 +661,8 @@ async def create_product(product_data: ProductCreate):
     product_dict = product_data.dict()
     product_obj = Product(**product_dict)
     await db.products.insert_one(product_obj.dict())
+    product_search.add(product_obj.dict())
+    response_cache.invalidate("catalog")
     return product_obj
 
 @api_router.put("/products/{product_id}", response_model=Product)
@@ -350,16 +673,25 @@ async def update_product(product_id: str, product_data: ProductUpdate):
         raise HTTPException(status_code=400, detail="No fields to update")
     
     update_dict["updated_at"] = datetime.utcnow()
+    query = {"id": product_id}
+    if "stock_quantity" in update_dict or "variations" in update_dict:
+        # Sharded stock lives in the counters, which would overwrite these fields
+        query["stock_shards"] = None
     result = await db.products.update_one(
-        {"id": product_id}, 
+        query, 
         {"$set": update_dict}
     )
     
     if result.matched_count == 0:
+        if "stock_shards" in query and await db.products.find_one({"id": product_id}, {"_id": 1}):
+            raise HTTPException(status_code=409,
+                                detail="Stock is sharded; remove the stock shards before changing stock or variations")
         raise HTTPException(status_code=404, detail="Product not found")
     
     product = await db.products.find_one({"id": product_id})
-    return Product(**product)
+    product_search.add(product)
+    response_cache.invalidate("catalog", f"product:{product_id}")
+    return model_response(Product, product)
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str):
@@ -367,15 +699,38 @@ async def delete_product(product_id: str):
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await db.stock_counters.delete_many({"product_id": product_id})
+    product_search.remove(product_id)
+    response_cache.invalidate("catalog", f"product:{product_id}")
     return {"message": "Product deleted successfully"}
 
+@api_router.put("/products/{product_id}/stock-shards")
+async def enable_stock_shards(product_id: str, settings: StockShardsUpdate):
+    """Split a product's current stock over sharded counters for high write rates.
+
+    To restock a sharded product, remove its shards, update its stock, then shard it again.
+    """
+    await stock_shards.enable(db, product_id, settings.shards)
+    response_cache.invalidate(f"product:{product_id}")
+    return {"message": f"Stock split over {settings.shards} shards"}
+
+@api_router.delete("/products/{product_id}/stock-shards")
+async def disable_stock_shards(product_id: str):
+    """Fold sharded counters back into the product document"""
+    if not await stock_shards.disable(db, product_id):
+        return {"message": "Stock is not sharded"}
+    response_cache.invalidate(f"product:{product_id}")
+    return {"message": "Stock shards removed"}
+
 @api_router.get("/categories", response_model=dict)
+@cached_response(response_cache, tags=["catalog"], ttl=600, max_age=300, stale_while_revalidate=3600)
 async def get_all_categories():
     """Get all product categories (alternative endpoint)"""
     categories = await db.products.distinct("category")
     return {"categories": categories}
 
 @api_router.get("/products/categories")
+@cached_response(response_cache, tags=["catalog"], ttl=600, max_age=300, stale_while_revalidate=3600)
 async def get_categories():
     """Get all product categories"""
     categories = await db.products.distinct("category")
@@ -644,6 +999,8 @@ async def seed_products():
         products_to_insert.append(product_obj.dict())
     
     await db.products.insert_many(products_to_insert)
+    product_search.add_many(products_to_insert)
+    response_cache.invalidate("catalog")
     return {"message": f"Successfully seeded {len(products_to_insert)} products"}
 
 # Contact Form endpoints
@@ -658,43 +1015,56 @@ async def submit_contact_form(form_data: ContactFormCreate):
 @api_router.get("/contact", response_model=List[ContactForm])
 async def get_contact_forms():
     """Get all contact form submissions (admin only)"""
-    contacts = await db.contacts.find().sort("created_at", -1).to_list(100)
-    return [ContactForm(**contact) for contact in contacts]
+    return stream_response(ContactForm, db.contacts.find({}, {"_id": 0}).sort("created_at", -1).limit(100))
 
 # User Authentication endpoints
 @api_router.post("/auth/register", response_model=Token)
 async def register_user(user_data: UserCreate):
     """Register a new user"""
-    # Check if user already exists
-    existing_user = await db.users.find_one({"email": user_data.email})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Create user
     user_dict = user_data.dict()
-    hashed_password = hash_password(user_dict.pop("password"))
+    hashed_password = await password_hasher.hash(user_dict.pop("password"))
     user_obj = User(**user_dict)
     user_in_db = UserInDB(**user_obj.dict(), hashed_password=hashed_password)
     
-    await db.users.insert_one(user_in_db.dict())
-    
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user_obj.id}, expires_delta=access_token_expires
-    )
+    # The unique email index decides, so concurrent signups cannot both succeed
+    try:
+        await db.users.insert_one(user_in_db.dict())
+    except DuplicateKeyError:
+        if email_filter is not None:
+            email_filter.add(user_obj.email)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    if email_filter is not None:
+        email_filter.add(user_obj.email)
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    # Create access and refresh tokens
+    return await issue_tokens(user_obj.id)
+
+@api_router.get("/auth/email-available")
+async def check_email_available(email: EmailStr):
+    """Whether an email can still be registered; a hint, registration itself decides
+
+    With the email filter on, an email registered through another worker in
+    the last EMAIL_FILTER_SYNC_SECONDS may still read as available.
+    """
+    if email_filter is not None and not email_filter.might_contain(email):
+        return {"email": email, "available": True}
+    registered = await db.users.find_one({"email": email}, {"_id": 1})
+    return {"email": email, "available": registered is None}
 
 @api_router.post("/auth/login", response_model=Token)
 async def login_user(user_credentials: UserLogin):
     """Login user"""
     # Find user
     user = await db.users.find_one({"email": user_credentials.email})
-    if not user:
+    
+    # Verify password; unknown emails take as long as wrong passwords
+    matches, new_hash = await password_hasher.verify(
+        user_credentials.password, user["hashed_password"] if user else None
+    )
+    if not matches:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -702,25 +1072,39 @@ async def login_user(user_credentials: UserLogin):
     
     user_in_db = UserInDB(**user)
     
-    # Verify password
-    if not verify_password(user_credentials.password, user_in_db.hashed_password):
+    # Legacy or outdated hash: store one made with the current settings,
+    # unless the password was changed meanwhile
+    if new_hash:
+        await db.users.update_one(
+            {"id": user_in_db.id, "hashed_password": user_in_db.hashed_password},
+            {"$set": {"hashed_password": new_hash, "updated_at": datetime.utcnow()}}
+        )
+        token_verifier.forget_user(user_in_db.id)
+    
+    # Create access and refresh tokens
+    return await issue_tokens(user_in_db.id)
+
+@api_router.post("/auth/refresh", response_model=Token)
+async def refresh_tokens(request: RefreshRequest):
+    """Exchange a refresh token for a new access token and refresh token"""
+    rotated = await session_store.rotate(request.refresh_token)
+    if rotated is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password"
+            detail="Invalid or expired refresh token"
         )
-    
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user_in_db.id}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return token_response(*rotated)
+
+@api_router.post("/auth/logout")
+async def logout_user(request: RefreshRequest):
+    """End the session of a refresh token; its access tokens stop working too"""
+    await session_store.end(request.refresh_token)
+    return {"message": "Logged out"}
 
 @api_router.get("/auth/me", response_model=User)
 async def get_current_user(current_user_id: str = Depends(verify_token)):
     """Get current user info"""
-    user = await db.users.find_one({"id": current_user_id})
+    user = await token_verifier.user(db.users, current_user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -741,63 +1125,60 @@ async def update_current_user(user_update: UserUpdate, current_user_id: str = De
         {"$set": update_dict}
     )
     
+    token_verifier.forget_user(current_user_id)
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user = await db.users.find_one({"id": current_user_id})
+    user = await token_verifier.user(db.users, current_user_id)
     return User(**user)
 
 # Cart endpoints
+async def update_cart(user_id: str, steps: List[dict], item_id: str = None, upsert: bool = False):
+    """Apply cart pipeline steps atomically and return the updated cart.
+
+    With ``item_id`` the update only matches if that product is in the cart;
+    ``None`` is returned when nothing matched.
+    """
+    query = {"user_id": user_id}
+    if item_id is not None:
+        query["items.product_id"] = item_id
+    pipeline = carts.cart_pipeline(user_id, steps, new_cart_id=ids.new_id())
+    update = dict(projection={"_id": 0}, return_document=ReturnDocument.AFTER)
+    try:
+        return await db.carts.find_one_and_update(query, pipeline, upsert=upsert, **update)
+    except DuplicateKeyError:
+        # A concurrent request created this user's cart first; apply to it.
+        # Still upserting, in case the cart was cleared again in between.
+        return await db.carts.find_one_and_update(query, pipeline, upsert=upsert, **update)
+
+async def raise_cart_miss(user_id: str):
+    """Report why an item-level cart update matched nothing"""
+    if not await db.carts.find_one({"user_id": user_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Cart not found")
+    raise HTTPException(status_code=404, detail="Item not found in cart")
+
 @api_router.post("/cart/add")
+@idempotent(idempotency_store)
 async def add_to_cart(cart_item: CartItemAdd, current_user_id: str = Depends(verify_token)):
     """Add item to cart"""
     # Get product details
-    product = await db.products.find_one({"id": cart_item.product_id})
+    product = await db.products.find_one(
+        {"id": cart_item.product_id}, {"_id": 0, "price": 1, "name": 1, "image_url": 1}
+    )
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Check if cart exists for user
-    cart = await db.carts.find_one({"user_id": current_user_id})
-    
-    if not cart:
-        # Create new cart
-        cart_obj = Cart(user_id=current_user_id)
-        cart = cart_obj.dict()
-    
-    # Check if item already exists in cart
-    existing_item = None
-    for i, item in enumerate(cart["items"]):
-        if item["product_id"] == cart_item.product_id:
-            existing_item = i
-            break
-    
-    if existing_item is not None:
-        # Update quantity
-        cart["items"][existing_item]["quantity"] += cart_item.quantity
-    else:
-        # Add new item
-        new_item = CartItem(
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            price=product["price"],
-            name=product["name"],
-            image_url=product["image_url"]
-        )
-        cart["items"].append(new_item.dict())
-    
-    # Calculate total
-    total = sum(item["price"] * item["quantity"] for item in cart["items"])
-    cart["total_amount"] = total
-    cart["updated_at"] = datetime.utcnow()
-    
-    # Save cart
-    await db.carts.update_one(
-        {"user_id": current_user_id},
-        {"$set": cart},
-        upsert=True
+    new_item = CartItem(
+        product_id=cart_item.product_id,
+        quantity=cart_item.quantity,
+        price=product["price"],
+        name=product["name"],
+        image_url=product["image_url"]
     )
+    # Increments the quantity if the product is already in the cart
+    cart = await update_cart(current_user_id, [carts.add_item(new_item.dict())], upsert=True)
     
-    return {"message": "Item added to cart", "cart": cart}
+    return ORJSONResponse({"message": "Item added to cart", "cart": trusted(Cart, cart)})
 
 @api_router.get("/cart", response_model=Cart)
 async def get_cart(current_user_id: str = Depends(verify_token)):
@@ -808,113 +1189,189 @@ async def get_cart(current_user_id: str = Depends(verify_token)):
         cart_obj = Cart(user_id=current_user_id)
         return cart_obj
     
-    return Cart(**cart)
+    return model_response(Cart, cart)
 
 @api_router.put("/cart/item/{product_id}")
+@idempotent(idempotency_store)
 async def update_cart_item(product_id: str, cart_update: CartItemUpdate, current_user_id: str = Depends(verify_token)):
     """Update cart item quantity"""
-    cart = await db.carts.find_one({"user_id": current_user_id})
-    if not cart:
-        raise HTTPException(status_code=404, detail="Cart not found")
-    
-    # Find and update item
-    item_found = False
-    for item in cart["items"]:
-        if item["product_id"] == product_id:
-            if cart_update.quantity <= 0:
-                cart["items"].remove(item)
-            else:
-                item["quantity"] = cart_update.quantity
-            item_found = True
-            break
-    
-    if not item_found:
-        raise HTTPException(status_code=404, detail="Item not found in cart")
-    
-    # Calculate total
-    total = sum(item["price"] * item["quantity"] for item in cart["items"])
-    cart["total_amount"] = total
-    cart["updated_at"] = datetime.utcnow()
-    
-    # Save cart
-    await db.carts.update_one(
-        {"user_id": current_user_id},
-        {"$set": cart}
+    cart = await update_cart(
+        current_user_id, [carts.set_quantity(product_id, cart_update.quantity)], item_id=product_id
     )
+    if cart is None:
+        await raise_cart_miss(current_user_id)
     
-    # Get the updated cart to return as a proper model
-    updated_cart = await db.carts.find_one({"user_id": current_user_id})
-    cart_model = Cart(**updated_cart)
-    
-    return {"message": "Cart updated", "cart": cart_model.dict()}
+    return ORJSONResponse({"message": "Cart updated", "cart": trusted(Cart, cart)})
 
 @api_router.delete("/cart/item/{product_id}")
+@idempotent(idempotency_store)
 async def remove_from_cart(product_id: str, current_user_id: str = Depends(verify_token)):
     """Remove item from cart"""
-    cart = await db.carts.find_one({"user_id": current_user_id})
-    if not cart:
-        raise HTTPException(status_code=404, detail="Cart not found")
+    cart = await update_cart(current_user_id, [carts.remove_item(product_id)], item_id=product_id)
+    if cart is None:
+        await raise_cart_miss(current_user_id)
     
-    # Find and remove item
-    item_found = False
-    for item in cart["items"]:
-        if item["product_id"] == product_id:
-            cart["items"].remove(item)
-            item_found = True
-            break
-    
-    if not item_found:
-        raise HTTPException(status_code=404, detail="Item not found in cart")
-    
-    # Calculate total
-    total = sum(item["price"] * item["quantity"] for item in cart["items"])
-    cart["total_amount"] = total
-    cart["updated_at"] = datetime.utcnow()
-    
-    # Save cart
-    await db.carts.update_one(
-        {"user_id": current_user_id},
-        {"$set": cart}
-    )
+    return ORJSONResponse({"message": "Item removed from cart", "cart": trusted(Cart, cart)})
+
+@api_router.patch("/cart")
+@idempotent(idempotency_store)
+async def batch_update_cart(batch: CartBatchUpdate, current_user_id: str = Depends(verify_token)):
+    """Apply an ordered list of add/update/remove operations in one atomic update.
+
+    Updates and removals of products that are not in the cart are no-ops, so a
+    batch may update an item added earlier in the same batch.
+    """
+    add_ids = {op.product_id for op in batch.operations if op.op == CartOperationType.ADD}
+    products = {}
+    if add_ids:
+        found = await db.products.find(
+            {"id": {"$in": list(add_ids)}}, {"_id": 0, "id": 1, "price": 1, "name": 1, "image_url": 1}
+        ).to_list(len(add_ids))
+        products = {product["id"]: product for product in found}
+        missing = add_ids - products.keys()
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Product not found: {', '.join(sorted(missing))}")
     
-    # Get the updated cart to return as a proper model
-    updated_cart = await db.carts.find_one({"user_id": current_user_id})
-    cart_model = Cart(**updated_cart)
+    steps = []
+    for op in batch.operations:
+        if op.op == CartOperationType.ADD:
+            product = products[op.product_id]
+            item = CartItem(
+                product_id=op.product_id,
+                quantity=op.quantity,
+                price=product["price"],
+                name=product["name"],
+                image_url=product["image_url"]
+            )
+            steps.append(carts.add_item(item.dict()))
+        elif op.op == CartOperationType.UPDATE:
+            steps.append(carts.set_quantity(op.product_id, op.quantity))
+        else:
+            steps.append(carts.remove_item(op.product_id))
     
-    return {"message": "Item removed from cart", "cart": cart_model.dict()}
+    # Only an add creates a cart; updates and removals alone leave a missing cart missing
+    cart = await update_cart(current_user_id, steps, upsert=bool(add_ids))
+    if cart is None:
+        return ORJSONResponse({"message": "Cart updated", "cart": Cart(user_id=current_user_id).dict()})
+    return ORJSONResponse({"message": "Cart updated", "cart": trusted(Cart, cart)})
 
 @api_router.delete("/cart")
+@idempotent(idempotency_store)
 async def clear_cart(current_user_id: str = Depends(verify_token)):
     """Clear user's cart"""
     await db.carts.delete_one({"user_id": current_user_id})
     return {"message": "Cart cleared"}
 
+# Reservation endpoints
+def invalidate_availability(items):
+    response_cache.invalidate(*{f"availability:{item['product_id']}" for item in items})
+
+def reservation_owner(user_id: Optional[str], owner_token: Optional[str]) -> dict:
+    """Filter for the caller's own holds: by user id when signed in, by the hold's owner token for guests"""
+    if user_id is not None:
+        return {"user_id": user_id}
+    # A guest without a token matches no hold, since every stored hash is of a non-empty token
+    return {"user_id": None, "owner_token_hash": hashlib.sha256((owner_token or "").encode()).hexdigest()}
+
+@api_router.post("/reservations", response_model=PlacedReservation)
+async def place_reservation(reservation_data: ReservationCreate, current_user_id: str = Depends(verify_token_optional)):
+    """Hold stock for the items being checked out until the hold expires"""
+    items = [item.dict() for item in reservation_data.items]
+    product_ids = {item["product_id"] for item in items}
+    found = await db.products.find(
+        {"id": {"$in": list(product_ids)}}, checkout.PRICING_PROJECTION
+    ).to_list(len(product_ids))
+    checkout.price_items({p["id"]: p for p in found}, items)  # 404/400 for unknown products or sizes
+    
+    now = datetime.utcnow()
+    reservation = PlacedReservation(user_id=current_user_id, items=items, created_at=now,
+                                    expires_at=now + RESERVATION_TTL)
+    document = reservation.dict(exclude={"owner_token"})
+    if current_user_id is None:
+        # Guests prove ownership with a secret, since anyone may learn the hold id
+        reservation.owner_token = secrets.token_urlsafe(32)
+        document["owner_token_hash"] = hashlib.sha256(reservation.owner_token.encode()).hexdigest()
+    await db.reservations.insert_one(document)
+    short = await reservations.check_holds(db, product_ids, placed_until=reservation.created_at)
+    if short:
+        await db.reservations.delete_one({"id": reservation.id})
+        raise HTTPException(status_code=409, detail=f"Not enough stock available for: {', '.join(short)}")
+    
+    invalidate_availability(items)
+    return reservation
+
+@api_router.post("/reservations/{reservation_id}/extend", response_model=Reservation)
+async def extend_reservation(reservation_id: str, current_user_id: str = Depends(verify_token_optional),
+                             reservation_token: Optional[str] = Header(None, alias="X-Reservation-Token")):
+    """Push an active hold's expiry out by another hold period"""
+    now = datetime.utcnow()
+    reservation = await db.reservations.find_one_and_update(
+        {"id": reservation_id, **reservation_owner(current_user_id, reservation_token), "expires_at": {"$gt": now}},
+        {"$set": {"expires_at": now + RESERVATION_TTL}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found or expired")
+    return model_response(Reservation, reservation)
+
+@api_router.delete("/reservations/{reservation_id}")
+async def release_reservation(reservation_id: str, current_user_id: str = Depends(verify_token_optional),
+                              reservation_token: Optional[str] = Header(None, alias="X-Reservation-Token")):
+    """Release a hold before it expires"""
+    reservation = await db.reservations.find_one_and_delete(
+        {"id": reservation_id, **reservation_owner(current_user_id, reservation_token)},
+        projection={"_id": 0, "items": 1},
+    )
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found or expired")
+    invalidate_availability(reservation["items"])
+    return {"message": "Reservation released"}
+
 # Order endpoints
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_data: OrderCreate, current_user_id: str = Depends(verify_token_optional)):
+@idempotent(idempotency_store)
+async def create_order(order_data: OrderCreate, current_user_id: str = Depends(verify_token_optional),
+                       reservation_token: Optional[str] = Header(None, alias="X-Reservation-Token")):
     """Create a new order - supports both authenticated and guest checkout"""
+    items = [item.dict() for item in order_data.items]
+    product_ids = {item["product_id"] for item in items}
+    found = await db.products.find(
+        {"id": {"$in": list(product_ids)}}, checkout.PRICING_PROJECTION
+    ).to_list(len(product_ids))
+    order_items = [OrderItem(**item) for item in checkout.price_items({p["id"]: p for p in found}, items)]
+    
     # Calculate totals
-    subtotal = sum(item.price * item.quantity for item in order_data.items)
+    subtotal = sum(item.subtotal for item in order_items)
     total_amount = subtotal + 30000  # Fixed shipping fee
     
     # Generate order number
-    order_number = f"ORD-{datetime.utcnow().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-    
-    # Create order items
-    order_items = []
-    for item in order_data.items:
-        order_item = OrderItem(
-            product_id=item.product_id,
-            quantity=item.quantity,
-            price=item.price,
-            name=item.name,
-            image_url=item.image_url,
-            subtotal=item.price * item.quantity
+    now = datetime.utcnow()
+    order_number = f"ORD-{now.strftime('%Y%m%d')}-{ids.time_code(now)}"
+    
+    # Take stock for all items at once; raises 409 if anything is short
+    order_id = ids.new_id()
+    lines = checkout.stock_lines(items)
+    sharded = {product["id"]: product["stock_shards"] for product in found if product.get("stock_shards")}
+    untracked = [product["id"] for product in found if not checkout.tracks_stock(product)]
+    takes = await checkout.take_stock(db.products, order_id, lines, db.stock_counters, sharded, untracked)
+    
+    # The stock left must still cover everyone else's active holds
+    reservation = None
+    if order_data.reservation_id:
+        reservation = await db.reservations.find_one(
+            {"id": order_data.reservation_id, **reservation_owner(current_user_id, reservation_token),
+             "expires_at": {"$gt": datetime.utcnow()}},
+            {"_id": 0, "id": 1},
         )
-        order_items.append(order_item)
+    short = await reservations.check_holds(db, product_ids, exclude_id=reservation and reservation["id"])
+    if short:
+        await checkout.release_stock(db.products, order_id, lines, db.stock_counters, takes)
+        raise HTTPException(status_code=409, detail=f"Not enough stock available for: {', '.join(short)}")
     
     # Create order
     order_obj = Order(
+        id=order_id,
         user_id=current_user_id,  # Will be None for guest checkout
         order_number=order_number,
         items=order_items,
@@ -926,43 +1383,53 @@ async def create_order(order_data: OrderCreate, current_user_id: str = Depends(v
         notes=order_data.notes
     )
     
-    await db.orders.insert_one(order_obj.dict())
-    
-    # Update user profile with address information from first order (only if user is authenticated)
-    if current_user_id:
-        user = await db.users.find_one({"id": current_user_id})
-        if user and (not user.get("address") or not user.get("city")):
-            # Extract address information from shipping_address
-            address_update = {}
-            if order_data.shipping_address.get("address"):
-                address_update["address"] = order_data.shipping_address["address"]
-            if order_data.shipping_address.get("city"):
-                address_update["city"] = order_data.shipping_address["city"]
-            if order_data.shipping_address.get("district"):
-                address_update["district"] = order_data.shipping_address["district"]
-            if order_data.shipping_address.get("ward"):
-                address_update["ward"] = order_data.shipping_address["ward"]
-            if order_data.shipping_address.get("zip_code"):
-                address_update["zip_code"] = order_data.shipping_address["zip_code"]
-            
-            # Update user with address information
-            if address_update:
-                address_update["updated_at"] = datetime.utcnow()
-                await db.users.update_one(
-                    {"id": current_user_id},
-                    {"$set": address_update}
-                )
-        
-        # Clear cart after successful order (only if user is authenticated)
-        await db.carts.delete_one({"user_id": current_user_id})
+    try:
+        await order_writer.insert(order_obj.dict())
+    except Exception:
+        await checkout.release_stock(db.products, order_id, lines, db.stock_counters, takes)
+        raise
+    await checkout.confirm_stock(db.products, order_id, product_ids, db.stock_counters)
+    if reservation:
+        await db.reservations.delete_one({"id": reservation["id"]})
+    # Stock moved: drop the pages showing these products, not the whole catalog
+    response_cache.invalidate(*(f"product:{product_id}" for product_id in product_ids))
+    
+    # Profile backfill, cart clearing and the confirmation email run after the response
+    try:
+        await outbox.enqueue(order_tasks.order_placed_tasks(order_obj.dict()))
+    except Exception:
+        # The order is stored; failing the request now would invite a duplicate
+        logger.exception("Could not queue post-order tasks for %s", order_obj.id)
+    try:
+        await rollups.record(db, order_obj.dict(), None, order_obj.status.value)
+    except Exception:
+        # A rollup rebuild picks the order up
+        logger.exception("Could not add order %s to the sales rollups", order_obj.id)
     
     return order_obj
 
-@api_router.get("/orders", response_model=List[Order])
-async def get_user_orders(current_user_id: str = Depends(verify_token)):
-    """Get user's orders"""
-    orders = await db.orders.find({"user_id": current_user_id}).sort("created_at", -1).to_list(100)
-    return [Order(**order) for order in orders]
+@api_router.get("/orders", response_model=List[OrderSummary])
+async def get_user_orders(cursor: str = None, limit: int = 20, current_user_id: str = Depends(verify_token)):
+    """Get one page of the user's order history, newest first, as summaries.
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` for the next
+    page; ``GET /orders/{order_id}`` returns an order in full.
+    """
+    limit = min(max(limit, 1), ORDER_PAGE_MAX)
+    query = {"user_id": current_user_id}
+    if cursor:
+        query.update(keyset_filter(ORDER_SORT, cursor_keys(decode_cursor(cursor), ORDER_SORT, SORT_KEY_TYPES)))
+    
+    orders = await db.orders.aggregate([
+        {"$match": query},
+        {"$sort": dict(ORDER_SORT)},
+        {"$limit": limit},
+        {"$project": ORDER_SUMMARY_PROJECTION},
+    ]).to_list(limit)
+    headers = None
+    if len(orders) == limit:
+        headers = {"X-Next-Cursor": encode_cursor({"k": sort_values(orders[-1], ORDER_SORT)})}
+    return model_response(OrderSummary, orders, headers=headers)
 
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str, current_user_id: str = Depends(verify_token)):
@@ -970,17 +1437,122 @@ async def get_order(order_id: str, current_user_id: str = Depends(verify_token))
     order = await db.orders.find_one({"id": order_id, "user_id": current_user_id})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return Order(**order)
+    return model_response(Order, order)
+
+@api_router.put("/orders/{order_id}/status", response_model=Order, dependencies=[Depends(verify_admin)])
+async def update_order_status(order_id: str, status_update: OrderStatusUpdate):
+    """Move an order to a new status (admin)
+
+    Cancelling puts the order's stock back on sale. A cancelled order cannot
+    be reopened, since its stock may have been sold again since.
+    """
+    now = datetime.utcnow()
+    # The previous document tells exactly which status this update replaced,
+    # so concurrent updates each apply their own rollup and stock change
+    previous = await db.orders.find_one_and_update(
+        {"id": order_id, "status": {"$nin": [status_update.status, OrderStatus.CANCELLED]}},
+        {"$set": {"status": status_update.status, "updated_at": now}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not previous:
+        order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if order["status"] != status_update.status:
+            raise HTTPException(status_code=409, detail="Cancelled orders cannot be reopened")
+        return model_response(Order, order)
+    
+    if status_update.status == OrderStatus.CANCELLED:
+        try:
+            restored = await checkout.return_stock(db.products, db.stock_counters, previous["items"])
+            response_cache.invalidate(*(f"product:{product_id}" for product_id in restored))
+        except Exception:
+            logger.exception("Could not restore the stock of cancelled order %s", order_id)
+    try:
+        await rollups.record(db, previous, previous["status"], status_update.status.value)
+    except Exception:
+        logger.exception("Could not update the sales rollups for order %s", order_id)
+    return model_response(Order, {**previous, "status": status_update.status, "updated_at": now})
+
+# Admin endpoints
+@api_router.get("/admin/stats", dependencies=[Depends(verify_admin)])
+async def get_sales_stats(start: date = None, end: date = None, bucket: str = "day", top: int = 10):
+    """Orders, revenue and units per day, week or month, plus top products, read from the sales rollups.
+
+    The range defaults to the last 30 days and includes both ends.
+    """
+    if bucket not in rollups.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Invalid bucket, expected one of {list(rollups.BUCKETS)}")
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return await rollups.stats(db, start, end, bucket, top=min(max(top, 1), 100))
+
+@api_router.get("/admin/export/{table}", dependencies=[Depends(verify_admin)])
+async def export_table(table: str, format: str = "csv", since: Optional[datetime] = None,
+                       until: Optional[datetime] = None):
+    """Stream one analytics table (orders, order_items, products, product_variations) as CSV or Parquet.
+
+    Rows are read and written one batch at a time, so memory stays flat for
+    any table size. ``since``/``until`` filter on ``created_at``.
+    """
+    if table not in export.TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table, expected one of {list(export.TABLES)}")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format, expected one of {list(export.FORMATS)}")
+    sink = export.Chunks()
+    try:
+        writer = export.open_writer(format, sink, table)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    source = export.TABLES[table].source
+
+    async def body():
+        rows = 0
+        start = time.perf_counter()
+        async for counts in export.export_batches(db, source, {table: writer}, export.created_between(since, until)):
+            rows += counts[table]
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+        elapsed = time.perf_counter() - start
+        logger.info("Exported %d %s rows as %s in %.2fs (%.0f rows/s)",
+                    rows, table, format, elapsed, rows / elapsed if elapsed else 0)
+
+    filename = f"{table}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    return StreamingResponse(body(), media_type=export.FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Token buckets per client IP and per signed-in user for endpoints that are
+# expensive to hammer; RATE_LIMITS (JSON) overrides or adds routes
+RATE_LIMITS = {
+    "GET /api/products": Limit(ip=Rate.parse("120/minute"), user=Rate.parse("60/minute"), only_with="search"),
+    "POST /api/auth/login": Limit(ip=Rate.parse("20/minute")),
+    "POST /api/auth/register": Limit(ip=Rate.parse("10/minute")),
+    "POST /api/contact": Limit(ip=Rate.parse("5/minute")),
+}
+RATE_LIMITS.update(parse_limits(os.environ.get('RATE_LIMITS', '{}')))
+rate_limiter = RateLimiter(
+    RATE_LIMITS,
+    backend=MongoBackend(db.rate_limits) if os.environ.get('RATE_LIMIT_BACKEND', 'memory') == 'mongo' else None,
+    identify=token_user_id,
+)
+if os.environ.get('RATE_LIMITS_ENABLED', '1') != '0':
+    # Added before CORS so that 429s carry CORS headers too
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed", "Retry-After"],
 )
 
 # Configure logging
@@ -990,6 +1562,108 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_db_indexes():
+    await ensure_indexes(db)
+
+@app.on_event("startup")
+async def build_search_index():
+    await product_search.load(db.products)
+    logger.info("Indexed %d products for search", len(product_search))
+
+    async def sync_forever():
+        while True:
+            await asyncio.sleep(SEARCH_SYNC_SECONDS)
+            try:
+                await product_search.sync(db.products, overlap=timedelta(seconds=2 * SEARCH_SYNC_SECONDS))
+            except Exception:
+                logger.exception("Search index sync failed")
+    app.state.search_sync = asyncio.create_task(sync_forever())
+
+async def load_registered_emails(since: Optional[datetime] = None):
+    """Add the emails of users created since ``since`` (all users for None) to the filter"""
+    query = {} if since is None else {"created_at": {"$gte": since}}
+    async for user in db.users.find(query, {"_id": 0, "email": 1}):
+        email_filter.add(user["email"])
+
+@app.on_event("startup")
+async def build_email_filter():
+    if email_filter is None:
+        return
+    synced_until = datetime.utcnow()
+    await load_registered_emails()
+    if email_filter.saturated():
+        logger.warning("Email filter holds %d emails, above its capacity of %d; raise EMAIL_FILTER_CAPACITY",
+                       email_filter.count, email_filter.capacity)
+    logger.info("Loaded %d emails into the registration filter", email_filter.count)
+
+    async def sync_forever():
+        nonlocal synced_until
+        while True:
+            await asyncio.sleep(EMAIL_FILTER_SYNC_SECONDS)
+            started = datetime.utcnow()
+            try:
+                # Overlap by a couple of intervals to allow for clock skew between workers
+                await load_registered_emails(synced_until - timedelta(seconds=2 * EMAIL_FILTER_SYNC_SECONDS))
+            except Exception:
+                logger.exception("Email filter sync failed")
+                continue
+            synced_until = started
+    app.state.email_filter_sync = asyncio.create_task(sync_forever())
+
+@app.on_event("startup")
+async def start_stock_sync():
+    async def sync_forever():
+        while True:
+            await asyncio.sleep(STOCK_SYNC_SECONDS)
+            try:
+                synced = await stock_shards.sync_product_stock(db)
+            except Exception:
+                logger.exception("Stock counter sync failed")
+                continue
+            if synced:
+                response_cache.invalidate(*(f"product:{product_id}" for product_id in synced))
+    app.state.stock_sync = asyncio.create_task(sync_forever())
+
+@app.on_event("startup")
+async def start_abandoned_checkout_sweep():
+    async def sweep_forever():
+        while True:
+            try:
+                restored = await checkout.release_abandoned(db.products, db.orders, CHECKOUT_ABANDONED_AFTER,
+                                                           db.stock_counters)
+            except Exception:
+                logger.exception("Abandoned checkout sweep failed")
+            else:
+                if restored:
+                    logger.warning("Gave back stock held by abandoned checkouts on %d products", len(restored))
+                    response_cache.invalidate(*(f"product:{product_id}" for product_id in restored))
+            await asyncio.sleep(CHECKOUT_ABANDONED_AFTER.total_seconds() / 5)
+    app.state.checkout_sweep = asyncio.create_task(sweep_forever())
+
+@app.on_event("startup")
+async def start_revocation_sync():
+    async def sync_forever():
+        while True:
+            try:
+                await session_store.sync()
+            except Exception:
+                logger.exception("Session revocation sync failed")
+            await asyncio.sleep(session_store.sync_interval)
+    app.state.revocation_sync = asyncio.create_task(sync_forever())
+
+@app.on_event("startup")
+async def start_order_writer():
+    if os.environ.get('ORDER_GROUP_COMMIT', '1') != '0':
+        order_writer.start()
+
+@app.on_event("startup")
+async def start_outbox_workers():
+    outbox.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await order_writer.stop()
+    await outbox.stop()
+    password_hasher.shutdown()
     client.close()
@@ -0,0 +1,155 @@
+"""Refresh-token sessions: short-lived access tokens, rotating refresh tokens.
+
+Login creates a session document in the ``sessions`` collection and returns
+a refresh token ``<session id>.<secret>`` alongside the access token. Only
+the SHA-256 of the secret is stored. ``POST /auth/refresh`` exchanges the
+refresh token for a new access token and a new refresh token in one
+``find_one_and_update``. It involves no user lookup and no password hash.
+Each refresh pushes the session's ``expires_at`` out by ``refresh_ttl``, and
+the TTL index deletes sessions that stay idle that long.
+
+Rotation makes a stolen refresh token detectable. Presenting the token
+that was just replaced, outside a short grace period for tabs racing each
+other, ends the whole session.
+
+Access tokens carry the session id as ``sid``. A logout or a detected reuse
+marks the session ``revoked_at`` and keeps the document until every access
+token issued for it has expired. Each worker holds the ids of revoked
+sessions in memory, refreshed from the collection every ``sync_interval``
+seconds, so checking an access token never touches MongoDB. Revocations
+from another worker take effect within that interval.
+"""
+import hashlib
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+import ids
+
+# A just-rotated token presented within this window is a race between tabs,
+# not a replay; it is refused without ending the session
+REUSE_GRACE = timedelta(seconds=10)
+
+
+def _digest(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode()).digest()
+
+
+def _split(refresh_token: str) -> Optional[Tuple[str, str]]:
+    session_id, _, secret = refresh_token.partition(".")
+    if not session_id or not secret:
+        return None
+    return session_id, secret
+
+
+class SessionStore:
+    def __init__(self, collection, refresh_ttl: timedelta = timedelta(days=30),
+                 access_ttl: timedelta = timedelta(minutes=15), sync_interval: float = 5.0):
+        self.collection = collection
+        self.refresh_ttl = refresh_ttl
+        self.access_ttl = access_ttl
+        self.sync_interval = sync_interval
+        # Revoked session id -> Unix time after which its access tokens have all expired
+        self._revoked: Dict[str, float] = {}
+        self._synced_until: Optional[datetime] = None
+        self.created = 0
+        self.refreshed = 0
+        self.refused = 0
+        self.reused = 0
+        self.revoked = 0
+
+    async def create(self, user_id: str) -> Tuple[str, str]:
+        """Start a session for ``user_id``; returns (session id, refresh token)."""
+        session_id, secret = ids.new_id(), secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        await self.collection.insert_one({
+            "_id": session_id,
+            "user_id": user_id,
+            "secret": _digest(secret),
+            "created_at": now,
+            "last_used_at": now,
+            "expires_at": now + self.refresh_ttl,
+        })
+        self.created += 1
+        return session_id, f"{session_id}.{secret}"
+
+    async def rotate(self, refresh_token: str) -> Optional[Tuple[str, str, str]]:
+        """Swap ``refresh_token`` for a new one; returns (user id, session id, refresh token) or None."""
+        parts = _split(refresh_token)
+        if parts is None:
+            self.refused += 1
+            return None
+        session_id, secret = parts
+        new_secret = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        session = await self.collection.find_one_and_update(
+            {"_id": session_id, "secret": _digest(secret), "revoked_at": None, "expires_at": {"$gt": now}},
+            {"$set": {"secret": _digest(new_secret), "previous": _digest(secret),
+                      "last_used_at": now, "expires_at": now + self.refresh_ttl}},
+            projection={"user_id": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if session is not None:
+            self.refreshed += 1
+            return session["user_id"], session_id, f"{session_id}.{new_secret}"
+
+        self.refused += 1
+        replayed = await self.collection.find_one(
+            {"_id": session_id, "previous": _digest(secret), "revoked_at": None},
+            {"last_used_at": 1},
+        )
+        if replayed is not None and now - replayed["last_used_at"] > REUSE_GRACE:
+            self.reused += 1
+            await self.revoke(session_id)
+        return None
+
+    async def end(self, refresh_token: str) -> bool:
+        """Log out the session ``refresh_token`` belongs to; False if the token is not current."""
+        parts = _split(refresh_token)
+        if parts is None:
+            return False
+        session_id, secret = parts
+        return await self.revoke(session_id, {"secret": _digest(secret)})
+
+    async def revoke(self, session_id: str, match: Optional[dict] = None) -> bool:
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"_id": session_id, "revoked_at": None, **(match or {})},
+            # Kept until the last access token for the session has expired
+            {"$set": {"revoked_at": now, "expires_at": now + self.access_ttl}},
+        )
+        if not result.modified_count:
+            return False
+        self.revoked += 1
+        self._revoked[session_id] = time.time() + self.access_ttl.total_seconds()
+        return True
+
+    def is_revoked(self, session_id: Optional[str]) -> bool:
+        return session_id is not None and session_id in self._revoked
+
+    async def sync(self):
+        """Load sessions revoked by any worker since the last sync and forget stale ones."""
+        started = datetime.utcnow()
+        # Overlap by a couple of intervals to allow for clock skew between workers
+        since = (self._synced_until - timedelta(seconds=2 * self.sync_interval)
+                 if self._synced_until else started - self.access_ttl)
+        async for session in self.collection.find({"revoked_at": {"$gte": since}}, {"revoked_at": 1}):
+            expires = session["revoked_at"] + self.access_ttl
+            self._revoked[session["_id"]] = (expires - datetime(1970, 1, 1)).total_seconds()
+        self._synced_until = started
+        now = time.time()
+        for session_id in [sid for sid, expires in self._revoked.items() if expires <= now]:
+            del self._revoked[session_id]
+
+    def stats(self) -> dict:
+        return {
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "refused": self.refused,
+            "reused": self.reused,
+            "revoked": self.revoked,
+            "revoked_cached": len(self._revoked),
+        }
@@ -0,0 +1,264 @@
+"""Optional sharded stock counters for hot products.
+
+Every checkout of a product normally ends in an ``$inc`` on that product's
+document, so during a flash sale all buyers queue on one document lock. A
+product with ``stock_shards: N`` keeps its stock in the ``stock_counters``
+collection instead, split over N documents per SKU. A SKU is the
+product-level count (``size`` None) or one variation, just like the
+``stock_quantity`` fields on the product. A decrement picks a shard at
+random, so concurrent writers are spread over N documents.
+
+A decrement is a conditional ``$inc`` on one random shard. If no single
+shard holds enough, units are taken piecemeal from several shards, and
+given back if the total still falls short. Like a product document
+decrement, every take also pushes a marker with the order id and the
+units taken onto the shard's ``pending``, in the same update. Giving units
+back pulls the marker, so it happens at most once. Markers left behind by
+a process that died mid-checkout are resolved by
+:func:`checkout.release_abandoned`. Reads sum the shards with one
+aggregation. The product document's stock fields are refreshed from those
+sums periodically (:func:`sync_product_stock`) for display, and the
+checkout and hold checks use the live sums.
+
+Switching modes flips ``stock_shards`` before moving any stock. Checkout
+only decrements a product document while it has no ``stock_shards``, so
+once the flag is set no sale can land on the side being moved away from.
+:func:`enable` seeds the counters from the stock the flip returned.
+:func:`disable` first parks the product at ``stock_shards: 0``, in which
+neither side sells. It then deletes the counters one by one, summing what
+they held, and writes the sums back to the product. While a switch is
+under way, checkouts of the product get 409 rather than overselling.
+
+The product document's stock cannot be edited while it is sharded, since
+the sync would overwrite it. To restock, :func:`disable`, update the
+product, then :func:`enable` again.
+"""
+import random
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument, UpdateOne
+
+MAX_SHARDS = 64
+
+# (product_id, size) -> units; size None is the product-level count
+Totals = Dict[Tuple[str, Optional[str]], int]
+# (product_id, size, shard, units) taken by a decrement, for rollback
+Takes = List[Tuple[str, Optional[str], int, int]]
+
+
+def _split(quantity: int, shards: int) -> List[int]:
+    base, remainder = divmod(max(quantity, 0), shards)
+    return [base + (1 if shard < remainder else 0) for shard in range(shards)]
+
+
+async def enable(db, product_id: str, shards: int):
+    """Move a product's current stock into ``shards`` counters per SKU.
+
+    Raises 404 for an unknown product, and 409 when it is already sharded
+    or does not track stock.
+    """
+    product = await db.products.find_one_and_update(
+        {"id": product_id, "stock_shards": None, "stock_quantity": {"$ne": None}},
+        {"$set": {"stock_shards": shards}},
+        projection={"_id": 0, "stock_quantity": 1, "variations": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if product is None:
+        existing = await db.products.find_one({"id": product_id}, {"_id": 0, "stock_shards": 1})
+        if existing is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        if existing.get("stock_shards") is not None:
+            raise HTTPException(status_code=409, detail="Stock is already sharded")
+        raise HTTPException(status_code=409, detail="Stock is not tracked for this product")
+    # Nothing uses counters of an unsharded product; clear any left by a failed run
+    await db.stock_counters.delete_many({"product_id": product_id})
+    skus = [(None, product["stock_quantity"])]
+    skus += [(variation["size"], variation.get("stock_quantity", 0)) for variation in product.get("variations") or []]
+    await db.stock_counters.insert_many([
+        {"product_id": product_id, "size": size, "shard": shard, "quantity": quantity}
+        for size, total in skus
+        for shard, quantity in enumerate(_split(total, shards))
+    ])
+
+
+async def disable(db, product_id: str) -> bool:
+    """Fold the counters back into the product document and drop them.
+
+    Returns False when the product was not sharded. Raises 404 for an
+    unknown product.
+    """
+    product = await db.products.find_one_and_update(
+        {"id": product_id, "stock_shards": {"$gt": 0}},
+        {"$set": {"stock_shards": 0}},
+        projection={"_id": 0, "variations": 1},
+    )
+    if product is None:
+        existing = await db.products.find_one({"id": product_id}, {"_id": 0, "stock_shards": 1})
+        if existing is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        if existing.get("stock_shards") is None:
+            return False
+        # Parked at 0 by a disable that died part way: finish it
+
+    # A take racing the delete of its shard matches nothing, so every unit
+    # is either counted here or already sold
+    sku_totals: Dict[Optional[str], int] = defaultdict(int)
+    while True:
+        counter = await db.stock_counters.find_one_and_delete({"product_id": product_id})
+        if counter is None:
+            break
+        sku_totals[counter["size"]] += counter["quantity"]
+
+    # Product updates leave stock and variations alone while stock_shards is set
+    product = product or await db.products.find_one({"id": product_id}, {"_id": 0, "variations": 1})
+    await db.products.update_one({"id": product_id}, {
+        "$set": {
+            "stock_quantity": sku_totals[None],
+            "in_stock": sku_totals[None] > 0,
+            "variations": [{**variation, "stock_quantity": sku_totals[variation["size"]]}
+                           for variation in product.get("variations") or []],
+        },
+        "$unset": {"stock_shards": ""},
+    })
+    return True
+
+
+async def _take_sku(collection, order_id: str, product_id: str, size: Optional[str], quantity: int,
+                    shards: int) -> Takes:
+    order = random.sample(range(shards), shards)
+    sku = {"product_id": product_id, "size": size}
+    now = datetime.utcnow()
+    result = await collection.update_one(
+        {**sku, "shard": order[0], "quantity": {"$gte": quantity}},
+        {"$inc": {"quantity": -quantity}, "$push": {"pending": {"order_id": order_id, "at": now, "units": quantity}}})
+    if result.modified_count:
+        return [(product_id, size, order[0], quantity)]
+
+    # The random shard was short, so the SKU is running low: gather what
+    # the shards have left
+    takes: Takes = []
+    needed = quantity
+    for shard in order:
+        before = await collection.find_one_and_update(
+            {**sku, "shard": shard, "quantity": {"$gt": 0}},
+            [{"$set": {
+                "quantity": {"$subtract": ["$quantity", {"$min": ["$quantity", needed]}]},
+                "pending": {"$concatArrays": [{"$ifNull": ["$pending", []]}, [
+                    {"order_id": {"$literal": order_id}, "at": now, "units": {"$min": ["$quantity", needed]}},
+                ]]},
+            }}],
+            projection={"_id": 0, "quantity": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if before is not None:
+            taken = min(before["quantity"], needed)
+            takes.append((product_id, size, shard, taken))
+            needed -= taken
+            if not needed:
+                return takes
+    await give_back(collection, takes, order_id)
+    return []
+
+
+async def take(collection, order_id: str, lines: Dict[Tuple[str, Optional[str]], int],
+               shards: Dict[str, int]) -> Optional[Takes]:
+    """Decrement sharded stock for order ``lines``, all or nothing, marked with ``order_id``.
+
+    ``shards`` maps each sharded product id to its shard count. Like the
+    product document path, a variation line takes from both the variation
+    and the product-level counters. Returns the takes, or None when any
+    SKU is short (after giving everything back).
+    """
+    wanted: Totals = {}
+    for (product_id, size), quantity in lines.items():
+        wanted[(product_id, None)] = wanted.get((product_id, None), 0) + quantity
+        if size is not None:
+            wanted[(product_id, size)] = wanted.get((product_id, size), 0) + quantity
+
+    takes: Takes = []
+    for (product_id, size), quantity in wanted.items():
+        taken = await _take_sku(collection, order_id, product_id, size, quantity, shards[product_id])
+        if not taken:
+            await give_back(collection, takes, order_id)
+            return None
+        takes.extend(taken)
+    return takes
+
+
+async def give_back(collection, takes: Takes, order_id: Optional[str] = None):
+    """Add ``takes`` back to their shards.
+
+    With ``order_id``, only shards still carrying that order's marker get
+    units back, and the marker is pulled.
+    """
+    if not takes:
+        return
+    ops = []
+    for product_id, size, shard, units in takes:
+        counter = {"product_id": product_id, "size": size, "shard": shard}
+        if order_id is None:
+            ops.append(UpdateOne(counter, {"$inc": {"quantity": units}}))
+        else:
+            ops.append(UpdateOne({**counter, "pending.order_id": order_id},
+                                 {"$inc": {"quantity": units}, "$pull": {"pending": {"order_id": order_id}}}))
+    await collection.bulk_write(ops, ordered=False)
+
+
+async def confirm(collection, order_id: str, product_ids: Iterable[str]):
+    """Drop ``order_id``'s markers from the shards of ``product_ids`` once the order is stored."""
+    await collection.update_many({"product_id": {"$in": list(product_ids)}, "pending.order_id": order_id},
+                                 {"$pull": {"pending": {"order_id": order_id}}})
+
+
+async def totals(collection, product_ids: Iterable[str]) -> Totals:
+    """Current stock per SKU, summed over the shards."""
+    pipeline = [
+        {"$match": {"product_id": {"$in": list(product_ids)}}},
+        {"$group": {"_id": {"product_id": "$product_id", "size": "$size"}, "quantity": {"$sum": "$quantity"}}},
+    ]
+    return {
+        (row["_id"]["product_id"], row["_id"].get("size")): row["quantity"]
+        async for row in collection.aggregate(pipeline)
+    }
+
+
+def apply_totals(product: dict, sku_totals: Totals) -> dict:
+    """``product`` with its stock fields replaced by the counter sums."""
+    product_id = product["id"]
+    return {
+        **product,
+        "stock_quantity": sku_totals.get((product_id, None), 0),
+        "variations": [
+            {**variation, "stock_quantity": sku_totals.get((product_id, variation["size"]), 0)}
+            for variation in product.get("variations") or []
+        ],
+    }
+
+
+async def sync_product_stock(db, product_ids: Iterable[str] = None) -> List[str]:
+    """Write counter sums into the product documents; returns their ids."""
+    if product_ids is None:
+        product_ids = await db.products.distinct("id", {"stock_shards": {"$gt": 0}})
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    sku_totals = await totals(db.stock_counters, product_ids)
+    products = await db.products.find(
+        {"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "variations.size": 1}).to_list(len(product_ids))
+    ops = []
+    for product in products:
+        synced = apply_totals(product, sku_totals)
+        update = {"stock_quantity": synced["stock_quantity"], "in_stock": synced["stock_quantity"] > 0}
+        array_filters = []
+        for n, variation in enumerate(synced["variations"]):
+            update[f"variations.$[v{n}].stock_quantity"] = variation["stock_quantity"]
+            array_filters.append({f"v{n}.size": variation["size"]})
+        # Skipped once a disable has started moving the stock back
+        ops.append(UpdateOne({"id": product["id"], "stock_shards": {"$gt": 0}}, {"$set": update},
+                             array_filters=array_filters or None))
+    if ops:
+        await db.products.bulk_write(ops, ordered=False)
+    return [product["id"] for product in products]
@@ -0,0 +1,153 @@
+import requests
+import time
+import statistics
+import sys
+import concurrent.futures
+from datetime import datetime
+
+# Backend URL from frontend/.env
+BACKEND_URL = "https://becea3af-8c73-4a75-951c-2aadc73d9709.preview.emergentagent.com"
+API_BASE_URL = f"{BACKEND_URL}/api"
+
+CONCURRENT_REQUESTS = 50
+
+def register_test_user():
+    """Register a fresh user so the cart starts empty"""
+    user = {
+        "email": f"cart.stress.{datetime.now().strftime('%Y%m%d%H%M%S%f')}@example.com",
+        "password": "Test@123456",
+        "full_name": "Cart Stress Test",
+        "phone": "0912345678"
+    }
+    response = requests.post(f"{API_BASE_URL}/auth/register", json=user, timeout=30)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def get_test_products(count=2):
+    response = requests.get(f"{API_BASE_URL}/products", params={"limit": count}, timeout=30)
+    if response.status_code == 200 and len(response.json()) < count:
+        requests.post(f"{API_BASE_URL}/products/seed", timeout=30)
+        response = requests.get(f"{API_BASE_URL}/products", params={"limit": count}, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+def timed_request(method, url, **kwargs):
+    start_time = time.time()
+    response = requests.request(method, url, timeout=30, **kwargs)
+    return response, (time.time() - start_time) * 1000
+
+def run_concurrently(calls):
+    """Fire all calls at once and collect (response, ms) results"""
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        results = list(executor.map(lambda call: call(), calls))
+    elapsed = time.time() - start_time
+    return results, elapsed
+
+def test_concurrent_adds_same_item(headers, product):
+    """N parallel adds of quantity 1 must leave quantity N: no lost updates"""
+    print(f"\n=== Testing {CONCURRENT_REQUESTS} concurrent adds of the same product ===")
+    url = f"{API_BASE_URL}/cart/add"
+    calls = [
+        (lambda: timed_request("POST", url, headers=headers, json={"product_id": product["id"], "quantity": 1}))
+        for _ in range(CONCURRENT_REQUESTS)
+    ]
+    results, elapsed = run_concurrently(calls)
+
+    ok = sum(1 for response, _ in results if response.status_code == 200)
+    times = [ms for _, ms in results]
+    print(f"Successful requests: {ok}/{CONCURRENT_REQUESTS} in {elapsed:.2f}s ({CONCURRENT_REQUESTS / elapsed:.1f} req/s)")
+    print(f"Latency: avg {statistics.mean(times):.2f} ms, max {max(times):.2f} ms")
+
+    cart = requests.get(f"{API_BASE_URL}/cart", headers=headers, timeout=30).json()
+    quantity = next((item["quantity"] for item in cart["items"] if item["product_id"] == product["id"]), 0)
+    expected_total = product["price"] * ok
+
+    passed = quantity == ok and abs(cart["total_amount"] - expected_total) < 0.01 and len(cart["items"]) == 1
+    if passed:
+        print(f"✅ No lost updates: quantity {quantity}, total {cart['total_amount']}")
+    else:
+        print(f"❌ Lost updates: quantity {quantity} (expected {ok}), total {cart['total_amount']} (expected {expected_total}), {len(cart['items'])} line items")
+    return {"passed": passed, "throughput": CONCURRENT_REQUESTS / elapsed, "avg_time": statistics.mean(times)}
+
+def test_concurrent_mixed_mutations(headers, products):
+    """Interleaved adds of two products plus quantity updates keep the total consistent"""
+    print("\n=== Testing concurrent mixed cart mutations ===")
+    first, second = products[0], products[1]
+    add_url = f"{API_BASE_URL}/cart/add"
+    calls = []
+    for i in range(CONCURRENT_REQUESTS):
+        product = first if i % 2 == 0 else second
+        calls.append(lambda product=product: timed_request(
+            "POST", add_url, headers=headers, json={"product_id": product["id"], "quantity": 1}))
+    results, elapsed = run_concurrently(calls)
+    print(f"Completed {len(results)} mixed adds in {elapsed:.2f}s")
+
+    cart = requests.get(f"{API_BASE_URL}/cart", headers=headers, timeout=30).json()
+    computed_total = sum(item["price"] * item["quantity"] for item in cart["items"])
+    passed = abs(cart["total_amount"] - computed_total) < 0.01
+    if passed:
+        print(f"✅ total_amount matches items: {cart['total_amount']}")
+    else:
+        print(f"❌ total_amount {cart['total_amount']} does not match items ({computed_total})")
+
+    # Updating and removing must work on the same cart without a read-modify-write
+    response = requests.put(f"{API_BASE_URL}/cart/item/{first['id']}", headers=headers, json={"quantity": 3}, timeout=30)
+    response_ok = response.status_code == 200 and any(
+        item["product_id"] == first["id"] and item["quantity"] == 3 for item in response.json()["cart"]["items"])
+    response = requests.delete(f"{API_BASE_URL}/cart/item/{second['id']}", headers=headers, timeout=30)
+    response_ok = response_ok and response.status_code == 200 and all(
+        item["product_id"] != second["id"] for item in response.json()["cart"]["items"])
+    print(f"{'✅' if response_ok else '❌'} Update/remove return the updated cart")
+
+    return {"passed": passed and response_ok}
+
+def test_batch_update(headers, products):
+    """One PATCH applies its operations in order and returns the final cart"""
+    print("\n=== Testing batched cart update ===")
+    first, second = products[0], products[1]
+    operations = [
+        {"op": "add", "product_id": first["id"], "quantity": 2},
+        {"op": "add", "product_id": second["id"], "quantity": 1},
+        {"op": "update", "product_id": first["id"], "quantity": 4},
+        {"op": "remove", "product_id": second["id"]},
+        {"op": "add", "product_id": second["id"], "quantity": 3},
+    ]
+    response, ms = timed_request("PATCH", f"{API_BASE_URL}/cart", headers=headers, json={"operations": operations})
+    if response.status_code != 200:
+        print(f"❌ Batch update failed: {response.status_code} {response.text}")
+        return {"passed": False}
+
+    items = {item["product_id"]: item["quantity"] for item in response.json()["cart"]["items"]}
+    expected_total = first["price"] * 4 + second["price"] * 3
+    passed = items == {first["id"]: 4, second["id"]: 3} and \
+        abs(response.json()["cart"]["total_amount"] - expected_total) < 0.01
+    print(f"{'✅' if passed else '❌'} {len(operations)} operations in {ms:.2f} ms: {items}")
+
+    # An unknown product rejects the whole batch
+    response = requests.patch(f"{API_BASE_URL}/cart", headers=headers, timeout=30,
+                              json={"operations": [{"op": "remove", "product_id": first["id"]},
+                                                   {"op": "add", "product_id": "does-not-exist"}]})
+    cart = requests.get(f"{API_BASE_URL}/cart", headers=headers, timeout=30).json()
+    rejected = response.status_code == 404 and any(item["product_id"] == first["id"] for item in cart["items"])
+    print(f"{'✅' if rejected else '❌'} Batch with an unknown product is rejected without partial changes")
+    return {"passed": passed and rejected}
+
+def run_tests():
+    print("\n======= STARTING CART CONCURRENCY TESTS =======\n")
+    products = get_test_products()
+
+    results = {}
+    results["same_item"] = test_concurrent_adds_same_item(register_test_user(), products[0])
+    results["mixed"] = test_concurrent_mixed_mutations(register_test_user(), products)
+    results["batch"] = test_batch_update(register_test_user(), products)
+
+    print("\n======= CART CONCURRENCY TEST SUMMARY =======")
+    for name, result in results.items():
+        print(f"{'✅' if result['passed'] else '❌'} {name}")
+
+    print("\n======= CART CONCURRENCY TESTS COMPLETED =======")
+    return all(result["passed"] for result in results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests() else 1)
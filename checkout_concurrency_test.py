@@ -0,0 +1,150 @@
+import requests
+import time
+import statistics
+import sys
+import concurrent.futures
+import uuid
+from datetime import datetime
+
+# Backend URL from frontend/.env
+BACKEND_URL = "https://becea3af-8c73-4a75-951c-2aadc73d9709.preview.emergentagent.com"
+API_BASE_URL = f"{BACKEND_URL}/api"
+
+CONCURRENT_ORDERS = 500
+STOCK_UNITS = 10
+MAX_WORKERS = 100
+
+def create_limited_product():
+    """Create a throwaway product with STOCK_UNITS units in a single variation"""
+    product = {
+        "name": f"Checkout Stress {datetime.now().strftime('%Y%m%d%H%M%S%f')}",
+        "description": "Temporary product for the concurrent checkout benchmark",
+        "price": 100000,
+        "original_price": 150000,
+        "category": "Test",
+        "image_url": "https://images.unsplash.com/photo-1662473217799-6e7288f19741",
+        "variations": [{"size": "8mm", "price": 120000, "original_price": 150000,
+                        "stock_quantity": STOCK_UNITS}],
+        "stock_quantity": STOCK_UNITS,
+    }
+    response = requests.post(f"{API_BASE_URL}/products", json=product, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+def place_order(product, reservation_id=None, idempotency_key=None, reservation_token=None):
+    order = {
+        "items": [{"product_id": product["id"], "size": "8mm", "quantity": 1,
+                   # Stale client-side price; the server must ignore it
+                   "price": 1, "name": product["name"], "image_url": product["image_url"]}],
+        "payment_method": "cod",
+        "customer_info": {"full_name": "Checkout Stress", "phone": "0912345678", "email": "stress@example.com"},
+        "shipping_address": {"address": "1 Lê Lợi", "city": "Hồ Chí Minh", "district": "Quận 1"},
+        "reservation_id": reservation_id,
+    }
+    start_time = time.time()
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+    if reservation_token:
+        headers["X-Reservation-Token"] = reservation_token
+    response = requests.post(f"{API_BASE_URL}/orders", json=order, headers=headers, timeout=60)
+    return response, (time.time() - start_time) * 1000
+
+def test_concurrent_checkout(product):
+    """CONCURRENT_ORDERS parallel checkouts of one unit each must sell exactly STOCK_UNITS"""
+    print(f"\n=== {CONCURRENT_ORDERS} concurrent checkouts for a {STOCK_UNITS}-unit item ===")
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(executor.map(lambda _: place_order(product), range(CONCURRENT_ORDERS)))
+    elapsed = time.time() - start_time
+
+    statuses = {}
+    for response, _ in results:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    times = [ms for _, ms in results]
+    accepted = [response.json() for response, _ in results if response.status_code == 200]
+
+    print(f"Completed in {elapsed:.2f}s ({CONCURRENT_ORDERS / elapsed:.1f} orders/s)")
+    print(f"Status codes: {statuses}")
+    print(f"Latency: avg {statistics.mean(times):.2f} ms, p95 {sorted(times)[int(len(times) * 0.95)]:.2f} ms")
+
+    stored = requests.get(f"{API_BASE_URL}/products/{product['id']}", timeout=30).json()
+    variation_stock = stored["variations"][0]["stock_quantity"]
+    oversold = len(accepted) - STOCK_UNITS
+    priced_by_server = all(order["items"][0]["price"] == 120000 for order in accepted)
+
+    passed = (len(accepted) == STOCK_UNITS and statuses.get(409, 0) == CONCURRENT_ORDERS - STOCK_UNITS
+              and stored["stock_quantity"] == 0 and variation_stock == 0 and priced_by_server)
+    if passed:
+        print(f"✅ Zero oversell: {len(accepted)} orders accepted, stock now {stored['stock_quantity']}")
+    else:
+        print(f"❌ Accepted {len(accepted)} (oversold by {oversold}), product stock {stored['stock_quantity']}, "
+              f"variation stock {variation_stock}, server prices used: {priced_by_server}")
+    return {"passed": passed, "throughput": CONCURRENT_ORDERS / elapsed, "avg_time": statistics.mean(times)}
+
+def test_reservation_hold(product):
+    """A hold on every unit blocks other checkouts until its owner orders"""
+    print(f"\n=== Testing a checkout hold on all {STOCK_UNITS} units ===")
+    response = requests.post(f"{API_BASE_URL}/reservations", timeout=30, json={
+        "items": [{"product_id": product["id"], "size": "8mm", "quantity": STOCK_UNITS}]})
+    if response.status_code != 200:
+        print(f"❌ Could not place hold: {response.status_code} {response.text}")
+        return {"passed": False}
+    reservation = response.json()
+
+    availability = requests.get(f"{API_BASE_URL}/products/{product['id']}/availability", timeout=30).json()
+    print(f"Availability while held: {availability['available']} of {availability['stock_quantity']}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        blocked = list(executor.map(lambda _: place_order(product), range(MAX_WORKERS)))
+    blocked_ok = all(response.status_code == 409 for response, _ in blocked)
+    print(f"{'✅' if blocked_ok else '❌'} {len(blocked)} checkouts without the hold were rejected")
+
+    # A guest hold is only converted with its owner token
+    stolen, _ = place_order(product, reservation["id"])
+    stolen_ok = stolen.status_code == 409
+    print(f"{'✅' if stolen_ok else '❌'} Checkout with the hold id but no owner token was rejected")
+
+    response, ms = place_order(product, reservation["id"], reservation_token=reservation["owner_token"])
+    converted = response.status_code == 200
+    print(f"{'✅' if converted else '❌'} Checkout with the hold succeeded in {ms:.2f} ms")
+    return {"passed": availability["available"] == 0 and blocked_ok and stolen_ok and converted,
+            "throughput": 0, "avg_time": ms}
+
+def test_idempotent_retries(product):
+    """MAX_WORKERS concurrent retries of one order under one Idempotency-Key store a single order"""
+    print(f"\n=== {MAX_WORKERS} concurrent retries with one Idempotency-Key ===")
+    key = str(uuid.uuid4())
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(executor.map(lambda _: place_order(product, idempotency_key=key), range(MAX_WORKERS)))
+    elapsed = time.time() - start_time
+
+    order_ids = {response.json()["id"] for response, _ in results if response.status_code == 200}
+    all_ok = all(response.status_code == 200 for response, _ in results)
+    stored = requests.get(f"{API_BASE_URL}/products/{product['id']}", timeout=30).json()
+    units_sold = STOCK_UNITS - stored["stock_quantity"]
+    passed = all_ok and len(order_ids) == 1 and units_sold == 1
+    print(f"{'✅' if passed else '❌'} {len(results)} attempts -> {len(order_ids)} distinct order(s), "
+          f"{units_sold} unit(s) sold")
+    times = [ms for _, ms in results]
+    return {"passed": passed, "throughput": MAX_WORKERS / elapsed, "avg_time": statistics.mean(times)}
+
+def run_tests():
+    print("\n======= STARTING CHECKOUT CONCURRENCY TESTS =======\n")
+    results = {}
+    for name, test in (("concurrent_checkout", test_concurrent_checkout), ("reservation_hold", test_reservation_hold),
+                       ("idempotent_retries", test_idempotent_retries)):
+        product = create_limited_product()
+        try:
+            results[name] = test(product)
+        finally:
+            requests.delete(f"{API_BASE_URL}/products/{product['id']}", timeout=30)
+
+    print("\n======= CHECKOUT CONCURRENCY TEST SUMMARY =======")
+    for name, result in results.items():
+        print(f"{'✅' if result['passed'] else '❌'} {name}: "
+              f"{result['throughput']:.1f} orders/s, avg {result['avg_time']:.2f} ms")
+    print("\n======= CHECKOUT CONCURRENCY TESTS COMPLETED =======")
+    return all(result["passed"] for result in results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests() else 1)
@@ -150,17 +150,19 @@ const ProductCard = ({ product, onClick }) => {
           )}
         </div>
         
-        {/* Stock Info - More compact */}
-        <div className="flex items-center justify-between mb-1.5">
-          <span className="text-soft-gold text-2xs sm:text-xs">
-            Còn lại: {product.stock_quantity} sản phẩm
-          </span>
-          {product.stock_quantity <= 5 && (
-            <span className="text-red-400 text-2xs sm:text-xs font-semibold">
-              Sắp hết hàng!
+        {/* Stock Info - More compact; hidden for products without tracked stock */}
+        {product.stock_quantity != null && (
+          <div className="flex items-center justify-between mb-1.5">
+            <span className="text-soft-gold text-2xs sm:text-xs">
+              Còn lại: {product.stock_quantity} sản phẩm
             </span>
-          )}
-        </div>
+            {product.stock_quantity <= 5 && (
+              <span className="text-red-400 text-2xs sm:text-xs font-semibold">
+                Sắp hết hàng!
+              </span>
+            )}
+          </div>
+        )}
         
         {/* Add to Cart Button - More compact */}
         <button 
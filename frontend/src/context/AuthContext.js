@@ -1,5 +1,6 @@
 import React, { createContext, useContext, useReducer, useEffect } from 'react';
 import axios from 'axios';
+import { clearTokens, storeTokens } from '../services/api';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
@@ -42,7 +43,6 @@ const authReducer = (state, action) => {
     
     case actionTypes.LOGIN_SUCCESS:
     case actionTypes.REGISTER_SUCCESS:
-      localStorage.setItem('token', action.payload.token);
       return {
         ...state,
         loading: false,
@@ -64,7 +64,7 @@ const authReducer = (state, action) => {
     case actionTypes.LOGIN_FAILURE:
     case actionTypes.REGISTER_FAILURE:
     case actionTypes.LOAD_USER_FAILURE:
-      localStorage.removeItem('token');
+      clearTokens();
       return {
         ...state,
         loading: false,
@@ -75,7 +75,7 @@ const authReducer = (state, action) => {
       };
     
     case actionTypes.LOGOUT:
-      localStorage.removeItem('token');
+      clearTokens();
       return {
         ...state,
         isAuthenticated: false,
@@ -122,7 +122,7 @@ export const AuthProvider = ({ children }) => {
       });
       
       const { access_token } = response.data;
-      axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+      storeTokens(response.data);
       
       // Load user data after successful login
       const userResponse = await axios.get(`${BACKEND_URL}/api/auth/me`);
@@ -153,7 +153,7 @@ export const AuthProvider = ({ children }) => {
       const response = await axios.post(`${BACKEND_URL}/api/auth/register`, userData);
       
       const { access_token } = response.data;
-      axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+      storeTokens(response.data);
       
       // Load user data after successful registration
       const userResponse = await axios.get(`${BACKEND_URL}/api/auth/me`);
@@ -211,7 +211,11 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
-    delete axios.defaults.headers.common['Authorization'];
+    // Ends the session server-side too, so its refresh token stops working
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      axios.post(`${BACKEND_URL}/api/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
     dispatch({ type: actionTypes.LOGOUT });
   };
 
@@ -10,7 +10,11 @@ const AccountPage = () => {
   
   const [activeTab, setActiveTab] = useState('login');
   const [orders, setOrders] = useState([]);
+  const [ordersCursor, setOrdersCursor] = useState(null);
   const [loadingOrders, setLoadingOrders] = useState(false);
+  // Full orders fetched on demand, keyed by id; the history list only has summaries
+  const [orderDetails, setOrderDetails] = useState({});
+  const [expandedOrderId, setExpandedOrderId] = useState(null);
   
   // Form states
   const [loginForm, setLoginForm] = useState({
@@ -75,11 +79,12 @@ const AccountPage = () => {
     });
   };
 
-  const loadOrders = async () => {
+  const loadOrders = async (cursor = null) => {
     setLoadingOrders(true);
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/orders`);
-      setOrders(response.data);
+      const response = await axios.get(`${BACKEND_URL}/api/orders`, { params: cursor ? { cursor } : {} });
+      setOrders(prev => (cursor ? [...prev, ...response.data] : response.data));
+      setOrdersCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error('Error loading orders:', error);
     } finally {
@@ -87,6 +92,22 @@ const AccountPage = () => {
     }
   };
 
+  const toggleOrderDetails = async (orderId) => {
+    if (expandedOrderId === orderId) {
+      setExpandedOrderId(null);
+      return;
+    }
+    setExpandedOrderId(orderId);
+    if (!orderDetails[orderId]) {
+      try {
+        const response = await axios.get(`${BACKEND_URL}/api/orders/${orderId}`);
+        setOrderDetails(prev => ({ ...prev, [orderId]: response.data }));
+      } catch (error) {
+        console.error('Error loading order:', error);
+      }
+    }
+  };
+
   const validateLoginForm = () => {
     const errors = {};
     
@@ -694,7 +715,7 @@ const AccountPage = () => {
             {/* Orders Tab */}
             {activeTab === 'orders' && (
               <div className="max-w-4xl mx-auto">
-                {loadingOrders ? (
+                {loadingOrders && orders.length === 0 ? (
                   <div className="text-center py-8 sm:py-12">
                     <div className="text-luxury-gold text-3xl sm:text-4xl mb-3 sm:mb-4 animate-pulse">📦</div>
                     <p className="text-soft-gold text-sm sm:text-base">Đang tải lịch sử đơn hàng...</p>
@@ -718,7 +739,7 @@ const AccountPage = () => {
                 ) : (
                   <div className="space-y-4 sm:space-y-6">
                     <h2 className="font-luxury text-xl sm:text-2xl font-bold text-luxury-gold mb-4 sm:mb-6">
-                      Lịch Sử Đơn Hàng ({orders.length})
+                      Lịch Sử Đơn Hàng
                     </h2>
                     
                     {orders.map((order) => (
@@ -736,44 +757,77 @@ const AccountPage = () => {
                             <p className={`font-medium text-sm sm:text-base ${getStatusColor(order.status)}`}>
                               {getStatusText(order.status)}
                             </p>
-                            <p className="text-soft-gold text-xs sm:text-sm">
-                              {getPaymentMethodText(order.payment_method)}
+                            <p className="font-luxury text-base sm:text-lg font-bold text-luxury-gold">
+                              {formatPrice(order.total_amount)}
                             </p>
                           </div>
                         </div>
                         
-                        <div className="space-y-1 sm:space-y-2 mb-3 sm:mb-4">
-                          {order.items.map((item, index) => (
-                            <div key={index} className="flex justify-between text-soft-gold text-xs sm:text-sm">
-                              <span>{item.name} x{item.quantity}</span>
-                              <span>{formatPrice(item.subtotal)}</span>
-                            </div>
-                          ))}
+                        <div className="flex justify-between items-center text-soft-gold text-xs sm:text-sm">
+                          <span>{order.item_count} sản phẩm</span>
+                          <button
+                            onClick={() => toggleOrderDetails(order.id)}
+                            className="text-luxury-gold hover:underline"
+                          >
+                            {expandedOrderId === order.id ? 'Ẩn chi tiết' : 'Xem chi tiết'}
+                          </button>
                         </div>
                         
-                        <div className="border-t border-luxury-gold/20 pt-3 sm:pt-4">
-                          <div className="flex justify-between items-center">
-                            <div className="text-soft-gold text-xs sm:text-sm">
-                              <p>Tạm tính: {formatPrice(order.subtotal)}</p>
-                              <p>Vận chuyển: {formatPrice(order.shipping_fee)}</p>
-                            </div>
-                            <div className="text-right">
-                              <p className="font-luxury text-base sm:text-lg font-bold text-luxury-gold">
-                                Tổng: {formatPrice(order.total_amount)}
+                        {expandedOrderId === order.id && (
+                          !orderDetails[order.id] ? (
+                            <p className="text-soft-gold text-xs sm:text-sm mt-3 sm:mt-4 animate-pulse">Đang tải...</p>
+                          ) : (
+                            <div className="mt-3 sm:mt-4">
+                              <p className="text-soft-gold text-xs sm:text-sm mb-2">
+                                {getPaymentMethodText(orderDetails[order.id].payment_method)}
                               </p>
+                              <div className="space-y-1 sm:space-y-2 mb-3 sm:mb-4">
+                                {orderDetails[order.id].items.map((item, index) => (
+                                  <div key={index} className="flex justify-between text-soft-gold text-xs sm:text-sm">
+                                    <span>{item.name} x{item.quantity}</span>
+                                    <span>{formatPrice(item.subtotal)}</span>
+                                  </div>
+                                ))}
+                              </div>
+                              
+                              <div className="border-t border-luxury-gold/20 pt-3 sm:pt-4">
+                                <div className="flex justify-between items-center">
+                                  <div className="text-soft-gold text-xs sm:text-sm">
+                                    <p>Tạm tính: {formatPrice(orderDetails[order.id].subtotal)}</p>
+                                    <p>Vận chuyển: {formatPrice(orderDetails[order.id].shipping_fee)}</p>
+                                  </div>
+                                  <div className="text-right">
+                                    <p className="font-luxury text-base sm:text-lg font-bold text-luxury-gold">
+                                      Tổng: {formatPrice(order.total_amount)}
+                                    </p>
+                                  </div>
+                                </div>
+                              </div>
+                              
+                              {orderDetails[order.id].notes && (
+                                <div className="mt-3 sm:mt-4 p-2.5 sm:p-3 bg-deep-black/50 rounded-lg">
+                                  <p className="text-soft-gold text-xs sm:text-sm">
+                                    <strong>Ghi chú:</strong> {orderDetails[order.id].notes}
+                                  </p>
+                                </div>
+                              )}
                             </div>
-                          </div>
-                        </div>
-                        
-                        {order.notes && (
-                          <div className="mt-3 sm:mt-4 p-2.5 sm:p-3 bg-deep-black/50 rounded-lg">
-                            <p className="text-soft-gold text-xs sm:text-sm">
-                              <strong>Ghi chú:</strong> {order.notes}
-                            </p>
-                          </div>
+                          )
                         )}
                       </div>
                     ))}
+                    
+                    {ordersCursor && (
+                      <div className="text-center">
+                        <button
+                          onClick={() => loadOrders(ordersCursor)}
+                          disabled={loadingOrders}
+                          className="border border-luxury-gold/40 text-luxury-gold px-6 py-2 rounded-full text-sm sm:text-base hover:bg-luxury-gold/10 transition-colors disabled:opacity-50"
+                        >
+                          {loadingOrders ? 'Đang tải...' : 'Xem thêm đơn hàng'}
+                        </button>
+                      </div>
+                    )}
                   </div>
                 )}
               </div>
@@ -5,6 +5,7 @@ import { useNotification } from '../context/NotificationContext';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import IonIcon from '../components/IonIcon';
+import { isOutcomeUnknown, newIdempotencyKey, reservationHeaders, sendIdempotent } from '../services/api';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
@@ -26,6 +27,11 @@ const CartPage = () => {
   const [isCheckingOut, setIsCheckingOut] = useState(false);
   const [checkoutMessage, setCheckoutMessage] = useState('');
   const [showCheckout, setShowCheckout] = useState(false);
+  const [reservationId, setReservationId] = useState(null);
+  // Guest holds come with a secret that proves ownership on release and checkout
+  const [reservationToken, setReservationToken] = useState(null);
+  // Kept across attempts whose outcome is unknown so a resubmit cannot double-order
+  const [orderKey, setOrderKey] = useState(null);
   
   // Guest checkout form data
   const [guestInfo, setGuestInfo] = useState({
@@ -75,6 +81,33 @@ const CartPage = () => {
     return null;
   };
 
+  // Hold stock while the customer fills in the checkout form
+  const startCheckout = async () => {
+    setShowCheckout(true);
+    try {
+      const response = await axios.post(`${BACKEND_URL}/api/reservations`, {
+        items: items.map(item => ({ product_id: item.id, quantity: item.quantity }))
+      });
+      setReservationId(response.data.id);
+      setReservationToken(response.data.owner_token || null);
+    } catch (error) {
+      // Checkout still works without a hold; the order itself checks stock
+      setReservationId(null);
+      setReservationToken(null);
+    }
+  };
+
+  const cancelCheckout = async () => {
+    setShowCheckout(false);
+    if (reservationId) {
+      setReservationId(null);
+      setReservationToken(null);
+      axios.delete(`${BACKEND_URL}/api/reservations/${reservationId}`, {
+        headers: reservationHeaders(reservationToken)
+      }).catch(() => {});
+    }
+  };
+
   const handleCheckout = async () => {
     if (items.length === 0) {
       setCheckoutMessage('Giỏ hàng của bạn đang trống');
@@ -112,10 +145,19 @@ const CartPage = () => {
         shipping_address: isGuest && !isAuthenticated ? {
           address: guestInfo.address
         } : {},
-        notes: isGuest && !isAuthenticated ? (guestInfo.note || '') : ''
+        notes: isGuest && !isAuthenticated ? (guestInfo.note || '') : '',
+        reservation_id: reservationId
       };
 
-      const response = await axios.post(`${BACKEND_URL}/api/orders`, orderData);
+      const key = orderKey || newIdempotencyKey();
+      setOrderKey(key);
+      const response = await sendIdempotent(axios, {
+        method: 'post',
+        url: `${BACKEND_URL}/api/orders`,
+        data: orderData,
+        headers: reservationHeaders(reservationToken),
+        timeout: 5000
+      }, key);
       
       // Show success notification
       showOrderSuccess({ orderId: response.data.id });
@@ -136,6 +178,9 @@ const CartPage = () => {
       }
       
       setShowCheckout(false);
+      setReservationId(null);
+      setReservationToken(null);
+      setOrderKey(null);
       
       // Navigate to order success page with order data
       navigate('/order-success', { 
@@ -145,6 +190,10 @@ const CartPage = () => {
       });
       
     } catch (error) {
+      // The server answered, so no order was stored; the next attempt may differ
+      if (!isOutcomeUnknown(error)) {
+        setOrderKey(null);
+      }
       const errorMessage = error.response?.data?.detail || 'Có lỗi xảy ra khi đặt hàng. Vui lòng thử lại.';
       setCheckoutMessage(errorMessage);
       showError(errorMessage);
@@ -303,7 +352,7 @@ const CartPage = () => {
               
               {!showCheckout && (
                 <button
-                  onClick={() => setShowCheckout(true)}
+                  onClick={startCheckout}
                   className="w-full bg-gradient-to-r from-luxury-gold to-luxury-copper text-deep-black px-4 py-2 rounded-lg font-bold hover:shadow-lg hover:shadow-luxury-gold/30 transition-all duration-300 transform hover:scale-[1.02] text-sm flex items-center justify-center space-x-2"
                 >
                   <IonIcon icon="card-outline" size={18} color="#1a1a1a" />
@@ -451,7 +500,7 @@ const CartPage = () => {
 
                 <div className="flex space-x-2">
                   <button
-                    onClick={() => setShowCheckout(false)}
+                    onClick={cancelCheckout}
                     className="flex-1 bg-charcoal border border-luxury-gold/30 text-soft-gold px-3 py-2 rounded-lg font-medium hover:bg-luxury-gold/10 transition-colors text-xs flex items-center justify-center space-x-1"
                   >
                     <IonIcon icon="arrow-back-outline" size={14} />
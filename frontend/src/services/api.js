@@ -24,18 +24,113 @@ api.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+// Access tokens are short-lived. On a 401 the refresh token is exchanged
+// once for a new pair, shared by every request that failed meanwhile, and
+// the request is retried; only when that fails is the user signed out.
+let refreshing = null;
+
+export const storeTokens = ({ access_token, refresh_token }) => {
+  localStorage.setItem('token', access_token);
+  if (refresh_token) {
+    localStorage.setItem('refreshToken', refresh_token);
+  }
+  axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+};
+
+export const clearTokens = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem('refreshToken');
+  delete axios.defaults.headers.common['Authorization'];
+};
+
+export const refreshAccessToken = () => {
+  const refreshToken = localStorage.getItem('refreshToken');
+  if (!refreshToken) {
+    return Promise.reject(new Error('No refresh token'));
+  }
+  if (!refreshing) {
+    // A bare request, so a 401 here does not re-enter the interceptors
+    refreshing = axios
+      .create()
+      .post(`${BACKEND_URL}/api/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        storeTokens(response.data);
+        return response.data.access_token;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
+const isAuthRequest = (config) => /\/api\/auth\/(login|register|refresh|logout)/.test(config?.url || '');
+
+export const retryWithRefresh = async (client, error) => {
+  const { config } = error;
+  if (error.response?.status !== 401 || !config || config._refreshed || isAuthRequest(config)) {
+    throw error;
+  }
+  const token = await refreshAccessToken();
+  return client.request({
+    ...config,
+    _refreshed: true,
+    headers: { ...config.headers, Authorization: `Bearer ${token}` },
+  });
+};
+
 // Response interceptor for error handling
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
-    if (error.response?.status === 401) {
-      localStorage.removeItem('token');
-      window.location.href = '/account';
+  async (error) => {
+    try {
+      return await retryWithRefresh(api, error);
+    } catch (finalError) {
+      const signedOut = error.response?.status === 401 &&
+        (finalError.response?.status === 401 || !localStorage.getItem('refreshToken'));
+      if (signedOut) {
+        clearTokens();
+        window.location.href = '/account';
+      }
+      throw finalError;
     }
-    return Promise.reject(error);
   }
 );
 
+// Pages and the auth context call the global axios directly
+axios.interceptors.response.use(
+  (response) => response,
+  (error) => retryWithRefresh(axios, error)
+);
+
+// Guests prove they own a checkout hold with the owner_token it was placed with
+export const reservationHeaders = (ownerToken) => (ownerToken ? { 'X-Reservation-Token': ownerToken } : {});
+
+// Non-idempotent writes carry an Idempotency-Key and are retried with the
+// same key on timeouts, network errors and 5xx; the server runs them once.
+const RETRY_DELAYS_MS = [250, 1000, 3000];
+
+export const newIdempotencyKey = () =>
+  window.crypto?.randomUUID?.() ||
+  `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+
+// True when the request may or may not have reached the server
+export const isOutcomeUnknown = (error) => !error.response || error.response.status >= 500;
+
+export const sendIdempotent = async (client, config, key = newIdempotencyKey()) => {
+  const headers = { ...config.headers, 'Idempotency-Key': key };
+  for (let attempt = 0; ; attempt += 1) {
+    try {
+      return await client.request({ ...config, headers });
+    } catch (error) {
+      if (!isOutcomeUnknown(error) || attempt >= RETRY_DELAYS_MS.length) {
+        throw error;
+      }
+      await new Promise((resolve) => setTimeout(resolve, RETRY_DELAYS_MS[attempt]));
+    }
+  }
+};
+
 // Raw API functions
 const rawAPI = {
   // Products
@@ -44,6 +139,15 @@ const rawAPI = {
     return response.data;
   },
 
+  // Cursor-paginated products for infinite scroll; pass nextCursor back as params.cursor
+  getProductsPage: async (params = {}) => {
+    const response = await api.get('/api/products', { params });
+    return {
+      items: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null,
+    };
+  },
+
   getProductById: async (id) => {
     const response = await api.get(`/api/products/${id}`);
     return response.data;
@@ -64,7 +168,7 @@ const rawAPI = {
 
   // Cart operations
   addToCart: async (data) => {
-    const response = await api.post('/api/cart/add', data);
+    const response = await sendIdempotent(api, { method: 'post', url: '/api/cart/add', data });
     return response.data;
   },
 
@@ -74,28 +178,71 @@ const rawAPI = {
   },
 
   updateCartItem: async (productId, data) => {
-    const response = await api.put(`/api/cart/item/${productId}`, data);
+    const response = await sendIdempotent(api, { method: 'put', url: `/api/cart/item/${productId}`, data });
     return response.data;
   },
 
   removeFromCart: async (productId) => {
-    const response = await api.delete(`/api/cart/item/${productId}`);
+    const response = await sendIdempotent(api, { method: 'delete', url: `/api/cart/item/${productId}` });
+    return response.data;
+  },
+
+  // Apply several add/update/remove operations in one request
+  batchUpdateCart: async (operations) => {
+    const response = await sendIdempotent(api, { method: 'patch', url: '/api/cart', data: { operations } });
     return response.data;
   },
 
   clearCart: async () => {
-    const response = await api.delete('/api/cart');
+    const response = await sendIdempotent(api, { method: 'delete', url: '/api/cart' });
+    return response.data;
+  },
+
+  // Checkout stock holds
+  placeReservation: async (items) => {
+    const response = await api.post('/api/reservations', { items });
+    return response.data;
+  },
+
+  extendReservation: async (reservationId, ownerToken) => {
+    const response = await api.post(`/api/reservations/${reservationId}/extend`, null, {
+      headers: reservationHeaders(ownerToken)
+    });
+    return response.data;
+  },
+
+  releaseReservation: async (reservationId, ownerToken) => {
+    const response = await api.delete(`/api/reservations/${reservationId}`, {
+      headers: reservationHeaders(ownerToken)
+    });
+    return response.data;
+  },
+
+  getProductAvailability: async (productId) => {
+    const response = await api.get(`/api/products/${productId}/availability`);
     return response.data;
   },
 
   // Orders
-  createOrder: async (data) => {
-    const response = await api.post('/api/orders', data);
+  // Short timeout: a slow attempt is retried under the same key, not duplicated
+  createOrder: async (data, idempotencyKey) => {
+    const response = await sendIdempotent(
+      api, { method: 'post', url: '/api/orders', data, timeout: 5000 }, idempotencyKey
+    );
     return response.data;
   },
 
-  getOrders: async () => {
-    const response = await api.get('/api/orders');
+  // One page of order summaries, newest first; pass nextCursor back as cursor
+  getOrders: async (cursor = null) => {
+    const response = await api.get('/api/orders', { params: cursor ? { cursor } : {} });
+    return {
+      items: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null,
+    };
+  },
+
+  getOrderById: async (orderId) => {
+    const response = await api.get(`/api/orders/${orderId}`);
     return response.data;
   },
 
@@ -110,6 +257,11 @@ const rawAPI = {
     return response.data;
   },
 
+  logout: async (refreshToken) => {
+    const response = await api.post('/api/auth/logout', { refresh_token: refreshToken });
+    return response.data;
+  },
+
   getProfile: async () => {
     const response = await api.get('/api/auth/me');
     return response.data;
@@ -134,7 +286,8 @@ const cacheKeys = {
   categories: () => 'categories',
   search: (query, params) => `search_${query}_${JSON.stringify(params)}`,
   cart: () => 'cart',
-  orders: () => 'orders',
+  orders: (cursor) => `orders_${cursor || ''}`,
+  order: (id) => `order_${id}`,
   profile: () => 'profile',
 };
 
@@ -180,6 +333,12 @@ const cachedAPI = {
     300000
   ),
 
+  getOrderById: withCache(
+    rawAPI.getOrderById,
+    cacheKeys.order,
+    300000
+  ),
+
   // Profile - cached for 5 minutes
   getProfile: withCache(
     rawAPI.getProfile,
@@ -187,12 +346,20 @@ const cachedAPI = {
     300000
   ),
 
+  // Cursor pages are not cached; each cursor is only requested once
+  getProductsPage: rawAPI.getProductsPage,
+
   // Non-cached operations (mutations)
   addToCart: rawAPI.addToCart,
   updateCartItem: rawAPI.updateCartItem,
   removeFromCart: rawAPI.removeFromCart,
+  batchUpdateCart: rawAPI.batchUpdateCart,
   clearCart: rawAPI.clearCart,
   createOrder: rawAPI.createOrder,
+  placeReservation: rawAPI.placeReservation,
+  extendReservation: rawAPI.extendReservation,
+  releaseReservation: rawAPI.releaseReservation,
+  getProductAvailability: rawAPI.getProductAvailability,
   register: rawAPI.register,
   login: rawAPI.login,
   updateProfile: rawAPI.updateProfile,
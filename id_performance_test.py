@@ -0,0 +1,105 @@
+"""Benchmark insert throughput and index size for each document id format.
+
+Inserts the same order-sized documents into a fresh collection per format,
+with the unique ``id`` index the API declares, and reports inserts/s and the
+size of that index: random UUID4 strings (the old ids), UUIDv7 strings (the
+new default), ULID strings, and UUIDv7 stored as 16-byte binary. Needs a
+MongoDB at MONGO_URL (default localhost); uses a throwaway database that is
+dropped afterwards.
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from pymongo import ASCENDING  # noqa: E402
+
+import ids  # noqa: E402
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = f"id_benchmark_{uuid.uuid4().hex[:8]}"
+DOCUMENTS = 200000
+BATCH_SIZE = 1000
+CONCURRENT_WRITERS = 8
+
+FORMATS = {
+    "uuid4": lambda: str(uuid.uuid4()),
+    "uuid7": lambda: str(ids.uuid7()),
+    "ulid": lambda: ids.ulid(),
+    "uuid7_binary": lambda: ids.to_binary(str(ids.uuid7())),
+}
+
+
+def make_doc(new_id):
+    return {
+        "id": new_id(),
+        "user_id": str(uuid.uuid4()),
+        "status": "pending",
+        "total_amount": 3930000.0,
+        "created_at": datetime.utcnow(),
+    }
+
+
+async def test_format(db, name, new_id):
+    """CONCURRENT_WRITERS coroutines insert DOCUMENTS documents in BATCH_SIZE batches"""
+    print(f"\n=== {name}: {DOCUMENTS} inserts ===")
+    collection = db[f"orders_{name}"]
+    await collection.create_index([("id", ASCENDING)], name="id_unique", unique=True)
+    remaining = DOCUMENTS // BATCH_SIZE
+
+    async def writer():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await collection.insert_many([make_doc(new_id) for _ in range(BATCH_SIZE)], ordered=False)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(CONCURRENT_WRITERS)))
+    elapsed = time.perf_counter() - start
+
+    stats = await db.command("collStats", collection.name)
+    index_bytes = stats["indexSizes"]["id_unique"]
+
+    # Newest documents by id: a range scan at the right edge only for time-ordered ids
+    start = time.perf_counter()
+    await collection.find({}, {"_id": 0, "id": 1}).sort("id", -1).limit(20).to_list(20)
+    latest_ms = (time.perf_counter() - start) * 1000
+
+    throughput = DOCUMENTS / elapsed
+    print(f"  Throughput: {throughput:.0f} inserts/s in {elapsed:.2f}s")
+    print(f"  id index: {index_bytes / 1024 / 1024:.2f} MiB ({index_bytes / DOCUMENTS:.1f} bytes/document)")
+    print(f"  Latest 20 by id: {latest_ms:.2f} ms")
+    return {"throughput": throughput, "index_bytes": index_bytes}
+
+
+async def run_benchmarks():
+    print("\n======= STARTING ID FORMAT BENCHMARK =======")
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    try:
+        results = {name: await test_format(db, name, new_id) for name, new_id in FORMATS.items()}
+    finally:
+        await client.drop_database(DB_NAME)
+        client.close()
+
+    print("\n======= ID FORMAT BENCHMARK SUMMARY =======")
+    baseline = results["uuid4"]
+    for name, result in results.items():
+        print(f"{name}: {result['throughput']:.0f} inserts/s "
+              f"({result['throughput'] / baseline['throughput']:.2f}x), "
+              f"id index {result['index_bytes'] / baseline['index_bytes']:.2f}x the uuid4 size")
+    faster = results["uuid7"]["throughput"] >= baseline["throughput"]
+    smaller = results["uuid7_binary"]["index_bytes"] < baseline["index_bytes"]
+    print(f"{'✅' if faster else '❌'} UUIDv7 strings insert at least as fast as UUID4")
+    print(f"{'✅' if smaller else '❌'} Binary UUIDv7 index is smaller than the UUID4 string index")
+    return faster and smaller
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run_benchmarks()) else 1)
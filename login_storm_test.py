@@ -0,0 +1,148 @@
+import requests
+import os
+import asyncio
+import time
+import statistics
+import sys
+import threading
+import concurrent.futures
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from passwords import LEGACY, SCHEMES, PasswordHasher  # noqa: E402
+
+# Backend URL from frontend/.env
+BACKEND_URL = "https://becea3af-8c73-4a75-951c-2aadc73d9709.preview.emergentagent.com"
+API_BASE_URL = f"{BACKEND_URL}/api"
+# Shared admin token configured on the server as ADMIN_TOKEN, needed for /metrics
+ADMIN_HEADERS = {"X-Admin-Token": os.environ.get("ADMIN_TOKEN", "")}
+
+# Load test: run against a server with RATE_LIMITS_ENABLED=0 (or RATE_LIMITS raised for
+# /auth/login), or most requests will be answered 429 by the per-IP limits
+
+STORM_LOGINS = 300
+LOGIN_WORKERS = 50
+CATALOG_REQUESTS = 200
+# Catalog p99 during the storm may grow by at most this factor over the quiet baseline
+MAX_P99_RATIO = 2.0
+
+TEST_USER = {
+    "email": f"login.storm.{datetime.now().strftime('%Y%m%d%H%M%S%f')}@example.com",
+    "password": "Storm@123456",
+    "full_name": "Login Storm",
+    "phone": "0912345678",
+}
+
+def p99(times):
+    return sorted(times)[int(len(times) * 0.99) - 1]
+
+def measure_catalog(stop=None):
+    """GET /products CATALOG_REQUESTS times (or until stop is set); returns latencies in ms"""
+    times = []
+    with requests.Session() as session:
+        for _ in range(CATALOG_REQUESTS):
+            if stop is not None and stop.is_set():
+                break
+            start_time = time.time()
+            response = session.get(f"{API_BASE_URL}/products", params={"limit": 20}, timeout=30)
+            response.raise_for_status()
+            times.append((time.time() - start_time) * 1000)
+    return times
+
+def login():
+    start_time = time.time()
+    response = requests.post(f"{API_BASE_URL}/auth/login", timeout=60,
+                             json={"email": TEST_USER["email"], "password": TEST_USER["password"]})
+    return response.status_code, (time.time() - start_time) * 1000
+
+def test_login_storm():
+    """Catalog p99 stays within MAX_P99_RATIO of its baseline while STORM_LOGINS logins run"""
+    print(f"\n=== Catalog latency during {STORM_LOGINS} concurrent logins ===")
+    baseline = measure_catalog()
+    print(f"Baseline catalog: avg {statistics.mean(baseline):.2f} ms, p99 {p99(baseline):.2f} ms")
+
+    stop = threading.Event()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=LOGIN_WORKERS + 1) as executor:
+        catalog = executor.submit(measure_catalog, stop)
+        start_time = time.time()
+        logins = list(executor.map(lambda _: login(), range(STORM_LOGINS)))
+        elapsed = time.time() - start_time
+        stop.set()
+        during = catalog.result()
+
+    statuses = {}
+    for code, _ in logins:
+        statuses[code] = statuses.get(code, 0) + 1
+    login_times = [ms for _, ms in logins]
+    print(f"Logins: {STORM_LOGINS / elapsed:.1f}/s, statuses {statuses}, "
+          f"avg {statistics.mean(login_times):.2f} ms, p99 {p99(login_times):.2f} ms")
+    print(f"Catalog during storm: {len(during)} requests, avg {statistics.mean(during):.2f} ms, "
+          f"p99 {p99(during):.2f} ms")
+
+    ratio = p99(during) / p99(baseline)
+    # 503 is the hasher shedding load, which is allowed; anything else is not
+    logins_ok = set(statuses) <= {200, 503} and statuses.get(200, 0) > 0
+    passed = ratio <= MAX_P99_RATIO and logins_ok
+    print(f"{'✅' if ratio <= MAX_P99_RATIO else '❌'} Catalog p99 grew {ratio:.2f}x (limit {MAX_P99_RATIO}x)")
+    print(f"{'✅' if logins_ok else '❌'} Logins answered with 200 (or 503 when shedding load)")
+    return passed
+
+def test_hashing_metrics():
+    """/metrics reports the password hasher and its counters moved"""
+    print("\n=== Password hashing metrics ===")
+    metrics = requests.get(f"{API_BASE_URL}/metrics", headers=ADMIN_HEADERS, timeout=30).json()["password_hashing"]
+    print(metrics)
+    passed = metrics["hashed"] >= 1 and metrics["verified"] >= 1 and metrics["scheme"] in ("argon2", "bcrypt")
+    print(f"{'✅' if passed else '❌'} {metrics['scheme']} with {metrics['workers']} worker(s), "
+          f"avg {metrics['avg_hash_ms']} ms per hash, {metrics['rejected']} rejected")
+    return passed
+
+async def check_scheme(scheme):
+    """Hash and verify with ``scheme``; hashes of the other schemes verify and get replaced"""
+    hasher = PasswordHasher(scheme)
+    try:
+        # Longer than bcrypt's 72-byte limit, which newer bcrypt releases reject under passlib
+        password = TEST_USER["password"] * 8
+        hashed = await hasher.hash(password)
+        ok = hasher.context.identify(hashed) == scheme and await hasher.verify(password, hashed) == (True, None)
+        ok = ok and (await hasher.verify("wrong-password", hashed))[0] is False
+        for other in (*SCHEMES, LEGACY):
+            if other != scheme:
+                matches, replacement = await hasher.verify(password, hasher.context.handler(other).hash(password))
+                ok = ok and matches and hasher.context.identify(replacement) == scheme
+        return ok
+    finally:
+        hasher.shutdown()
+
+def test_password_schemes():
+    """Every configurable scheme hashes and verifies in this environment"""
+    print("\n=== Password schemes ===")
+    passed = True
+    for scheme in SCHEMES:
+        try:
+            ok = asyncio.run(check_scheme(scheme))
+        except Exception as e:
+            print(f"  {scheme}: {type(e).__name__}: {e}")
+            ok = False
+        print(f"{'✅' if ok else '❌'} {scheme} hashes, verifies and upgrades other hashes")
+        passed = passed and ok
+    return passed
+
+def run_tests():
+    print("\n======= STARTING LOGIN STORM TESTS =======\n")
+    schemes_ok = test_password_schemes()
+    response = requests.post(f"{API_BASE_URL}/auth/register", json=TEST_USER, timeout=60)
+    response.raise_for_status()
+    results = {"password_schemes": schemes_ok, "login_storm": test_login_storm(),
+               "hashing_metrics": test_hashing_metrics()}
+
+    print("\n======= LOGIN STORM TEST SUMMARY =======")
+    for name, passed in results.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+    print("\n======= LOGIN STORM TESTS COMPLETED =======")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests() else 1)
@@ -0,0 +1,110 @@
+"""Benchmark order insert throughput: one insert_one per order vs group commit.
+
+Drives backend/intake.py directly against MongoDB with many concurrent
+"checkouts", each inserting one order document, first with a plain
+``insert_one`` per order and then through GroupCommitWriter. Needs a
+MongoDB at MONGO_URL (default localhost); uses a throwaway database that is
+dropped afterwards.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from indexes import ensure_indexes  # noqa: E402
+from intake import GroupCommitWriter  # noqa: E402
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = f"order_intake_benchmark_{uuid.uuid4().hex[:8]}"
+CONCURRENT_CHECKOUTS = 500
+ORDERS = 10000
+
+
+def make_order_doc(i):
+    items = [
+        {"product_id": str(uuid.uuid4()), "size": None, "quantity": 2, "price": 650000.0, "name": f"Nhang {n}",
+         "image_url": "https://images.unsplash.com/photo-1652959889888", "subtotal": 1300000.0}
+        for n in range(3)
+    ]
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "order_number": f"ORD-{datetime.utcnow().strftime('%Y%m%d')}-{i:08d}",
+        "items": items,
+        "subtotal": 3900000.0,
+        "shipping_fee": 30000.0,
+        "total_amount": 3930000.0,
+        "payment_method": "cod",
+        "status": "pending",
+        "customer_info": {"full_name": "Nguyễn Văn Test", "phone": "0912345678"},
+        "shipping_address": {"address": "1 Lê Lợi", "city": "Hồ Chí Minh"},
+        "notes": "",
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+async def test_intake(name, insert):
+    """CONCURRENT_CHECKOUTS coroutines insert ORDERS orders in total"""
+    print(f"\n=== {name}: {ORDERS} orders from {CONCURRENT_CHECKOUTS} concurrent checkouts ===")
+    remaining = ORDERS
+    latencies = []
+
+    async def checkout():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            document = make_order_doc(remaining)
+            start = time.perf_counter()
+            await insert(document)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(checkout() for _ in range(CONCURRENT_CHECKOUTS)))
+    elapsed = time.perf_counter() - start
+    throughput = ORDERS / elapsed
+    p95 = sorted(latencies)[int(len(latencies) * 0.95)]
+    print(f"  Throughput: {throughput:.0f} orders/s in {elapsed:.2f}s")
+    print(f"  Latency: avg {statistics.mean(latencies):.2f} ms, p95 {p95:.2f} ms")
+    return {"throughput": throughput, "p95": p95}
+
+
+async def run_benchmarks():
+    print("\n======= STARTING ORDER INTAKE BENCHMARK =======")
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    try:
+        await ensure_indexes(db)
+        results = {"insert_one": await test_intake("insert_one per order", db.orders.insert_one)}
+
+        writer = GroupCommitWriter(db.orders)
+        writer.start()
+        results["group_commit"] = await test_intake("group commit", writer.insert)
+        await writer.stop()
+        print(f"  Batches: {writer.stats()}")
+
+        stored = await db.orders.count_documents({})
+    finally:
+        await client.drop_database(DB_NAME)
+        client.close()
+
+    print("\n======= ORDER INTAKE BENCHMARK SUMMARY =======")
+    for name, result in results.items():
+        print(f"{name}: {result['throughput']:.0f} orders/s, p95 {result['p95']:.2f} ms")
+    speedup = results["group_commit"]["throughput"] / results["insert_one"]["throughput"]
+    complete = stored == ORDERS * 2
+    print(f"{'✅' if speedup > 1 else '❌'} Group commit: {speedup:.1f}x the insert_one throughput")
+    print(f"{'✅' if complete else '❌'} {stored} of {ORDERS * 2} orders stored")
+    return complete
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run_benchmarks()) else 1)
@@ -0,0 +1,83 @@
+import requests
+import os
+import time
+import sys
+import concurrent.futures
+
+# Backend URL from frontend/.env
+BACKEND_URL = "https://becea3af-8c73-4a75-951c-2aadc73d9709.preview.emergentagent.com"
+API_BASE_URL = f"{BACKEND_URL}/api"
+# Shared admin token configured on the server as ADMIN_TOKEN, needed for /metrics
+ADMIN_HEADERS = {"X-Admin-Token": os.environ.get("ADMIN_TOKEN", "")}
+
+# More than the default burst of each limited route
+LOGIN_ATTEMPTS = 40
+SEARCH_REQUESTS = 200
+MAX_WORKERS = 20
+
+def hammer(request, count):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        return list(executor.map(lambda _: request(), range(count)))
+
+def summarize(responses):
+    statuses = {}
+    for response in responses:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    return statuses
+
+def test_login_limit():
+    """Repeated failed logins from one client are cut off with 429 and Retry-After"""
+    print(f"\n=== {LOGIN_ATTEMPTS} failed logins from one client ===")
+    credentials = {"email": "nobody.rate.limit@example.com", "password": "wrong-password"}
+    responses = hammer(lambda: requests.post(f"{API_BASE_URL}/auth/login", json=credentials, timeout=60),
+                       LOGIN_ATTEMPTS)
+    statuses = summarize(responses)
+    limited = [response for response in responses if response.status_code == 429]
+    retry_after = [int(response.headers.get("Retry-After", 0)) for response in limited]
+    passed = bool(limited) and all(seconds >= 1 for seconds in retry_after) and set(statuses) <= {401, 429}
+    print(f"Status codes: {statuses}")
+    print(f"{'✅' if passed else '❌'} Limited with Retry-After of {min(retry_after, default=0)}-"
+          f"{max(retry_after, default=0)} s")
+    return passed
+
+def test_search_limit():
+    """Plain product listing is never limited; regex search is"""
+    print(f"\n=== {SEARCH_REQUESTS} searches and {SEARCH_REQUESTS} listings ===")
+    searches = hammer(lambda: requests.get(f"{API_BASE_URL}/products", params={"search": "trầm"}, timeout=30),
+                      SEARCH_REQUESTS)
+    listings = hammer(lambda: requests.get(f"{API_BASE_URL}/products", params={"limit": 5}, timeout=30),
+                      SEARCH_REQUESTS)
+    search_statuses, listing_statuses = summarize(searches), summarize(listings)
+    passed = search_statuses.get(429, 0) > 0 and listing_statuses == {200: SEARCH_REQUESTS}
+    print(f"Search: {search_statuses}, listing: {listing_statuses}")
+    print(f"{'✅' if passed else '❌'} Only searches were limited")
+    return passed
+
+def test_limiter_metrics():
+    """/metrics counts limited requests per route"""
+    print("\n=== Rate limiter metrics ===")
+    metrics = requests.get(f"{API_BASE_URL}/metrics", headers=ADMIN_HEADERS, timeout=30).json()["rate_limits"]
+    print(metrics)
+    limited = metrics["routes"]["POST /api/auth/login"]["limited"]
+    passed = limited > 0
+    print(f"{'✅' if passed else '❌'} {limited} limited logins reported by the {metrics['backend']}")
+    return passed
+
+def run_tests():
+    print("\n======= STARTING RATE LIMIT TESTS =======\n")
+    results = {
+        "login_limit": test_login_limit(),
+        "search_limit": test_search_limit(),
+        "limiter_metrics": test_limiter_metrics(),
+    }
+    # Let the buckets refill so other suites run against this server are not limited
+    time.sleep(60)
+
+    print("\n======= RATE LIMIT TEST SUMMARY =======")
+    for name, passed in results.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+    print("\n======= RATE LIMIT TESTS COMPLETED =======")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests() else 1)
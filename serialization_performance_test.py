@@ -0,0 +1,133 @@
+"""Benchmark per-request CPU spent turning MongoDB documents into JSON.
+
+Compares the previous read path (``Model(**doc)`` followed by FastAPI's
+response_model validation and serialization) with the fast path in
+backend/serialization.py (``model_construct`` + orjson). Runs in-process,
+no server or database needed.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import server  # noqa: E402
+from serialization import model_response  # noqa: E402
+
+ITERATIONS = 200
+
+
+def make_product_doc(i):
+    return {
+        "_id": uuid.uuid4().hex[:24],
+        "id": str(uuid.uuid4()),
+        "name": f"Vòng Trầm Hương {i}",
+        "description": "Vòng tay trầm hương nguyên chất từ Khánh Hòa, mang lại may mắn và bình an. " * 2,
+        "price": 2200000.0,
+        "original_price": 3000000.0,
+        "category": "Vòng Tay",
+        "image_url": "https://images.unsplash.com/photo-1662473217799-6e7288f19741",
+        "images": [f"https://images.unsplash.com/photo-{n}" for n in range(10)],
+        "variations": [
+            {"size": f"{size}mm", "price": 2200000.0 + size, "original_price": 2800000.0, "stock_quantity": 10}
+            for size in (6, 8, 10, 12)
+        ],
+        "in_stock": True,
+        "stock_quantity": 26,
+        "featured": True,
+        "rating": 4.8,
+        "reviews_count": 24,
+        "tags": ["trầm hương", "vòng tay", "may mắn", "cao cấp"],
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def make_order_doc(i):
+    items = [
+        {"product_id": str(uuid.uuid4()), "quantity": 2, "price": 650000.0, "name": f"Nhang {n}",
+         "image_url": "https://images.unsplash.com/photo-1652959889888", "subtotal": 1300000.0}
+        for n in range(3)
+    ]
+    return {
+        "_id": uuid.uuid4().hex[:24],
+        "id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "order_number": f"ORD-20250101-{i:08d}",
+        "items": items,
+        "subtotal": 3900000.0,
+        "shipping_fee": 30000.0,
+        "total_amount": 3930000.0,
+        "payment_method": "cod",
+        "status": "pending",
+        "customer_info": {"full_name": "Nguyễn Văn Test", "phone": "0912345678", "email": "test@example.com"},
+        "shipping_address": {"address": "1 Lê Lợi", "city": "Hồ Chí Minh", "district": "Quận 1"},
+        "notes": "",
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def time_per_request(func, iterations=ITERATIONS):
+    samples = []
+    for _ in range(iterations):
+        start = time.process_time()
+        func()
+        samples.append((time.process_time() - start) * 1000)
+    return statistics.mean(samples)
+
+
+def test_serialization(name, model, docs):
+    """Compare CPU per request for one list endpoint shape"""
+    print(f"\n=== {name}: {len(docs)} documents per response ===")
+    field = create_response_field(name=f"Response_{name}", type_=List[model])
+    loop = asyncio.new_event_loop()
+
+    def legacy_path():
+        content = [model(**doc) for doc in docs]
+        value = loop.run_until_complete(serialize_response(field=field, response_content=content, is_coroutine=True))
+        return JSONResponse(value).body
+
+    def fast_path():
+        return model_response(model, docs).body
+
+    legacy_ms = time_per_request(legacy_path)
+    fast_ms = time_per_request(fast_path)
+    loop.close()
+
+    saving = (legacy_ms - fast_ms) / legacy_ms * 100
+    print(f"  Model(**doc) + response_model: {legacy_ms:.3f} ms CPU/request")
+    print(f"  model_construct + orjson:      {fast_ms:.3f} ms CPU/request")
+    status = "✅" if saving > 0 else "❌"
+    print(f"{status} CPU saving: {saving:.1f}% ({legacy_ms / fast_ms:.1f}x)")
+    return {"legacy_ms": legacy_ms, "fast_ms": fast_ms, "saving": saving}
+
+
+def run_benchmarks():
+    print("\n======= STARTING SERIALIZATION BENCHMARK =======")
+    results = {}
+    for size in (20, 100):
+        results[f"products_{size}"] = test_serialization(
+            f"products_{size}", server.Product, [make_product_doc(i) for i in range(size)])
+    results["orders_100"] = test_serialization("orders_100", server.Order, [make_order_doc(i) for i in range(100)])
+
+    print("\n======= SERIALIZATION BENCHMARK SUMMARY =======")
+    for name, result in results.items():
+        print(f"{name}: {result['legacy_ms']:.3f} ms -> {result['fast_ms']:.3f} ms ({result['saving']:.1f}% less CPU)")
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmarks()
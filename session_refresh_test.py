@@ -0,0 +1,107 @@
+import requests
+import time
+import statistics
+import sys
+from datetime import datetime
+
+# Backend URL from frontend/.env
+BACKEND_URL = "https://becea3af-8c73-4a75-951c-2aadc73d9709.preview.emergentagent.com"
+API_BASE_URL = f"{BACKEND_URL}/api"
+
+# Load test: run against a server with RATE_LIMITS_ENABLED=0 (or RATE_LIMITS raised for
+# /auth/login), or most requests will be answered 429 by the per-IP limits
+
+ITERATIONS = 50
+
+TEST_USER = {
+    "email": f"session.test.{datetime.now().strftime('%Y%m%d%H%M%S%f')}@example.com",
+    "password": "Session@123456",
+    "full_name": "Session Test",
+    "phone": "0912345678",
+}
+
+def post(path, body):
+    start_time = time.time()
+    response = requests.post(f"{API_BASE_URL}{path}", json=body, timeout=30)
+    return response, (time.time() - start_time) * 1000
+
+def me(access_token):
+    return requests.get(f"{API_BASE_URL}/auth/me", timeout=30,
+                        headers={"Authorization": f"Bearer {access_token}"}).status_code
+
+def test_rotation(tokens):
+    """A refresh returns a new pair; the new access token works without a password"""
+    print("\n=== Refresh token rotation ===")
+    response, ms = post("/auth/refresh", {"refresh_token": tokens["refresh_token"]})
+    rotated = response.json() if response.status_code == 200 else {}
+    passed = (response.status_code == 200 and rotated.get("refresh_token") != tokens["refresh_token"]
+              and me(rotated.get("access_token", "")) == 200)
+    print(f"{'✅' if passed else '❌'} Refresh in {ms:.2f} ms returned a working, rotated pair")
+    return passed, rotated
+
+def test_reuse_detection(tokens):
+    """Replaying a refresh token that was already rotated away ends the session"""
+    print("\n=== Reuse of a rotated refresh token ===")
+    rotated = post("/auth/refresh", {"refresh_token": tokens["refresh_token"]})[0].json()
+    # Past the server's grace period for tabs refreshing at the same moment
+    time.sleep(11)
+    replay, _ = post("/auth/refresh", {"refresh_token": tokens["refresh_token"]})
+    after, _ = post("/auth/refresh", {"refresh_token": rotated["refresh_token"]})
+    passed = replay.status_code == 401 and after.status_code == 401
+    print(f"{'✅' if passed else '❌'} Replay refused ({replay.status_code}) and the session ended "
+          f"({after.status_code} for the current token)")
+    return passed
+
+def test_logout(tokens):
+    """Logout revokes the refresh token and, once workers sync, its access tokens"""
+    print("\n=== Logout ===")
+    post("/auth/logout", {"refresh_token": tokens["refresh_token"]})
+    refresh, _ = post("/auth/refresh", {"refresh_token": tokens["refresh_token"]})
+    # Other workers learn of the revocation within REVOCATION_SYNC_SECONDS
+    time.sleep(6)
+    access = me(tokens["access_token"])
+    passed = refresh.status_code == 401 and access == 401
+    print(f"{'✅' if passed else '❌'} Refresh after logout: {refresh.status_code}, access token: {access}")
+    return passed
+
+def test_refresh_vs_login():
+    """Refreshing is cheaper than logging in again"""
+    print(f"\n=== {ITERATIONS} logins vs {ITERATIONS} refreshes ===")
+    credentials = {"email": TEST_USER["email"], "password": TEST_USER["password"]}
+    login_times, refresh_times = [], []
+    tokens = post("/auth/login", credentials)[0].json()
+    for _ in range(ITERATIONS):
+        login_times.append(post("/auth/login", credentials)[1])
+        response, ms = post("/auth/refresh", {"refresh_token": tokens["refresh_token"]})
+        tokens = response.json()
+        refresh_times.append(ms)
+    login_avg, refresh_avg = statistics.mean(login_times), statistics.mean(refresh_times)
+    passed = refresh_avg < login_avg
+    print(f"{'✅' if passed else '❌'} Login avg {login_avg:.2f} ms, refresh avg {refresh_avg:.2f} ms "
+          f"({login_avg / refresh_avg:.1f}x)")
+    return passed
+
+def run_tests():
+    print("\n======= STARTING SESSION REFRESH TESTS =======\n")
+    response, _ = post("/auth/register", TEST_USER)
+    response.raise_for_status()
+    registered = response.json()
+    has_refresh = bool(registered.get("refresh_token")) and registered.get("expires_in", 0) > 0
+    print(f"{'✅' if has_refresh else '❌'} Register returned a refresh token, "
+          f"access token valid for {registered.get('expires_in')} s")
+
+    credentials = {"email": TEST_USER["email"], "password": TEST_USER["password"]}
+    results = {"register_tokens": has_refresh}
+    results["rotation"], _ = test_rotation(post("/auth/login", credentials)[0].json())
+    results["reuse_detection"] = test_reuse_detection(post("/auth/login", credentials)[0].json())
+    results["logout"] = test_logout(post("/auth/login", credentials)[0].json())
+    results["refresh_vs_login"] = test_refresh_vs_login()
+
+    print("\n======= SESSION REFRESH TEST SUMMARY =======")
+    for name, passed in results.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+    print("\n======= SESSION REFRESH TESTS COMPLETED =======")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests() else 1)
@@ -0,0 +1,98 @@
+import requests
+import os
+import time
+import statistics
+import sys
+import concurrent.futures
+from datetime import datetime
+
+# Backend URL from frontend/.env
+BACKEND_URL = "https://becea3af-8c73-4a75-951c-2aadc73d9709.preview.emergentagent.com"
+API_BASE_URL = f"{BACKEND_URL}/api"
+# Shared admin token configured on the server as ADMIN_TOKEN, needed for /metrics
+ADMIN_HEADERS = {"X-Admin-Token": os.environ.get("ADMIN_TOKEN", "")}
+
+# Load test: run against a server with RATE_LIMITS_ENABLED=0 (or RATE_LIMITS raised for
+# /auth/register), or most requests will be answered 429 by the per-IP limits
+
+BURST_SIGNUPS = 300
+SAME_EMAIL_SIGNUPS = 50
+AVAILABILITY_CHECKS = 200
+MAX_WORKERS = 50
+
+RUN_ID = datetime.now().strftime('%Y%m%d%H%M%S%f')
+
+def register(email):
+    user = {"email": email, "password": "Burst@123456", "full_name": "Signup Burst", "phone": "0912345678"}
+    start_time = time.time()
+    response = requests.post(f"{API_BASE_URL}/auth/register", json=user, timeout=60)
+    return response.status_code, (time.time() - start_time) * 1000
+
+def count_statuses(results):
+    statuses = {}
+    for code, _ in results:
+        statuses[code] = statuses.get(code, 0) + 1
+    return statuses
+
+def test_signup_burst():
+    """BURST_SIGNUPS concurrent signups with distinct emails all succeed"""
+    print(f"\n=== {BURST_SIGNUPS} concurrent signups, distinct emails ===")
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(executor.map(lambda i: register(f"burst.{RUN_ID}.{i}@example.com"), range(BURST_SIGNUPS)))
+    elapsed = time.time() - start_time
+
+    statuses = count_statuses(results)
+    times = sorted(ms for _, ms in results)
+    passed = statuses.get(200, 0) == BURST_SIGNUPS
+    print(f"Completed in {elapsed:.2f}s ({BURST_SIGNUPS / elapsed:.1f} signups/s), status codes: {statuses}")
+    print(f"Latency: avg {statistics.mean(times):.2f} ms, p95 {times[int(len(times) * 0.95)]:.2f} ms")
+    print(f"{'✅' if passed else '❌'} Every signup succeeded")
+    return passed
+
+def test_same_email_race():
+    """SAME_EMAIL_SIGNUPS concurrent signups with one email create exactly one account"""
+    print(f"\n=== {SAME_EMAIL_SIGNUPS} concurrent signups, one email ===")
+    email = f"race.{RUN_ID}@example.com"
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(executor.map(lambda _: register(email), range(SAME_EMAIL_SIGNUPS)))
+
+    statuses = count_statuses(results)
+    passed = statuses.get(200, 0) == 1 and statuses.get(400, 0) == SAME_EMAIL_SIGNUPS - 1
+    print(f"{'✅' if passed else '❌'} Status codes: {statuses} (expected one 200, the rest 400)")
+    return passed
+
+def test_email_availability():
+    """The availability endpoint tells registered emails from new ones"""
+    print(f"\n=== {AVAILABILITY_CHECKS} availability checks ===")
+    times = []
+    correct = True
+    for i in range(AVAILABILITY_CHECKS):
+        # Alternate between an email from the burst and one never registered
+        email = f"burst.{RUN_ID}.{i}@example.com" if i % 2 else f"unused.{RUN_ID}.{i}@example.com"
+        start_time = time.time()
+        response = requests.get(f"{API_BASE_URL}/auth/email-available", params={"email": email}, timeout=30)
+        times.append((time.time() - start_time) * 1000)
+        correct = correct and response.status_code == 200 and response.json()["available"] == (i % 2 == 0)
+    print(f"Latency: avg {statistics.mean(times):.2f} ms")
+    print(f"{'✅' if correct else '❌'} Registered emails reported taken, new ones available")
+    return correct
+
+def run_tests():
+    print("\n======= STARTING SIGNUP BURST TESTS =======\n")
+    results = {
+        "signup_burst": test_signup_burst(),
+        "same_email_race": test_same_email_race(),
+        "email_availability": test_email_availability(),
+    }
+    metrics = requests.get(f"{API_BASE_URL}/metrics", headers=ADMIN_HEADERS, timeout=30).json()
+    print(f"\nEmail filter: {metrics.get('email_filter')}")
+
+    print("\n======= SIGNUP BURST TEST SUMMARY =======")
+    for name, passed in results.items():
+        print(f"{'✅' if passed else '❌'} {name}")
+    print("\n======= SIGNUP BURST TESTS COMPLETED =======")
+    return all(results.values())
+
+if __name__ == "__main__":
+    sys.exit(0 if run_tests() else 1)
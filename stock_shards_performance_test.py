@@ -0,0 +1,94 @@
+"""Benchmark stock decrement throughput with 1 and with 16 counter shards.
+
+Drives backend/stock_shards.py directly against MongoDB: many concurrent
+writers each decrement one unit of the same hot SKU, first with all stock
+in a single counter document, then spread over 16. Needs a MongoDB at
+MONGO_URL (default localhost); uses a throwaway database that is dropped
+afterwards.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+import stock_shards  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = f"stock_shards_benchmark_{uuid.uuid4().hex[:8]}"
+WRITERS = 200
+DECREMENTS = 20000
+SHARD_COUNTS = (1, 16)
+
+
+async def test_throughput(db, shards):
+    """WRITERS concurrent coroutines decrement one SKU DECREMENTS times in total"""
+    print(f"\n=== {shards} shard(s): {DECREMENTS} decrements from {WRITERS} concurrent writers ===")
+    product_id = str(uuid.uuid4())
+    await db.products.insert_one({
+        "id": product_id, "name": "Flash Sale Item", "stock_quantity": DECREMENTS * 2,
+        "variations": [{"size": "8mm", "stock_quantity": DECREMENTS * 2}],
+    })
+    await stock_shards.enable(db, product_id, shards)
+    lines = {(product_id, "8mm"): 1}
+    remaining = DECREMENTS
+    latencies = []
+    failures = 0
+
+    async def writer():
+        nonlocal remaining, failures
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            # Each decrement is one checkout: take under its order id, then drop the marker
+            order_id = str(uuid.uuid4())
+            takes = await stock_shards.take(db.stock_counters, order_id, lines, {product_id: shards})
+            if takes is not None:
+                await stock_shards.confirm(db.stock_counters, order_id, [product_id])
+            latencies.append((time.perf_counter() - start) * 1000)
+            if takes is None:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(WRITERS)))
+    elapsed = time.perf_counter() - start
+
+    totals = await stock_shards.totals(db.stock_counters, [product_id])
+    expected = DECREMENTS * 2 - (DECREMENTS - failures)
+    consistent = totals[(product_id, "8mm")] == expected and totals[(product_id, None)] == expected
+    throughput = DECREMENTS / elapsed
+    p95 = sorted(latencies)[int(len(latencies) * 0.95)]
+    print(f"  Throughput: {throughput:.0f} decrements/s in {elapsed:.2f}s")
+    print(f"  Latency: avg {statistics.mean(latencies):.2f} ms, p95 {p95:.2f} ms, failures {failures}")
+    print(f"{'✅' if consistent else '❌'} Counter sum {totals[(product_id, '8mm')]} (expected {expected})")
+    return {"throughput": throughput, "p95": p95, "consistent": consistent and not failures}
+
+
+async def run_benchmarks():
+    print("\n======= STARTING STOCK SHARD BENCHMARK =======")
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    try:
+        await ensure_indexes(db)
+        results = {shards: await test_throughput(db, shards) for shards in SHARD_COUNTS}
+    finally:
+        await client.drop_database(DB_NAME)
+        client.close()
+
+    print("\n======= STOCK SHARD BENCHMARK SUMMARY =======")
+    for shards, result in results.items():
+        print(f"{shards:>2} shard(s): {result['throughput']:.0f} decrements/s, p95 {result['p95']:.2f} ms")
+    speedup = results[SHARD_COUNTS[-1]]["throughput"] / results[SHARD_COUNTS[0]]["throughput"]
+    print(f"{'✅' if speedup > 1 else '❌'} {SHARD_COUNTS[-1]} shards: {speedup:.1f}x the single-shard throughput")
+    return all(result["consistent"] for result in results.values())
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run_benchmarks()) else 1)